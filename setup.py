@@ -46,6 +46,7 @@ setup(
             'twindb-chef=twindb_infrastructure.twindb_chef:main',
             'twindb-galera=twindb_infrastructure.twindb_galera:main',
             'twindb-monitoring=twindb_infrastructure.monitoring:main',
+            'twindb-check=twindb_infrastructure.check_client:main',
         ]
     },
     include_package_data=True,
@@ -0,0 +1,123 @@
+import socket
+from threading import Thread
+
+import mock
+import pytest
+
+from twindb_infrastructure.backends import BackendLoaders, Resolver
+from twindb_infrastructure.check_http import HttpChecker, CheckResponse
+from twindb_infrastructure.loader import Loader
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, NAGIOS_EXIT_CRITICAL
+from twindb_infrastructure.probe_loader import ProbeLoader
+
+
+def _server():
+    """Answer every connection on 127.0.0.1 with 200 OK, return
+    the port and the list requests are appended to."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    requests = []
+
+    def serve():
+        while True:
+            conn, _ = listener.accept()
+            requests.append(conn.recv(4096))
+            conn.sendall(
+                'HTTP/1.1 200 OK\r\n'
+                'Content-Length: 2\r\n'
+                'Connection: close\r\n\r\n'
+                'ok'
+            )
+            conn.close()
+
+    thread = Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    return listener.getsockname()[1], requests
+
+
+def _resolver(addresses):
+    resolver = Resolver()
+    resolver.resolve = mock.Mock(return_value=addresses)
+    return resolver
+
+
+@mock.patch('twindb_infrastructure.backends.socket.getaddrinfo')
+def test_resolver_caches_for_ttl(mock_getaddrinfo):
+    mock_getaddrinfo.return_value = [
+        (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.2', 80)),
+        (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('::1', 80, 0, 0)),
+        (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 80)),
+        (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.2', 80)),
+    ]
+    resolver = Resolver(ttl=60)
+    assert resolver.resolve('foo', 80) == ['10.0.0.1', '10.0.0.2', '::1']
+    assert resolver.resolve('foo', 80) == ['10.0.0.1', '10.0.0.2', '::1']
+    assert mock_getaddrinfo.call_count == 1
+
+    resolver = Resolver(ttl=0)
+    resolver.resolve('foo', 80)
+    resolver.resolve('foo', 80)
+    assert mock_getaddrinfo.call_count == 3
+
+
+def test_loaders_follow_addresses():
+    resolver = _resolver(['10.0.0.1', '10.0.0.2'])
+    backends = BackendLoaders(Loader('http://foo/'), resolver=resolver)
+    first = dict(backends.loaders())
+    assert sorted(first) == ['10.0.0.1', '10.0.0.2']
+    assert first['10.0.0.1']._address == '10.0.0.1'
+
+    resolver.resolve.return_value = ['10.0.0.2', '10.0.0.3']
+    second = dict(backends.loaders())
+    assert sorted(second) == ['10.0.0.2', '10.0.0.3']
+    assert second['10.0.0.2'] is first['10.0.0.2']
+
+
+def test_pinned_loader_sends_host():
+    port, requests = _server()
+    backends = BackendLoaders(
+        Loader('http://foo.bar:%d/' % port),
+        resolver=_resolver(['127.0.0.1'])
+    )
+    resp = HttpChecker().check(backends, CheckResponse)
+
+    assert resp.nagios_code == NAGIOS_EXIT_OK
+    assert 'Host: foo.bar:%d\r\n' % port in requests[0]
+
+
+@pytest.mark.parametrize('quorum, nagios_code', [
+    (None, NAGIOS_EXIT_CRITICAL),
+    (2, NAGIOS_EXIT_CRITICAL),
+    (1, NAGIOS_EXIT_OK),
+])
+def test_check_quorum(quorum, nagios_code):
+    port, _ = _server()
+    # Nothing listens on 127.0.0.2
+    backends = BackendLoaders(
+        ProbeLoader('http://foo:%d/' % port, mode='raw'),
+        resolver=_resolver(['127.0.0.1', '127.0.0.2'])
+    )
+    resp = HttpChecker(quorum=quorum, perfdata=True).check(
+        backends,
+        CheckResponse
+    )
+
+    assert resp.nagios_code == nagios_code
+    lines = resp.output.split('\n')
+    assert '1 of 2 backends are OK' in lines[0]
+    assert lines[1].startswith('127.0.0.1: OK')
+    assert lines[2].startswith('127.0.0.2: CRITICAL')
+    assert 'time_127.0.0.1=' in resp.output
+    assert 'time_127.0.0.2=' not in resp.output
+
+
+def test_check_unresolved():
+    resolver = Resolver()
+    resolver.resolve = mock.Mock(side_effect=socket.gaierror('no name'))
+    backends = BackendLoaders(Loader('http://foo/'), resolver=resolver)
+    resp = HttpChecker().check(backends, CheckResponse)
+
+    assert resp.nagios_code == NAGIOS_EXIT_CRITICAL
+    assert 'Failed to resolve foo' in resp.output
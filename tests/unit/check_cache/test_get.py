@@ -0,0 +1,47 @@
+import mock
+import pytest
+
+from twindb_infrastructure.check_cache import CheckCache
+from twindb_infrastructure.check_http import CheckHttpResponse, \
+    NAGIOS_EXIT_OK, NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_UNKNOWN
+
+
+def test_get_before_refresh():
+    cache = CheckCache(mock.Mock(), mock.Mock())
+    resp = cache.get()
+    assert resp.nagios_code == NAGIOS_EXIT_UNKNOWN
+    assert resp.http_code == 503
+
+
+@pytest.mark.parametrize(
+    'age, stale_response, nagios_code, http_code',
+    [
+        (5, 'critical', NAGIOS_EXIT_OK, 200),
+        (31, 'critical', NAGIOS_EXIT_CRITICAL, 503),
+        (31, 'unknown', NAGIOS_EXIT_UNKNOWN, 503),
+        (31, 'last', NAGIOS_EXIT_OK, 200),
+    ]
+)
+@mock.patch('twindb_infrastructure.check_cache.time')
+def test_get(mock_time, age, stale_response, nagios_code, http_code):
+    mock_checker = mock.Mock()
+    mock_checker.check.return_value = CheckHttpResponse(
+        message='OK',
+        nagios_code=NAGIOS_EXIT_OK,
+        http_code=200
+    )
+    mock_loader = mock.Mock()
+    cache = CheckCache(
+        mock_checker,
+        mock_loader,
+        refresh_interval=10,
+        stale_response=stale_response
+    )
+    mock_time.time.return_value = 100
+    cache.refresh()
+    mock_loader.reset.assert_called_once_with()
+
+    mock_time.time.return_value = 100 + age
+    resp = cache.get()
+    assert resp.nagios_code == nagios_code
+    assert resp.http_code == http_code
@@ -0,0 +1,60 @@
+import os
+import time
+from threading import Thread
+
+import mock
+import pytest
+
+from twindb_infrastructure.check_client import request_check
+from twindb_infrastructure.check_daemon import CheckDaemon
+from twindb_infrastructure.check_http import CheckResponse
+from twindb_infrastructure.nagios import NAGIOS_EXIT_WARNING, \
+    NAGIOS_EXIT_UNKNOWN
+from twindb_infrastructure.targets import Target, TargetsException
+
+
+@pytest.fixture
+def daemon(tmpdir):
+    socket_path = str(tmpdir.join('check.sock'))
+    check_daemon = CheckDaemon(socket_path)
+    thread = Thread(target=check_daemon.serve_forever)
+    thread.daemon = True
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.01)
+    yield socket_path
+    check_daemon.stop()
+
+
+@mock.patch.object(Target, 'check')
+def test_request_check(mock_check, daemon):
+    mock_check.return_value = CheckResponse(
+        message='WARNING - foo',
+        nagios_code=NAGIOS_EXIT_WARNING
+    )
+    assert request_check(daemon, {'url': 'http://foo', 'warning': '1'}) \
+        == ('WARNING - foo', NAGIOS_EXIT_WARNING)
+
+
+def test_request_check_invalid(daemon):
+    output, nagios_code = request_check(daemon, {'url': 'x', 'foo': 1})
+    assert nagios_code == NAGIOS_EXIT_UNKNOWN
+    assert 'foo' in output
+
+
+def test_check_reuses_target():
+    check_daemon = CheckDaemon()
+    with mock.patch.object(Target, 'check'):
+        check_daemon.check({'url': 'http://foo', 'critical': 'p95>1'})
+        check_daemon.check(
+            {'url': 'http://foo', 'critical': 'p95>1', 'http': True}
+        )
+        check_daemon.check({'url': 'http://foo', 'critical': '2'})
+    assert len(check_daemon._targets) == 2
+
+
+def test_check_invalid_threshold():
+    with pytest.raises(TargetsException):
+        CheckDaemon().check({'url': 'http://foo', 'critical': 'p95'})
@@ -0,0 +1,157 @@
+import mock
+import pytest
+from pymysql import OperationalError
+
+from twindb_infrastructure.check_galera import GaleraChecker
+from twindb_infrastructure.check_http import CheckResponse, \
+    CheckHttpResponse
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL
+
+
+def _node(name='foo:3306', **status):
+    values = {
+        'wsrep_ready': 'ON',
+        'wsrep_cluster_status': 'Primary',
+        'wsrep_cluster_size': '3',
+        'wsrep_local_state': '4',
+        'wsrep_local_state_comment': 'Synced',
+        'wsrep_flow_control_paused': '0.000000',
+        'wsrep_local_recv_queue_avg': '0.000000',
+        'wsrep_local_send_queue_avg': '0.000000',
+    }
+    values.update(status)
+    node = mock.Mock()
+    node.name = name
+    node.rows = [
+        {'Variable_name': k, 'Value': v} for k, v in values.items()
+    ]
+    return node
+
+
+@pytest.mark.parametrize('kwargs, status, nagios_code', [
+    ({}, {}, NAGIOS_EXIT_OK),
+    ({}, {'wsrep_ready': 'OFF'}, NAGIOS_EXIT_CRITICAL),
+    ({}, {'wsrep_cluster_status': 'non-Primary'}, NAGIOS_EXIT_CRITICAL),
+    ({}, {'wsrep_local_state': '2',
+          'wsrep_local_state_comment': 'Donor/Desynced'},
+     NAGIOS_EXIT_WARNING),
+    ({}, {'wsrep_local_state': '0'}, NAGIOS_EXIT_CRITICAL),
+    ({'cluster_size': 3}, {'wsrep_cluster_size': '2'}, NAGIOS_EXIT_WARNING),
+    ({'cluster_size': 3}, {'wsrep_cluster_size': '4'}, NAGIOS_EXIT_OK),
+    ({'warning_flow_control': 0.1, 'critical_flow_control': 0.5},
+     {'wsrep_flow_control_paused': '0.2'}, NAGIOS_EXIT_WARNING),
+    ({'warning_flow_control': 0.1, 'critical_flow_control': 0.5},
+     {'wsrep_flow_control_paused': '0.7'}, NAGIOS_EXIT_CRITICAL),
+    ({'critical_recv_queue': 10}, {'wsrep_local_recv_queue_avg': '12.5'},
+     NAGIOS_EXIT_CRITICAL),
+    ({'warning_send_queue': 1}, {'wsrep_local_send_queue_avg': '1.5'},
+     NAGIOS_EXIT_WARNING),
+    ({}, {'wsrep_local_state': 'foo'}, NAGIOS_EXIT_CRITICAL),
+])
+def test_check(kwargs, status, nagios_code):
+    checker = GaleraChecker(**kwargs)
+    response = checker.check([_node(**status)], CheckResponse)
+
+    assert response.nagios_code == nagios_code
+
+
+def test_check_not_galera():
+    node = _node()
+    node.rows = [{'Variable_name': 'wsrep_on', 'Value': 'OFF'}]
+    response = GaleraChecker().check([node], CheckResponse)
+
+    assert response.nagios_code == NAGIOS_EXIT_CRITICAL
+    assert 'foo:3306: not a Galera node' in response.output
+
+
+def test_check_reports_every_node():
+    failed = _node('bar:3306')
+    failed.run.side_effect = OperationalError(2003, "Can't connect")
+    nodes = [
+        _node('foo:3306'),
+        failed,
+        _node(
+            'baz:3306',
+            wsrep_local_state='1',
+            wsrep_local_state_comment='Joining'
+        ),
+    ]
+    response = GaleraChecker().check(nodes, CheckHttpResponse)
+
+    assert response.nagios_code == NAGIOS_EXIT_CRITICAL
+    assert response.http_code == 503
+    lines = response.output.split('\n')
+    assert lines[0] == 'CRITICAL - Galera cluster: 1 of 3 nodes are OK'
+    assert lines[1] == 'foo:3306: Synced, cluster size 3'
+    assert lines[2].startswith("bar:3306: (2003")
+    assert lines[3] == 'baz:3306: state Joining'
+    for node in nodes:
+        node.run.assert_called_once_with()
+
+
+@mock.patch('twindb_infrastructure.check_galera.time')
+def test_flow_control_between_polls(mock_time):
+    checker = GaleraChecker(
+        warning_flow_control=0.1,
+        critical_flow_control=0.5,
+        perfdata=True
+    )
+    mock_time.time.return_value = 100.0
+    response = checker.check(
+        [
+            _node(
+                wsrep_flow_control_paused='0.9',
+                wsrep_flow_control_paused_ns='1000000000'
+            )
+        ],
+        CheckResponse
+    )
+    # The first poll has only the fraction since FLUSH STATUS
+    assert response.nagios_code == NAGIOS_EXIT_CRITICAL
+
+    mock_time.time.return_value = 110.0
+    response = checker.check(
+        [
+            _node(
+                wsrep_flow_control_paused='0.9',
+                wsrep_flow_control_paused_ns='3000000000'
+            )
+        ],
+        CheckResponse
+    )
+    # Paused 2 seconds of 10
+    assert response.nagios_code == NAGIOS_EXIT_WARNING
+    assert 'flow control paused 0.200000 more than 0.100000' \
+        in response.output
+    assert 'foo:3306_flow_control_paused=0.200000;0.100000;0.500000;0;1' \
+        in str(response)
+
+
+@mock.patch('twindb_infrastructure.check_galera.time')
+def test_flow_control_counter_reset(mock_time):
+    checker = GaleraChecker(warning_flow_control=0.1)
+    mock_time.time.return_value = 100.0
+    checker.check(
+        [_node(wsrep_flow_control_paused_ns='5000000000')],
+        CheckResponse
+    )
+
+    mock_time.time.return_value = 110.0
+    response = checker.check(
+        [_node(wsrep_flow_control_paused_ns='1000')],
+        CheckResponse
+    )
+
+    assert response.nagios_code == NAGIOS_EXIT_OK
+
+
+def test_perfdata():
+    checker = GaleraChecker(critical_recv_queue=10, perfdata=True)
+    response = checker.check(
+        [_node(wsrep_local_recv_queue_avg='0.5')],
+        CheckResponse
+    )
+
+    assert 'foo:3306_cluster_size=3;;;0' in str(response)
+    assert 'foo:3306_recv_queue_avg=0.500000;;10;0' in str(response)
@@ -0,0 +1,31 @@
+import pytest
+
+from twindb_infrastructure.check_http import AgentCheckResponse
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_UNKNOWN
+
+
+@pytest.mark.parametrize('nagios_code, weight, expected_response', [
+    (NAGIOS_EXIT_OK, 100, 'up 100% #foo\n'),
+    (NAGIOS_EXIT_WARNING, 40, 'up 40% #foo\n'),
+    (NAGIOS_EXIT_OK, None, 'up #foo\n'),
+    (NAGIOS_EXIT_WARNING, 0, 'drain #foo\n'),
+    (NAGIOS_EXIT_UNKNOWN, None, 'drain #foo\n'),
+    (NAGIOS_EXIT_CRITICAL, 100, 'down #foo\n'),
+])
+def test_str(nagios_code, weight, expected_response):
+    resp = AgentCheckResponse(
+        message='foo',
+        nagios_code=nagios_code,
+        weight=weight
+    )
+    assert str(resp) == expected_response
+
+
+def test_str_single_line():
+    resp = AgentCheckResponse(
+        message='OK - foo\n | load_time=1.0s',
+        nagios_code=NAGIOS_EXIT_OK,
+        weight=100
+    )
+    assert str(resp) == 'up 100% #OK - foo | load_time=1.0s\n'
@@ -1,4 +1,5 @@
 from twindb_infrastructure.check_http import CheckResponse
+from twindb_infrastructure.nagios import PerfData
 
 
 def test_str():
@@ -6,3 +7,14 @@ def test_str():
         message='foo'
     )
     assert str(resp) == 'foo'
+
+
+def test_str_perfdata():
+    resp = CheckResponse(
+        message='foo',
+        perfdata=[
+            PerfData('time', 1, uom='s'),
+            PerfData('dns', 2, uom='s'),
+        ]
+    )
+    assert str(resp) == 'foo | time=1s dns=2s'
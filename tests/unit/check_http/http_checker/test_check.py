@@ -3,8 +3,10 @@ import pytest
 from requests import RequestException
 
 from twindb_infrastructure.check_http import HttpChecker, CheckHttpResponse, \
-    NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_OK
-from twindb_infrastructure.loader import Loader
+    AgentCheckResponse, CheckResponse, NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING
+from twindb_infrastructure.latency_window import PercentileThreshold
+from twindb_infrastructure.loader import Loader, PHASES
 
 
 def test_check_critical():
@@ -58,3 +60,137 @@ def test_check_on_exception(mock_get_tag):
     )
     assert resp.nagios_code == NAGIOS_EXIT_CRITICAL
     assert resp.http_code == 503
+
+
+def test_check_critical_rules_first():
+    ch = HttpChecker(
+        warning_load_time=1,
+        title='foo'
+    )
+    mock_loader = mock.Mock()
+    mock_loader.load_time = 2.0
+    mock_loader.title = 'bar'
+    resp = ch.check(
+        mock_loader,
+        CheckHttpResponse
+    )
+    assert resp.nagios_code == NAGIOS_EXIT_CRITICAL
+    assert resp.http_code == 503
+
+
+def test_check_warning():
+    ch = HttpChecker(
+        warning_load_time=1,
+        title='foo'
+    )
+    mock_loader = mock.Mock()
+    mock_loader.load_time = 2.0
+    mock_loader.title = 'foo'
+    resp = ch.check(
+        mock_loader,
+        CheckHttpResponse
+    )
+    assert resp.nagios_code == NAGIOS_EXIT_WARNING
+    assert resp.http_code == 200
+
+
+@mock.patch('twindb_infrastructure.check_rules.re')
+def test_check_compiles_regexps_once(mock_re):
+    ch = HttpChecker(
+        title_regexp='foo',
+        body_regexp='bar'
+    )
+    mock_loader = mock.Mock()
+    ch.check(mock_loader, CheckHttpResponse)
+    ch.check(mock_loader, CheckHttpResponse)
+    assert mock_re.compile.call_count == 2
+
+
+def test_check_percentile_threshold():
+    ch = HttpChecker(
+        critical_load_time=PercentileThreshold(50, 1.0),
+        window_size=3
+    )
+    mock_loader = mock.Mock()
+    results = []
+    for load_time in [2.0, 0.1, 0.1, 2.0, 2.0]:
+        mock_loader.load_time = load_time
+        results.append(ch.check(mock_loader, CheckHttpResponse).nagios_code)
+
+    assert results == [
+        NAGIOS_EXIT_CRITICAL,
+        # p50 of 2.0, 0.1
+        NAGIOS_EXIT_OK,
+        NAGIOS_EXIT_OK,
+        NAGIOS_EXIT_OK,
+        # p50 of 0.1, 2.0, 2.0
+        NAGIOS_EXIT_CRITICAL,
+    ]
+
+
+def test_check_records_history():
+    mock_history = mock.Mock()
+    ch = HttpChecker(critical_load_time=1.0, history=mock_history)
+    mock_loader = mock.Mock()
+    mock_loader.load_time = 2.0
+    ch.check(mock_loader, CheckHttpResponse)
+    mock_history.record.assert_called_once_with(2.0, NAGIOS_EXIT_CRITICAL)
+
+    mock_loader.load.side_effect = RequestException
+    ch.check(mock_loader, CheckHttpResponse)
+    mock_history.record.assert_called_with(None, NAGIOS_EXIT_CRITICAL)
+
+
+@pytest.mark.parametrize('warning, critical, load_time, weight', [
+    (1, 3, 0.5, 100),
+    (1, 3, 2.0, 50),
+    (1, 3, 2.99, 1),
+    (1, 3, 3.0, 0),
+    (None, 2, 0.5, 100),
+    (None, 2, 1.5, 50),
+    (1, None, 1.5, 50),
+    (PercentileThreshold(90, 1), PercentileThreshold(90, 3), 2.0, 50),
+    (None, None, 10.0, 100),
+])
+def test_check_agent_weight(warning, critical, load_time, weight):
+    ch = HttpChecker(
+        warning_load_time=warning,
+        critical_load_time=critical
+    )
+    mock_loader = mock.Mock()
+    mock_loader.load_time = load_time
+    resp = ch.check(
+        mock_loader,
+        AgentCheckResponse
+    )
+    assert resp.weight == weight
+
+
+def test_check_size_and_throughput_perfdata():
+    ch = HttpChecker(
+        warning_body_size=1000,
+        critical_throughput=100.0,
+        perfdata=True
+    )
+    mock_loader = mock.Mock()
+    mock_loader.load_time = 1.0
+    mock_loader.phase_timings = dict.fromkeys(PHASES, 0)
+    mock_loader.asset_timings = None
+    mock_loader.body_size = 2000
+    mock_loader.throughput = 2000.0
+    resp = ch.check(mock_loader, CheckResponse)
+
+    assert resp.nagios_code == NAGIOS_EXIT_WARNING
+    assert 'response size 2000 bytes more than 1000' in resp.output
+    assert 'size=2000B;1000;;0' in resp.output
+    assert 'throughput_bps=2000.000000;;100.000000:;0' in resp.output
+    assert ch.full_body is True
+
+
+@pytest.mark.parametrize('kwargs, checks_status', [
+    ({}, False),
+    ({'title': 'foo'}, False),
+    ({'status_code': 404}, True),
+])
+def test_checks_status(kwargs, checks_status):
+    assert HttpChecker(**kwargs).checks_status is checks_status
@@ -0,0 +1,24 @@
+import pytest
+
+from twindb_infrastructure.check_http import HttpChecker
+
+
+@pytest.mark.parametrize('kwargs, tags', [
+    ({}, []),
+    ({'critical_load_time': 1}, []),
+    ({'title': 'foo'}, ['title']),
+    ({'title_regexp': 'foo'}, ['title']),
+    ({'title': 'foo', 'body_regexp': 'bar'}, ['title', 'body']),
+    ({'body_regexp': 'bar', 'stream_body_regexp': True}, []),
+])
+def test_required_tags(kwargs, tags):
+    assert HttpChecker(**kwargs).required_tags == tags
+
+
+def test_stream_patterns():
+    assert HttpChecker(body_regexp='bar').stream_patterns == []
+    patterns = HttpChecker(
+        body_regexp='bar',
+        stream_body_regexp=True
+    ).stream_patterns
+    assert [p.pattern for p in patterns] == ['bar']
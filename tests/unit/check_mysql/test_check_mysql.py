@@ -0,0 +1,117 @@
+import mock
+import pytest
+from pymysql import OperationalError
+
+from twindb_infrastructure.check_http import CheckResponse, \
+    CheckHttpResponse, AgentCheckResponse
+from twindb_infrastructure.check_mysql import MysqlChecker, MysqlProbe
+from twindb_infrastructure.latency_window import PercentileThreshold
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL
+
+
+@mock.patch('twindb_infrastructure.check_mysql.pymysql')
+def test_probe_keeps_connection(mock_pymysql):
+    probe = MysqlProbe('foo', query='SELECT 2')
+    probe.run()
+    probe.run()
+
+    assert mock_pymysql.connect.call_count == 1
+    assert mock_pymysql.connect.call_args[1]['host'] == 'foo'
+    cursor = mock_pymysql.connect.return_value.cursor.return_value
+    cursor.execute.assert_called_with('SELECT 2')
+    assert cursor.execute.call_count == 2
+    assert probe.connect_time is None
+    assert probe.query_time is not None
+    assert probe.rows == cursor.fetchall.return_value
+
+
+@mock.patch('twindb_infrastructure.check_mysql.pymysql')
+def test_probe_connect_time_only_on_connect(mock_pymysql):
+    probe = MysqlProbe('foo')
+    probe.run()
+    assert probe.connect_time is not None
+
+    probe.run()
+    assert probe.connect_time is None
+
+
+@mock.patch('twindb_infrastructure.check_mysql.pymysql')
+def test_probe_reconnects_after_error(mock_pymysql):
+    cursor = mock_pymysql.connect.return_value.cursor.return_value
+    cursor.execute.side_effect = [OperationalError(2013, 'Lost'), None]
+    probe = MysqlProbe('foo')
+
+    with pytest.raises(OperationalError):
+        probe.run()
+    assert probe.query_time is None
+    mock_pymysql.connect.return_value.close.assert_called_once_with()
+
+    probe.run()
+    assert mock_pymysql.connect.call_count == 2
+
+
+def _probe(query_time, connect_time=0.001):
+    probe = mock.Mock()
+    probe.name = 'foo:3306'
+    probe.query_time = query_time
+    probe.connect_time = connect_time
+    return probe
+
+
+@pytest.mark.parametrize('kwargs, query_time, nagios_code', [
+    ({}, 1.0, NAGIOS_EXIT_OK),
+    ({'critical_query_time': 0.5}, 1.0, NAGIOS_EXIT_CRITICAL),
+    ({'warning_query_time': 0.5}, 1.0, NAGIOS_EXIT_WARNING),
+    ({'critical_query_time': 2, 'warning_query_time': 0.5}, 1.0,
+     NAGIOS_EXIT_WARNING),
+    ({'critical_query_time': PercentileThreshold(50, 0.5)}, 1.0,
+     NAGIOS_EXIT_CRITICAL),
+    ({'warning_query_time': 0.5, 'critical_connect_time': 0.0001}, 1.0,
+     NAGIOS_EXIT_CRITICAL),
+])
+def test_check(kwargs, query_time, nagios_code):
+    resp = MysqlChecker(**kwargs).check(_probe(query_time), CheckResponse)
+    assert resp.nagios_code == nagios_code
+
+
+def test_check_error():
+    probe = _probe(None)
+    probe.run.side_effect = OperationalError(2003, "Can't connect")
+    resp = MysqlChecker().check(probe, CheckHttpResponse)
+
+    assert resp.nagios_code == NAGIOS_EXIT_CRITICAL
+    assert resp.http_code == 503
+    assert "Can't connect" in resp.output
+
+
+def test_check_perfdata():
+    checker = MysqlChecker(
+        warning_query_time=PercentileThreshold(90, 0.5),
+        perfdata=True
+    )
+    for query_time in [0.1, 0.2, 0.3]:
+        resp = checker.check(_probe(query_time), CheckResponse)
+
+    assert resp.output == (
+        'OK - foo:3306 is healthy | '
+        'connect_time=0.001000s;;;0 query_time=0.300000s;;;0 '
+        'p50=0.200000s;;;0 p95=0.300000s;;;0 p99=0.300000s;;;0 '
+        'p90=0.300000s;0.500000;;0'
+    )
+
+
+def test_check_agent_weight():
+    checker = MysqlChecker(warning_query_time=0.1, critical_query_time=0.3)
+    resp = checker.check(_probe(0.2), AgentCheckResponse)
+    assert resp.weight == 50
+
+
+def test_check_connect_time_of_reused_connection():
+    checker = MysqlChecker(critical_connect_time=0.1, perfdata=True)
+    assert checker.check(_probe(0.001, connect_time=0.3), CheckResponse) \
+        .nagios_code == NAGIOS_EXIT_CRITICAL
+
+    resp = checker.check(_probe(0.001, connect_time=None), CheckResponse)
+    assert resp.nagios_code == NAGIOS_EXIT_OK
+    assert 'connect_time' not in resp.output
@@ -0,0 +1,120 @@
+import mock
+import pytest
+from requests.structures import CaseInsensitiveDict
+
+from twindb_infrastructure.check_rules import StatusCodeRule, \
+    ContentLengthRule, parse_header_rule, LoadTimeRule, PhaseTimeRule, \
+    StreamBodyRegexpRule, BodySizeRule, ThroughputRule, parse_phase_threshold
+from twindb_infrastructure.nagios import NAGIOS_EXIT_WARNING
+
+
+@pytest.mark.parametrize('status_code, passes', [
+    (200, True),
+    (301, False),
+])
+def test_status_code_rule(status_code, passes):
+    mock_loader = mock.Mock()
+    mock_loader.status_code = status_code
+    result = StatusCodeRule(200).evaluate(mock_loader)
+    assert (result is None) == passes
+
+
+@pytest.mark.parametrize('headers, passes', [
+    ({'content-type': 'text/html; charset=UTF-8'}, True),
+    ({'Content-Type': 'application/json'}, False),
+    ({}, False),
+])
+def test_header_rule(headers, passes):
+    mock_loader = mock.Mock()
+    mock_loader.headers = CaseInsensitiveDict(headers)
+    rule = parse_header_rule('Content-Type: text/html')
+    assert (rule.evaluate(mock_loader) is None) == passes
+
+
+def test_parse_header_rule_invalid():
+    with pytest.raises(ValueError):
+        parse_header_rule('no colon')
+
+
+@pytest.mark.parametrize('length, passes', [
+    (99, False),
+    (100, True),
+    (200, True),
+    (201, False),
+])
+def test_content_length_rule(length, passes):
+    mock_loader = mock.Mock()
+    mock_loader.content_length = length
+    rule = ContentLengthRule(min_length=100, max_length=200)
+    assert (rule.evaluate(mock_loader) is None) == passes
+
+
+def test_load_time_rule_warning():
+    mock_loader = mock.Mock()
+    mock_loader.url = 'foo'
+    mock_loader.load_time = 2.0
+    rule = LoadTimeRule(1, nagios_code=NAGIOS_EXIT_WARNING)
+    assert rule.evaluate(mock_loader).startswith('WARNING - foo: load time')
+
+
+@pytest.mark.parametrize('ttfb, passes', [
+    (0.5, True),
+    (1.5, False),
+])
+def test_phase_time_rule(ttfb, passes):
+    mock_loader = mock.Mock()
+    mock_loader.phase_timings = {'ttfb': ttfb}
+    rule = PhaseTimeRule('ttfb', 1)
+    assert (rule.evaluate(mock_loader) is None) == passes
+
+
+def test_phase_time_rule_unknown_phase():
+    with pytest.raises(ValueError):
+        PhaseTimeRule('foo', 1)
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('dns=0.5', ('dns', 0.5)),
+    (' tls = 1', ('tls', 1.0)),
+])
+def test_parse_phase_threshold(spec, expected):
+    assert parse_phase_threshold(spec) == expected
+
+
+@pytest.mark.parametrize('spec', ['dns', 'foo=1', 'dns=x'])
+def test_parse_phase_threshold_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_phase_threshold(spec)
+
+
+def test_stream_body_regexp_rule():
+    rule = StreamBodyRegexpRule('foo')
+    mock_loader = mock.Mock()
+    mock_loader.matched_patterns = set(rule.patterns)
+    assert rule.evaluate(mock_loader) is None
+    mock_loader.matched_patterns = set()
+    assert "expected to match regexp 'foo'" in rule.evaluate(mock_loader)
+
+
+@pytest.mark.parametrize('body_size, passes', [
+    (1000, True),
+    (1001, False),
+])
+def test_body_size_rule(body_size, passes):
+    mock_loader = mock.Mock()
+    mock_loader.body_size = body_size
+    result = BodySizeRule(1000).evaluate(mock_loader)
+    assert (result is None) == passes
+
+
+@pytest.mark.parametrize('throughput, passes', [
+    (1000.0, True),
+    (999.0, False),
+    # Nothing was transferred
+    (None, True),
+])
+def test_throughput_rule(throughput, passes):
+    mock_loader = mock.Mock()
+    mock_loader.throughput = throughput
+    result = ThroughputRule(1000).evaluate(mock_loader)
+    assert (result is None) == passes
@@ -0,0 +1,237 @@
+import errno
+import os
+import signal
+import socket
+import subprocess
+from threading import Event, Lock, Thread
+
+import pytest
+
+from twindb_infrastructure.check_http import AgentCheckResponse, \
+    CheckHttpResponse, agent_error_response
+from twindb_infrastructure.health_server import HealthServer, \
+    _release, _take_over
+
+
+def _probe(port, path='/'):
+    client = socket.create_connection(('127.0.0.1', port), timeout=10)
+    client.sendall('GET %s HTTP/1.1\r\n\r\n' % path)
+    response = ''
+    while True:
+        data = client.recv(4096)
+        if not data:
+            break
+        response += data
+    client.close()
+    return response
+
+
+def _serve(server):
+    server.bind()
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+
+def test_serves_probes_concurrently():
+    all_arrived = Event()
+    lock = Lock()
+    arrived = []
+
+    def respond():
+        with lock:
+            arrived.append(1)
+            if len(arrived) == 2:
+                all_arrived.set()
+        # Both probes must be in progress at the same time
+        if all_arrived.wait(5) is False:
+            return CheckHttpResponse(message='blocked', http_code=503)
+        return CheckHttpResponse(message='ok', http_code=200)
+
+    server = HealthServer(0, respond, workers=2, backlog=4)
+    _serve(server)
+
+    responses = []
+    clients = [
+        Thread(target=lambda: responses.append(_probe(server.port)))
+        for _ in range(2)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    server.stop()
+
+    assert len(responses) == 2
+    assert all(r.startswith('HTTP/1.1 200 OK') for r in responses)
+
+
+def test_routes():
+    server = HealthServer(
+        0,
+        lambda: CheckHttpResponse(message='check', http_code=200),
+        routes={
+            '/metrics': lambda: CheckHttpResponse(
+                message='metrics',
+                http_code=200
+            )
+        }
+    )
+    _serve(server)
+
+    assert _probe(server.port).endswith('check\r\n')
+    assert _probe(server.port, '/metrics?x=1').endswith('metrics\r\n')
+    server.stop()
+
+
+def test_respond_without_request():
+    server = HealthServer(
+        0,
+        lambda: AgentCheckResponse(message='ok', nagios_code=0, weight=100),
+        read_request=False
+    )
+    _serve(server)
+
+    # An agent-check client sends nothing and reads a single line
+    client = socket.create_connection(('127.0.0.1', server.port), timeout=10)
+    assert client.recv(4096) == 'up 100% #ok\n'
+    client.close()
+    server.stop()
+
+
+def test_binds_alongside_running_server(tmpdir):
+    pid_file = str(tmpdir.join('check.pid'))
+    old = HealthServer(
+        0,
+        lambda: CheckHttpResponse(message='old', http_code=200),
+        pid_file=pid_file
+    )
+    _serve(old)
+    new = HealthServer(
+        old.port,
+        lambda: CheckHttpResponse(message='new', http_code=200),
+        pid_file=pid_file
+    )
+    new.bind()
+    old.stop()
+    _serve(new)
+
+    assert _probe(new.port).endswith('new\r\n')
+    new.stop()
+
+
+def test_port_in_use_without_pid_file():
+    old = HealthServer(
+        0,
+        lambda: CheckHttpResponse(message='old', http_code=200)
+    )
+    _serve(old)
+    new = HealthServer(
+        old.port,
+        lambda: CheckHttpResponse(message='new', http_code=200)
+    )
+
+    with pytest.raises(socket.error) as err:
+        new.bind()
+    assert err.value.errno == errno.EADDRINUSE
+    old.stop()
+
+
+def test_stop_waits_for_probes_in_progress():
+    probed = Event()
+    release = Event()
+
+    def respond():
+        probed.set()
+        release.wait(5)
+        return CheckHttpResponse(message='ok', http_code=200)
+
+    server = HealthServer(0, respond)
+    server.bind()
+    serving = Thread(target=server.serve_forever)
+    serving.start()
+
+    responses = []
+    client = Thread(target=lambda: responses.append(_probe(server.port)))
+    client.start()
+    assert probed.wait(5)
+
+    server.stop()
+    serving.join(0.2)
+    assert serving.is_alive()
+
+    release.set()
+    serving.join(5)
+    client.join(5)
+    assert not serving.is_alive()
+    assert responses[0].endswith('ok\r\n')
+
+
+def test_take_over(tmpdir):
+    previous = subprocess.Popen(['sleep', '30'])
+    pid_file = str(tmpdir.join('health.pid'))
+    with open(pid_file, 'w') as pid:
+        pid.write('%d\n' % previous.pid)
+
+    _take_over(pid_file)
+
+    assert previous.wait() == -signal.SIGTERM
+    with open(pid_file) as pid:
+        assert int(pid.read()) == os.getpid()
+
+    _release(pid_file)
+    assert not os.path.exists(pid_file)
+
+
+def test_failed_check_responds_unknown():
+    def respond():
+        raise TypeError('expected string or buffer')
+
+    server = HealthServer(0, respond, workers=1, backlog=4)
+    _serve(server)
+
+    # The worker survives failed checks
+    for _ in range(3):
+        response = _probe(server.port)
+        assert response.startswith('HTTP/1.1 503 Service unavailable')
+        assert response.endswith(
+            'UNKNOWN - Check failed: expected string or buffer\r\n'
+        )
+    server.stop()
+
+
+def test_failed_agent_check_drains():
+    def respond():
+        raise TypeError('expected string or buffer')
+
+    server = HealthServer(
+        0,
+        respond,
+        read_request=False,
+        respond_error=agent_error_response
+    )
+    _serve(server)
+
+    client = socket.create_connection(('127.0.0.1', server.port), timeout=10)
+    assert client.recv(4096) == \
+        'drain #UNKNOWN - Check failed: expected string or buffer\n'
+    client.close()
+    server.stop()
+
+
+def test_idle_connection_times_out():
+    server = HealthServer(
+        0,
+        lambda: CheckHttpResponse(message='ok', http_code=200),
+        workers=1,
+        backlog=4,
+        request_timeout=0.2
+    )
+    _serve(server)
+
+    idle = socket.create_connection(('127.0.0.1', server.port), timeout=10)
+    try:
+        assert _probe(server.port).startswith('HTTP/1.1 200 OK')
+    finally:
+        idle.close()
+        server.stop()
@@ -0,0 +1,113 @@
+import pytest
+
+from twindb_infrastructure.history import HistoryFile, HistoryException, \
+    history_path, history_names, RESOLUTION_RAW, RESOLUTION_MINUTE, \
+    RESOLUTION_HOUR
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL
+
+CAPACITIES = {
+    RESOLUTION_RAW: 4,
+    RESOLUTION_MINUTE: 3,
+    RESOLUTION_HOUR: 2,
+}
+
+
+def test_record_and_read(tmpdir):
+    path = str(tmpdir.join('foo.history'))
+    writer = HistoryFile(path, writable=True, capacities=CAPACITIES)
+    writer.record(0.5, NAGIOS_EXIT_OK, timestamp=3600)
+    writer.record(None, NAGIOS_EXIT_CRITICAL, timestamp=3610)
+
+    reader = HistoryFile(path)
+    samples = reader.read()
+    assert [(s.timestamp, s.load_time, s.nagios_code) for s in samples] == [
+        (3600, 0.5, NAGIOS_EXIT_OK),
+        (3610, None, NAGIOS_EXIT_CRITICAL),
+    ]
+    assert [s.timestamp for s in reader.read(since=3605)] == [3610]
+
+    # The reader sees new records without reopening the file
+    writer.record(0.25, NAGIOS_EXIT_OK, timestamp=3620)
+    assert len(reader.read()) == 3
+
+
+def test_ring_overwrites_oldest(tmpdir):
+    path = str(tmpdir.join('foo.history'))
+    history = HistoryFile(path, writable=True, capacities=CAPACITIES)
+    for i in range(10):
+        history.record(0.5, NAGIOS_EXIT_OK, timestamp=i * 60)
+
+    assert [s.timestamp for s in history.read()] == [360, 420, 480, 540]
+    assert [r.timestamp for r in history.read(RESOLUTION_MINUTE)] == \
+        [420, 480, 540]
+
+
+def test_rollups(tmpdir):
+    path = str(tmpdir.join('foo.history'))
+    history = HistoryFile(path, writable=True, capacities=CAPACITIES)
+    history.record(0.5, NAGIOS_EXIT_OK, timestamp=7200)
+    history.record(1.5, NAGIOS_EXIT_WARNING, timestamp=7230)
+    history.record(None, NAGIOS_EXIT_CRITICAL, timestamp=7260)
+    history.record(0.25, NAGIOS_EXIT_OK, timestamp=10800)
+
+    minutes = history.read(RESOLUTION_MINUTE)
+    assert [(r.timestamp, r.samples, r.failures, r.timed) for r in minutes] \
+        == [(7200, 2, 1, 2), (7260, 1, 1, 0), (10800, 1, 0, 1)]
+    assert minutes[0].load_time_avg == 1.0
+    assert minutes[0].load_time_max == 1.5
+    assert minutes[0].nagios_code == NAGIOS_EXIT_WARNING
+    assert minutes[1].load_time_avg is None
+
+    hours = history.read(RESOLUTION_HOUR)
+    assert [(r.timestamp, r.samples, r.failures) for r in hours] == \
+        [(7200, 3, 2), (10800, 1, 0)]
+    assert hours[0].nagios_code == NAGIOS_EXIT_CRITICAL
+    assert hours[0].load_time_sum == 2.0
+
+
+def test_reopen_keeps_history(tmpdir):
+    path = str(tmpdir.join('foo.history'))
+    HistoryFile(path, writable=True, capacities=CAPACITIES).record(
+        0.5, NAGIOS_EXIT_OK, timestamp=60
+    )
+    history = HistoryFile(path, writable=True)
+    history.record(0.5, NAGIOS_EXIT_OK, timestamp=120)
+    assert [s.timestamp for s in history.read()] == [60, 120]
+
+
+def test_read_while_writing(tmpdir):
+    path = str(tmpdir.join('foo.history'))
+    writer = HistoryFile(path, writable=True, capacities=CAPACITIES)
+    writer._set_sequence(1)
+    reader = HistoryFile(path)
+    with pytest.raises(HistoryException):
+        reader.read()
+
+    # A new writer recovers the sequence of a dead one
+    HistoryFile(path, writable=True)
+    assert reader.read() == []
+
+
+def test_not_history_file(tmpdir):
+    path = tmpdir.join('foo.history')
+    path.write('garbage' * 10)
+    with pytest.raises(HistoryException):
+        HistoryFile(str(path))
+
+
+def test_read_invalid_resolution(tmpdir):
+    history = HistoryFile(str(tmpdir.join('foo.history')), writable=True)
+    with pytest.raises(ValueError):
+        history.read('1d')
+
+
+def test_history_names(tmpdir):
+    for name in ['http://foo/bar', 'baz']:
+        HistoryFile(
+            history_path(str(tmpdir), name),
+            writable=True,
+            capacities=CAPACITIES
+        )
+    tmpdir.join('other.txt').write('')
+    assert history_names(str(tmpdir)) == ['baz', 'http://foo/bar']
@@ -0,0 +1,55 @@
+import pytest
+
+from twindb_infrastructure.latency_window import LatencyWindow, \
+    PercentileThreshold, parse_threshold
+
+
+def test_percentile_empty():
+    assert LatencyWindow(10).percentile(95) is None
+
+
+@pytest.mark.parametrize('percent, expected', [
+    (50, 5),
+    (90, 9),
+    (95, 10),
+    (100, 10),
+    (1, 1),
+])
+def test_percentile(percent, expected):
+    window = LatencyWindow(10)
+    for value in range(10, 0, -1):
+        window.add(value)
+    assert window.percentile(percent) == expected
+
+
+def test_window_drops_oldest():
+    window = LatencyWindow(3)
+    for value in [100, 1, 2, 3]:
+        window.add(value)
+    assert len(window) == 3
+    assert window.percentile(100) == 3
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2', 2.0),
+    ('0.5', 0.5),
+])
+def test_parse_threshold_seconds(value, expected):
+    assert parse_threshold(value) == expected
+
+
+@pytest.mark.parametrize('value, percent, seconds', [
+    ('p95>2.0', 95, 2.0),
+    ('p99.9 > 1', 99.9, 1.0),
+])
+def test_parse_threshold_percentile(value, percent, seconds):
+    threshold = parse_threshold(value)
+    assert isinstance(threshold, PercentileThreshold)
+    assert threshold.percent == percent
+    assert threshold.seconds == seconds
+
+
+@pytest.mark.parametrize('value', ['p95', 'p0>1', 'p101>1', 'foo'])
+def test_parse_threshold_invalid(value):
+    with pytest.raises(ValueError):
+        parse_threshold(value)
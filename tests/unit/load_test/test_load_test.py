@@ -0,0 +1,38 @@
+import mock
+import pytest
+from requests import ConnectionError
+
+from twindb_infrastructure.load_test import LoadTest, LoadTestResult
+
+
+def test_run_requests():
+    mock_loader = mock.Mock()
+    clone = mock_loader.clone.return_value
+    type(clone).load_time = mock.PropertyMock(
+        side_effect=[0.1, ConnectionError(), 0.3, 0.2, 0.5]
+    )
+    result = LoadTest(mock_loader, concurrency=1, requests=5).run()
+
+    assert result.requests == 5
+    assert result.latencies == [0.1, 0.2, 0.3, 0.5]
+    assert result.errors == {'ConnectionError': 1}
+    assert clone.reset.call_count == 5
+
+
+def test_run_no_limits():
+    with pytest.raises(ValueError):
+        LoadTest(mock.Mock())
+
+
+def test_result():
+    result = LoadTestResult([0.3, 0.1, 2.0, 0.2], {'Timeout': 1}, 2.5)
+    assert result.requests == 5
+    assert result.throughput == 2.0
+    assert result.percentile(50) == 0.2
+    assert result.percentile(100) == 2.0
+    assert result.histogram(buckets=[0.15, 1]) == [
+        (0.15, 1),
+        (1, 2),
+        (None, 1),
+    ]
+    assert 'Throughput:  2.000000 requests/second' in str(result)
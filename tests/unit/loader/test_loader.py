@@ -1,8 +1,11 @@
+import re
 from textwrap import dedent
 
 import mock
+import pytest
+from requests import RequestException
 
-from twindb_infrastructure.loader import Loader
+from twindb_infrastructure.loader import Loader, ResponseTooLarge
 
 
 @mock.patch('twindb_infrastructure.loader.requests')
@@ -16,7 +19,7 @@ def test_loader(mock_requests):
         </html>
         """
     )
-    mock_requests.get.return_value = mock_response
+    mock_requests.Session.return_value.get.return_value = mock_response
     loader = Loader('xxx')
     assert loader.title == 'foo'
     assert loader.body == 'bar'
@@ -26,8 +29,8 @@ def test_loader(mock_requests):
 def test_loader_no_redirects(mock_requests):
     loader = Loader('xxx')
     assert loader.title is None
-    mock_requests.get.assert_called_once_with(
-        'xxx', allow_redirects=False, timeout=10
+    mock_requests.Session.return_value.get.assert_called_once_with(
+        'xxx', allow_redirects=False, timeout=10, stream=True
     )
 
 
@@ -35,10 +38,391 @@ def test_loader_no_redirects(mock_requests):
 def test_loader_with_headers(mock_requests):
     loader = Loader('xxx', host='foo.bar', protocol='aaa')
     assert loader.title is None
-    mock_requests.get.assert_called_once_with(
-        'xxx', allow_redirects=False, timeout=10,
+    mock_requests.Session.return_value.get.assert_called_once_with(
+        'xxx', allow_redirects=False, timeout=10, stream=True,
         headers={
             'Host': 'foo.bar',
             'X-Forwarded-Proto': 'aaa',
         }
     )
+
+
+def test_clone():
+    loader = Loader('xxx', timeout=3, host='foo.bar', protocol='aaa')
+    clone = loader.clone()
+    assert clone is not loader
+    assert clone.url == 'xxx'
+    assert clone._timeout == 3
+    assert clone._host == 'foo.bar'
+    assert clone._protocol == 'aaa'
+    assert clone._session is loader._session
+
+
+def test_loader_reuses_session():
+    mock_session = mock.Mock()
+    loader = Loader('xxx', session=mock_session)
+    loader.load()
+    loader.reset()
+    loader.load()
+    assert mock_session.get.call_count == 2
+    assert loader._session is mock_session
+
+
+@mock.patch.object(Loader, '_opened_connections')
+@mock.patch('twindb_infrastructure.loader.time')
+def test_loader_cold_and_warm_load_time(mock_time, mock_opened_connections):
+    loader = Loader('xxx', session=mock.Mock())
+
+    # New connection
+    mock_opened_connections.side_effect = [0, 1]
+    mock_time.time.side_effect = [10, 11, 12]
+    assert loader.load_time == 2
+    assert loader.connection_reused is False
+    assert loader.cold_load_time == 2
+    assert loader.warm_load_time is None
+
+    # Kept-alive connection
+    loader.reset()
+    mock_opened_connections.side_effect = [1, 1]
+    mock_time.time.side_effect = [20, 20.25, 20.5]
+    assert loader.load_time == 0.5
+    assert loader.connection_reused is True
+    assert loader.cold_load_time == 2
+    assert loader.warm_load_time == 0.5
+
+
+@mock.patch('twindb_infrastructure.loader.stop_recording')
+@mock.patch('twindb_infrastructure.loader.time')
+def test_loader_phase_timings(mock_time, mock_stop_recording):
+    mock_stop_recording.return_value = {'dns': 1, 'connect': 2}
+    mock_time.time.side_effect = [10, 14, 19]
+    loader = Loader('xxx', session=mock.Mock())
+    assert loader.phase_timings == {
+        'dns': 1,
+        'connect': 2,
+        'tls': 0,
+        'ttfb': 1,
+        'transfer': 5
+    }
+
+
+def test_loader_stream_stops_after_title():
+    mock_session = mock.Mock()
+    mock_response = mock_session.get.return_value
+    mock_response.iter_content.return_value = iter([
+        '<html><title>fo',
+        'o</title>',
+        '<body>bar</body></html>',
+    ])
+    loader = Loader(
+        'xxx',
+        session=mock_session,
+        stream=True,
+        required_tags=['title']
+    )
+    assert loader.title == 'foo'
+    assert loader.body is None
+    assert mock_session.get.call_args[1]['stream'] is True
+    mock_response.close.assert_called_once_with()
+
+
+def test_loader_stream_max_body_size():
+    mock_session = mock.Mock()
+    mock_response = mock_session.get.return_value
+    mock_response.iter_content.return_value = iter([
+        '<html><body>' + 'x' * 100,
+        'x' * 100,
+    ])
+    loader = Loader(
+        'xxx',
+        session=mock_session,
+        stream=True,
+        max_body_size=150
+    )
+    with pytest.raises(ResponseTooLarge):
+        loader.load()
+    mock_response.close.assert_called_once_with()
+
+
+@mock.patch('twindb_infrastructure.loader.requests')
+def test_loader_extracts_page(mock_requests):
+    mock_response = mock.Mock()
+    mock_response.content = dedent(
+        """
+        <html>
+        <head>
+        <title>foo</title>
+        <meta name="Description" content="Foo page">
+        <meta property="og:title" content="Foo" />
+        <meta http-equiv="refresh" content="30">
+        <meta charset="utf-8">
+        </head>
+        <body><p>bar <b>baz</b></p><script>var x = 1;</script>
+        <a href="/one">one</a><a name="anchor"></a><a href="/two">two</a>
+        <style>p {}</style>qux</body>
+        </html>
+        """
+    )
+    mock_requests.Session.return_value.get.return_value = mock_response
+    loader = Loader('xxx')
+    assert loader.title == 'foo'
+    assert loader.body == 'bar baz\nonetwo\nqux'
+    assert loader.meta == {
+        'description': 'Foo page',
+        'og:title': 'Foo',
+        'refresh': '30',
+    }
+    assert loader.links == ['/one', '/two']
+
+
+@mock.patch('twindb_infrastructure.loader.requests')
+def test_loader_parses_once(mock_requests):
+    mock_response = mock.Mock()
+    mock_response.content = '<html><title>foo</title><body>bar</body></html>'
+    mock_requests.Session.return_value.get.return_value = mock_response
+    loader = Loader('xxx')
+    with mock.patch.object(Loader, 'feed', wraps=loader.feed) as mock_feed:
+        assert loader.title == 'foo'
+        assert loader.body == 'bar'
+        assert loader.meta == {}
+        assert loader.links == []
+        assert mock_feed.call_count == 1
+
+        loader.reset()
+        assert loader.title == 'foo'
+        assert mock_feed.call_count == 2
+
+
+@mock.patch('twindb_infrastructure.loader.requests')
+def test_loader_no_body(mock_requests):
+    mock_response = mock.Mock()
+    mock_response.content = '<html><title></title></html>'
+    mock_requests.Session.return_value.get.return_value = mock_response
+    loader = Loader('xxx')
+    assert loader.title == ''
+    assert loader.body is None
+
+
+def _mock_response(status_code, content='', headers=None):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    return response
+
+
+def test_loader_error_status():
+    mock_session = mock.Mock()
+    response = _mock_response(404, '<title>Not Found</title>')
+    response.raise_for_status.side_effect = RequestException('404')
+    mock_session.get.return_value = response
+
+    with pytest.raises(RequestException):
+        Loader('xxx', session=mock_session).load()
+
+    loader = Loader('xxx', session=mock_session, check_status=False)
+    assert loader.status_code == 404
+    assert loader.title == 'Not Found'
+    assert loader.clone()._check_status is False
+
+
+def test_loader_conditional_not_modified():
+    mock_session = mock.Mock()
+    mock_session.get.side_effect = [
+        _mock_response(
+            200,
+            '<html><title>foo</title><body>bar</body></html>',
+            {'ETag': '"v1"', 'Last-Modified': 'Sat, 17 Oct 2026 00:00:00 GMT'}
+        ),
+        _mock_response(304, headers={'ETag': '"v1"'}),
+    ]
+    loader = Loader('xxx', session=mock_session, conditional=True)
+    assert loader.title == 'foo'
+    assert loader.not_modified is False
+    assert 'headers' not in mock_session.get.call_args[1]
+
+    loader.reset()
+    with mock.patch.object(Loader, 'feed') as mock_feed:
+        assert loader.load_time is not None
+        assert loader.not_modified is True
+        assert loader.status_code == 200
+        assert loader.title == 'foo'
+        assert loader.body == 'bar'
+        assert not mock_feed.called
+    assert mock_session.get.call_args[1]['headers'] == {
+        'If-None-Match': '"v1"',
+        'If-Modified-Since': 'Sat, 17 Oct 2026 00:00:00 GMT',
+    }
+
+
+def test_loader_conditional_modified():
+    mock_session = mock.Mock()
+    mock_session.get.side_effect = [
+        _mock_response(200, '<title>foo</title>', {'ETag': '"v1"'}),
+        _mock_response(200, '<title>bar</title>', {'ETag': '"v2"'}),
+        _mock_response(304),
+    ]
+    loader = Loader('xxx', session=mock_session, conditional=True)
+    assert loader.title == 'foo'
+    loader.reset()
+    assert loader.title == 'bar'
+    assert loader.not_modified is False
+    loader.reset()
+    assert loader.title == 'bar'
+    assert loader.not_modified is True
+    assert mock_session.get.call_args[1]['headers'] == {
+        'If-None-Match': '"v2"',
+    }
+
+
+def test_loader_conditional_disabled():
+    mock_session = mock.Mock()
+    mock_session.get.return_value = _mock_response(
+        200, '<title>foo</title>', {'ETag': '"v1"'}
+    )
+    loader = Loader('xxx', session=mock_session)
+    loader.load()
+    loader.reset()
+    loader.load()
+    assert 'headers' not in mock_session.get.call_args[1]
+    assert loader.not_modified is False
+
+
+def test_loader_collects_assets():
+    mock_session = mock.Mock()
+    mock_session.get.return_value = _mock_response(
+        200,
+        '<html><head>'
+        '<link rel="stylesheet" href="/a.css">'
+        '<link rel="canonical" href="/page">'
+        '<link rel="Shortcut Icon" href="/favicon.ico">'
+        '<script src="/a.js"></script><script>var x;</script>'
+        '</head><body><img src="b.png"><img alt="no src"></body></html>'
+    )
+    loader = Loader('http://foo/bar/', session=mock_session)
+    assert loader.assets == ['/a.css', '/favicon.ico', '/a.js', 'b.png']
+    assert loader.asset_timings is None
+    assert mock_session.get.call_count == 1
+
+
+def test_loader_fetch_assets():
+    mock_session = mock.Mock()
+    page = _mock_response(
+        200,
+        '<html><link rel="stylesheet" href="/a.css">'
+        '<script src="http://cdn/a.js"></script>'
+        '<img src="data:image/png;base64,AAAA">'
+        '<img src="b.png"><img src="/a.css"></html>'
+    )
+    assets = {
+        'http://foo/a.css': _mock_response(200, 'x' * 10),
+        'http://cdn/a.js': _mock_response(200, 'x' * 20),
+    }
+
+    def get(url, **kwargs):
+        if url == 'http://foo/bar/':
+            return page
+        if url == 'http://foo/bar/b.png':
+            raise RequestException('boom')
+        return assets[url]
+
+    mock_session.get.side_effect = get
+    loader = Loader(
+        'http://foo/bar/',
+        host='foo.bar',
+        session=mock_session,
+        fetch_assets=True
+    )
+    timings = dict([(a.url, a) for a in loader.asset_timings])
+    assert sorted(timings) == [
+        'http://cdn/a.js',
+        'http://foo/a.css',
+        'http://foo/bar/b.png',
+    ]
+    assert timings['http://foo/a.css'].size == 10
+    assert not timings['http://foo/a.css'].failed
+    assert timings['http://foo/bar/b.png'].failed
+    assert loader.page_weight == len(page.content) + 30
+    assert loader.load_time >= loader.document_load_time
+
+    # Page host assets go to the same server as the page
+    calls = dict([(c[0][0], c[1]) for c in mock_session.get.call_args_list])
+    assert calls['http://foo/a.css']['headers'] == {'Host': 'foo.bar'}
+    assert 'headers' not in calls['http://cdn/a.js']
+
+
+def _stream_loader(chunks, patterns, **kwargs):
+    mock_session = mock.Mock()
+    mock_response = mock_session.get.return_value
+    mock_response.headers = {}
+    mock_response.iter_content.side_effect = lambda size: iter(
+        [c for chunk in chunks for c in _split(chunk, size)]
+    )
+    return Loader(
+        'xxx',
+        session=mock_session,
+        stream=True,
+        required_tags=[],
+        stream_patterns=patterns,
+        **kwargs
+    ), mock_response
+
+
+def _split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_loader_stream_patterns_span_chunks():
+    foo = re.compile('foo-bar')
+    baz = re.compile('baz')
+    loader, mock_response = _stream_loader(
+        ['x' * 10 + 'foo-', 'bar' + 'x' * 10, 'never read'],
+        [foo, baz],
+        stream_buffer=16
+    )
+    assert loader.matched_patterns == set([foo])
+    assert loader.content_length == 37
+    assert loader.load() == ''
+    mock_response.iter_content.assert_called_once_with(8)
+
+
+def test_loader_stream_patterns_stop_on_match():
+    foo = re.compile('foo')
+    loader, mock_response = _stream_loader(
+        ['foo', 'x' * 100],
+        [foo],
+        stream_buffer=6
+    )
+    assert loader.matched_patterns == set([foo])
+    assert loader.content_length == 3
+    mock_response.close.assert_called_once_with()
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'stream_patterns': [re.compile('foo')]},
+    {'stream': True, 'stream_buffer': 1},
+])
+def test_loader_stream_patterns_invalid(kwargs):
+    with pytest.raises(ValueError):
+        Loader('xxx', session=mock.Mock(), **kwargs)
+
+
+@mock.patch('twindb_infrastructure.loader.time')
+def test_loader_throughput(mock_time):
+    mock_time.time.side_effect = [10, 11, 13]
+    mock_session = mock.Mock()
+    mock_session.get.return_value.content = 'x' * 1000
+    loader = Loader('xxx', session=mock_session)
+    assert loader.body_size == 1000
+    assert loader.throughput == 500
+
+
+def test_loader_stream_full_body():
+    loader, mock_response = _stream_loader(
+        ['<title>foo</title>', 'x' * 100],
+        [],
+        full_body=True
+    )
+    loader._required_tags = ['title']
+    assert loader.title == 'foo'
+    assert loader.body_size == 118
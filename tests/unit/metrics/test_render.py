@@ -0,0 +1,35 @@
+import mock
+from requests import ConnectionError
+
+from twindb_infrastructure.metrics import CheckMetrics
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, NAGIOS_EXIT_CRITICAL
+
+
+@mock.patch('twindb_infrastructure.metrics.time')
+def test_render(mock_time):
+    mock_time.time.return_value = 1500000000
+    metrics = CheckMetrics(buckets=[0.1, 1])
+    metrics.observe_load_time(0.05)
+    metrics.observe_load_time(0.5)
+    metrics.observe_load_time(5)
+    metrics.observe_result(NAGIOS_EXIT_OK)
+    metrics.observe_result(NAGIOS_EXIT_CRITICAL)
+    metrics.observe_error(ConnectionError())
+
+    lines = metrics.render().splitlines()
+    assert 'twindb_check_http_load_time_seconds_bucket{le="0.1"} 1' in lines
+    assert 'twindb_check_http_load_time_seconds_bucket{le="1"} 2' in lines
+    assert 'twindb_check_http_load_time_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'twindb_check_http_load_time_seconds_sum 5.550000' in lines
+    assert 'twindb_check_http_load_time_seconds_count 3' in lines
+    assert 'twindb_check_http_results_total{status="ok"} 1' in lines
+    assert 'twindb_check_http_results_total{status="critical"} 1' in lines
+    assert 'twindb_check_http_results_total{status="warning"} 0' in lines
+    assert 'twindb_check_http_upstream_errors_total' \
+           '{type="ConnectionError"} 1' in lines
+    assert 'twindb_check_http_last_success_timestamp_seconds ' \
+           '1500000000.000000' in lines
+
+
+def test_render_no_success():
+    assert 'last_success' not in CheckMetrics().render()
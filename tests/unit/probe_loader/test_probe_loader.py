@@ -0,0 +1,146 @@
+import socket
+from threading import Thread
+
+import pytest
+from requests import ConnectionError, HTTPError
+
+from twindb_infrastructure.check_http import HttpChecker, CheckResponse
+from twindb_infrastructure.loader import PHASES
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, NAGIOS_EXIT_CRITICAL
+from twindb_infrastructure.probe_loader import ProbeLoader, ProbeError, \
+    _parse_head, _ssl_context
+
+
+def _server(response):
+    """Answer one connection with the response, return the port
+    and the list the request is appended to."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    requests = []
+
+    def serve():
+        conn, _ = listener.accept()
+        requests.append(conn.recv(4096))
+        conn.sendall(response)
+        conn.close()
+        listener.close()
+
+    thread = Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    return listener.getsockname()[1], requests
+
+
+@pytest.mark.parametrize('mode, method', [
+    ('head', 'HEAD'),
+    ('raw', 'GET'),
+])
+def test_probe(mode, method):
+    port, requests = _server(
+        'HTTP/1.1 200 OK\r\n'
+        'Content-Length: 1000\r\n'
+        'X-Foo: bar\r\n\r\n'
+        'body is not read'
+    )
+    loader = ProbeLoader(
+        'http://127.0.0.1:%d/health?x=1' % port,
+        mode=mode,
+        host='foo.bar',
+        protocol='https'
+    )
+
+    assert loader.status_code == 200
+    assert loader.headers['x-foo'] == 'bar'
+    assert loader.content_length == 1000
+    assert loader.load_time > 0
+    assert set(loader.phase_timings) == set(PHASES)
+    assert requests[0] == (
+        '%s /health?x=1 HTTP/1.1\r\n'
+        'Host: foo.bar\r\n'
+        'Connection: close\r\n'
+        'X-Forwarded-Proto: https\r\n\r\n' % method
+    )
+
+
+def test_probe_tcp():
+    port, requests = _server('')
+    loader = ProbeLoader('http://127.0.0.1:%d/' % port, mode='tcp')
+
+    assert loader.status_code is None
+    assert loader.load_time > 0
+
+
+def test_probe_error_status():
+    port, _ = _server('HTTP/1.1 503 Service Unavailable\r\n\r\n')
+    loader = ProbeLoader('http://127.0.0.1:%d/' % port)
+
+    with pytest.raises(HTTPError):
+        loader.load()
+
+
+def test_probe_refused():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    listener.close()
+
+    with pytest.raises(ConnectionError):
+        ProbeLoader('http://127.0.0.1:%d/' % port).load()
+
+
+def test_probe_closed_before_headers():
+    port, _ = _server('HTTP/1.1 200 OK\r\n')
+
+    with pytest.raises(ProbeError):
+        ProbeLoader('http://127.0.0.1:%d/' % port).load()
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        ProbeLoader('http://foo', mode='bar')
+
+
+def test_parse_head():
+    status_code, headers = _parse_head(
+        'HTTP/1.0 301 Moved\r\n'
+        'Location: /foo\r\n'
+        'Set-Cookie: a=1\r\n'
+        'set-cookie: b=2'
+    )
+    assert status_code == 301
+    assert headers['location'] == '/foo'
+    assert headers['Set-Cookie'] == 'a=1, b=2'
+
+
+def test_ssl_context_is_shared():
+    assert _ssl_context() is _ssl_context()
+
+
+def test_parse_head_invalid():
+    with pytest.raises(ProbeError):
+        _parse_head('SSH-2.0-OpenSSH')
+
+
+@pytest.mark.parametrize('critical, nagios_code', [
+    (10, NAGIOS_EXIT_OK),
+    (0.0000001, NAGIOS_EXIT_CRITICAL),
+])
+def test_checked_like_loader(critical, nagios_code):
+    port, _ = _server('HTTP/1.1 200 OK\r\n\r\n')
+    checker = HttpChecker(critical_load_time=critical, status_code=200)
+    resp = checker.check(
+        ProbeLoader('http://127.0.0.1:%d/' % port),
+        CheckResponse
+    )
+    assert resp.nagios_code == nagios_code
+
+
+def test_clone():
+    loader = ProbeLoader('xxx', mode='raw', timeout=3, host='foo.bar')
+    clone = loader.clone()
+    assert clone is not loader
+    assert clone.url == 'xxx'
+    assert clone.mode == 'raw'
+    assert clone._timeout == 3
+    assert clone._host == 'foo.bar'
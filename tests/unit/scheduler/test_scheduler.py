@@ -0,0 +1,128 @@
+import time
+
+import mock
+import pytest
+
+from twindb_infrastructure.check_http import CheckResponse, \
+    CheckHttpResponse
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_UNKNOWN
+from twindb_infrastructure.scheduler import CheckScheduler
+
+
+def _target(name, nagios_codes):
+    target = mock.Mock()
+    target.name = name
+    target.url = 'http://%s' % name
+    target.check.side_effect = [
+        CheckResponse(message='%s - %s' % (code, name), nagios_code=code)
+        for code in nagios_codes
+    ]
+    return target
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'min_interval': 0},
+    {'min_interval': 10, 'max_interval': 5},
+    {'backoff': 0.5},
+    {'jitter': 1},
+])
+def test_invalid_options(kwargs):
+    with pytest.raises(ValueError):
+        CheckScheduler([], **kwargs)
+
+
+def test_reschedule_backs_off_and_resets():
+    target = _target('foo', [])
+    scheduler = CheckScheduler(
+        [target], min_interval=1, max_interval=5, backoff=2, jitter=0
+    )
+    schedule = scheduler._schedules[0]
+    intervals = []
+    for code in [NAGIOS_EXIT_OK, NAGIOS_EXIT_OK, NAGIOS_EXIT_OK,
+                 NAGIOS_EXIT_OK, NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_CRITICAL,
+                 NAGIOS_EXIT_OK, NAGIOS_EXIT_OK]:
+        scheduler._reschedule(
+            schedule,
+            CheckResponse(message='', nagios_code=code)
+        )
+        intervals.append(schedule.interval)
+
+    # Back off, cap, fail, flap back to OK, back off again
+    assert intervals == [2, 4, 5, 5, 1, 1, 1, 2]
+    assert len(scheduler._queue) == len(intervals)
+
+
+def test_reschedule_jitter():
+    scheduler = CheckScheduler(
+        [_target('foo', [])], min_interval=10, jitter=0.5
+    )
+    schedule = scheduler._schedules[0]
+    with mock.patch('twindb_infrastructure.scheduler.time') as mock_time:
+        mock_time.time.return_value = 100
+        for _ in range(20):
+            scheduler._reschedule(
+                schedule,
+                CheckResponse(
+                    message='',
+                    nagios_code=NAGIOS_EXIT_CRITICAL
+                )
+            )
+            assert 105 <= schedule.due <= 115
+
+
+def test_get_aggregates_last_results():
+    scheduler = CheckScheduler([_target('foo', []), _target('bar', [])])
+    scheduler._reschedule(
+        scheduler._schedules[0],
+        CheckResponse(message='WARNING - foo', nagios_code=NAGIOS_EXIT_WARNING)
+    )
+    response = scheduler.get(CheckResponse)
+    assert response.nagios_code == NAGIOS_EXIT_WARNING
+    assert str(response) == \
+        'foo: WARNING - foo\nbar: UNKNOWN - no check result yet'
+
+    response = scheduler.get()
+    assert isinstance(response, CheckHttpResponse)
+    assert response.http_code == 200
+
+
+def test_render():
+    scheduler = CheckScheduler([_target('foo', []), _target('bar', [])])
+    schedule = scheduler._schedules[0]
+    scheduler._reschedule(
+        schedule,
+        CheckResponse(message='', nagios_code=NAGIOS_EXIT_CRITICAL),
+        lag=0.5
+    )
+    metrics = scheduler.render()
+    assert 'twindb_check_http_schedule_lag_seconds{target="foo"} 0.500000' \
+        in metrics
+    assert 'twindb_check_http_schedule_lag_seconds{target="bar"}' \
+        not in metrics
+    assert 'twindb_check_http_check_interval_seconds{target="foo"} ' \
+        '10.000000' in metrics
+    assert 'twindb_check_http_check_interval_seconds{target="bar"} ' \
+        '10.000000' in metrics
+    assert 'twindb_check_http_target_status{target="foo"} 2.000000' \
+        in metrics
+
+
+def test_start_checks_failing_target_more_often():
+    healthy = _target('healthy', [NAGIOS_EXIT_OK] * 100)
+    failing = _target('failing', [NAGIOS_EXIT_CRITICAL] * 100)
+    scheduler = CheckScheduler(
+        [healthy, failing],
+        min_interval=0.05,
+        max_interval=10,
+        workers=2
+    )
+    scheduler.start()
+    time.sleep(0.5)
+    scheduler.stop()
+
+    assert failing.check.call_count > 3
+    assert healthy.check.call_count <= 3
+    assert scheduler.get().nagios_code == NAGIOS_EXIT_CRITICAL
+    for schedule in scheduler._schedules:
+        assert schedule.lag >= 0
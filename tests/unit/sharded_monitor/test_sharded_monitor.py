@@ -0,0 +1,109 @@
+import os
+import signal
+import time
+
+import mock
+import pytest
+
+from twindb_infrastructure.check_http import CheckResponse
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_UNKNOWN
+from twindb_infrastructure.sharded_monitor import HashRing, ShardedMonitor
+
+
+def _target(name, nagios_code=NAGIOS_EXIT_OK):
+    target = mock.Mock()
+    target.name = name
+    target.url = 'http://%s' % name
+    target.check.return_value = CheckResponse(
+        message='%s is checked in %d' % (name, nagios_code),
+        nagios_code=nagios_code
+    )
+    return target
+
+
+def test_hash_ring_is_stable():
+    keys = ['target-%d' % i for i in range(1000)]
+    ring = HashRing(range(4))
+    assignment = dict([(k, ring.get_node(k)) for k in keys])
+    assert assignment == dict([(k, HashRing(range(4)).get_node(k))
+                               for k in keys])
+    # Every node gets a fair share of keys
+    for node in range(4):
+        assert 150 < assignment.values().count(node) < 350
+
+    # A new node takes keys only from the others, nothing else moves
+    ring = HashRing(range(5))
+    moved = [k for k in keys if ring.get_node(k) != assignment[k]]
+    assert 100 < len(moved) < 300
+    assert all([ring.get_node(k) == 4 for k in moved])
+
+
+def test_hash_ring_empty():
+    with pytest.raises(ValueError):
+        HashRing([])
+
+
+def test_shards():
+    targets = [_target('target-%d' % i) for i in range(20)]
+    monitor = ShardedMonitor(targets, processes=3)
+    assert sorted([t.name for shard in monitor.shards for t in shard]) == \
+        sorted([t.name for t in targets])
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'processes': 0},
+    {'min_interval': 0},
+])
+def test_invalid_options(kwargs):
+    with pytest.raises(ValueError):
+        ShardedMonitor([_target('foo')], **kwargs)
+
+
+def test_get_before_reports():
+    monitor = ShardedMonitor([_target('foo')])
+    response = monitor.get(CheckResponse)
+    assert response.nagios_code == NAGIOS_EXIT_UNKNOWN
+    assert str(response) == 'foo: UNKNOWN - no check result yet'
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+
+def test_workers_report_and_restart():
+    targets = [
+        _target('foo'),
+        _target('bar', NAGIOS_EXIT_CRITICAL),
+        _target('baz'),
+    ]
+    monitor = ShardedMonitor(
+        targets,
+        processes=2,
+        report_interval=0.05,
+        min_interval=0.05
+    )
+    monitor.start()
+    try:
+        _wait_for(lambda: None not in
+                  [s.output for s in monitor.statuses()])
+        response = monitor.get(CheckResponse)
+        assert response.nagios_code == NAGIOS_EXIT_CRITICAL
+        assert str(response).splitlines() == [
+            'foo: foo is checked in 0',
+            'bar: bar is checked in 2',
+            'baz: baz is checked in 0',
+        ]
+        assert 'twindb_check_http_schedule_lag_seconds{target="bar"}' \
+            in monitor.render()
+
+        worker = monitor._workers[0]
+        os.kill(worker.pid, signal.SIGKILL)
+        _wait_for(lambda: monitor._workers[0] is not worker
+                  and monitor._workers[0].is_alive())
+    finally:
+        for worker in monitor._workers:
+            worker.terminate()
@@ -0,0 +1,24 @@
+import mock
+
+from twindb_infrastructure.check_http import CheckResponse, \
+    NAGIOS_EXIT_OK, NAGIOS_EXIT_UNKNOWN
+from twindb_infrastructure.targets import check_targets
+
+
+def test_check_targets():
+    ok_target = mock.Mock()
+    ok_target.check.return_value = CheckResponse(
+        message='OK', nagios_code=NAGIOS_EXIT_OK
+    )
+    broken_target = mock.Mock()
+    broken_target.check.side_effect = ValueError('foo')
+
+    responses = check_targets([ok_target, broken_target], concurrency=2)
+    assert [r.nagios_code for r in responses] == [
+        NAGIOS_EXIT_OK,
+        NAGIOS_EXIT_UNKNOWN
+    ]
+
+
+def test_check_targets_empty():
+    assert check_targets([]) == []
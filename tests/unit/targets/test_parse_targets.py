@@ -0,0 +1,47 @@
+from textwrap import dedent
+
+import pytest
+
+from twindb_infrastructure.targets import parse_targets, TargetsException
+
+
+def test_parse_targets(tmpdir):
+    targets_file = tmpdir.join('targets.ini')
+    targets_file.write(dedent(
+        """
+        [DEFAULT]
+        critical = 5
+        protocol = https
+
+        [home]
+        url = http://10.0.0.1/
+        host = example.com
+        title_regexp = ^Home.*%%
+
+        [blog]
+        url = http://10.0.0.2/blog
+        critical = 2.5
+        timeout = 3
+        """
+    ))
+    targets = parse_targets(str(targets_file))
+    assert [t.name for t in targets] == ['home', 'blog']
+    assert targets[0].url == 'http://10.0.0.1/'
+    assert targets[0]._critical == 5.0
+    assert targets[0]._host == 'example.com'
+    assert targets[0]._protocol == 'https'
+    assert targets[0]._title_regexp == '^Home.*%%'
+    assert targets[1]._critical == 2.5
+    assert targets[1]._timeout == 3
+
+
+def test_parse_targets_no_url(tmpdir):
+    targets_file = tmpdir.join('targets.ini')
+    targets_file.write('[home]\nhost = example.com\n')
+    with pytest.raises(TargetsException):
+        parse_targets(str(targets_file))
+
+
+def test_parse_targets_no_file(tmpdir):
+    with pytest.raises(TargetsException):
+        parse_targets(str(tmpdir.join('missing.ini')))
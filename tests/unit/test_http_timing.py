@@ -0,0 +1,24 @@
+import socket
+
+from twindb_infrastructure.http_timing import TimedHTTPConnection, \
+    start_recording, stop_recording
+
+
+def test_timed_connection_records_phases():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    conn = TimedHTTPConnection('127.0.0.1', server.getsockname()[1])
+
+    start_recording()
+    conn.connect()
+    timings = stop_recording()
+
+    conn.close()
+    server.close()
+    assert sorted(timings.keys()) == ['connect', 'dns']
+    assert conn.host == '127.0.0.1'
+
+
+def test_stop_recording_without_start():
+    assert stop_recording() == {}
@@ -0,0 +1,29 @@
+import pytest
+
+from twindb_infrastructure.nagios import worst_nagios_code, \
+    NAGIOS_EXIT_OK, NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL, \
+    NAGIOS_EXIT_UNKNOWN, PerfData
+
+
+@pytest.mark.parametrize('codes, expected', [
+    ([], NAGIOS_EXIT_OK),
+    ([NAGIOS_EXIT_OK, NAGIOS_EXIT_OK], NAGIOS_EXIT_OK),
+    ([NAGIOS_EXIT_OK, NAGIOS_EXIT_UNKNOWN], NAGIOS_EXIT_UNKNOWN),
+    ([NAGIOS_EXIT_UNKNOWN, NAGIOS_EXIT_WARNING], NAGIOS_EXIT_WARNING),
+    ([NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_WARNING], NAGIOS_EXIT_CRITICAL),
+])
+def test_worst_nagios_code(codes, expected):
+    assert worst_nagios_code(codes) == expected
+
+
+@pytest.mark.parametrize('perfdata, expected', [
+    (PerfData('time', 0.5, uom='s'), 'time=0.500000s'),
+    (
+        PerfData('time', 0.5, uom='s', warning=1, critical=2.5, minimum=0),
+        'time=0.500000s;1;2.500000;0'
+    ),
+    (PerfData('size', 100, uom='B', maximum=200), 'size=100B;;;;200'),
+    (PerfData("it's a=b", 1), "'it''s a=b'=1"),
+])
+def test_perfdata_str(perfdata, expected):
+    assert str(perfdata) == expected
@@ -0,0 +1,136 @@
+"""Module with BackendLoaders() class"""
+import socket
+import time
+from threading import Lock
+from urlparse import urlparse
+
+from requests import ConnectionError
+
+from twindb_infrastructure.probe_loader import _DEFAULT_PORTS
+
+# Seconds resolved addresses are kept. The system resolver
+# doesn't tell the record TTL.
+DNS_TTL = 60
+
+
+class Resolver(object):
+    """
+    Resolve a host to all its IPv4 and IPv6 addresses and cache
+    them for ``ttl`` seconds.
+
+    :param ttl: Seconds to cache the addresses of a host.
+    :type ttl: float
+    """
+    def __init__(self, ttl=DNS_TTL):
+        self._ttl = ttl
+        self._cache = {}
+        self._lock = Lock()
+
+    def resolve(self, host, port):
+        """
+        Get all addresses of a host.
+
+        :param host: Host name.
+        :type host: str
+        :param port: TCP port.
+        :type port: int
+        :return: Sorted unique IP addresses.
+        :rtype: list(str)
+        :raise socket.error: if the host can't be resolved.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get((host, port))
+            if cached and cached[0] > now:
+                return cached[1]
+
+        addresses = sorted(
+            set(
+                [
+                    info[4][0] for info in socket.getaddrinfo(
+                        host,
+                        port,
+                        0,
+                        socket.SOCK_STREAM
+                    )
+                ]
+            )
+        )
+        with self._lock:
+            self._cache[(host, port)] = (now + self._ttl, addresses)
+
+        return addresses
+
+
+class BackendLoaders(object):
+    """
+    Loaders of a URL, one per address of its host.
+
+    Every loader is a clone of ``loader`` that connects to one of the
+    addresses and sends the original Host header. A loader is kept
+    while its address resolves, so its kept-alive connections are
+    reused. :class:`HttpChecker` checks all of them at once.
+
+    :param loader: Loader of the URL.
+    :type loader: Loader
+    :param resolver: Resolver of the URL host. Clones share it.
+    :type resolver: Resolver
+    """
+    def __init__(self, loader, resolver=None):
+        self._loader = loader
+        self._resolver = resolver or Resolver()
+        self._loaders = {}
+        self._lock = Lock()
+
+    @property
+    def url(self):
+        return self._loader.url
+
+    def loaders(self):
+        """
+        Get loaders of all addresses of the URL host.
+
+        :return: List of address and loader pairs sorted by address.
+        :rtype: list(tuple)
+        :raise ConnectionError: if the host can't be resolved.
+        """
+        parsed = urlparse(self.url)
+        try:
+            addresses = self._resolver.resolve(
+                parsed.hostname,
+                parsed.port or _DEFAULT_PORTS.get(parsed.scheme)
+            )
+        except socket.error as err:
+            raise ConnectionError(
+                'Failed to resolve %s: %s' % (parsed.hostname, err)
+            )
+
+        with self._lock:
+            for address in set(self._loaders) - set(addresses):
+                self._loaders.pop(address).close()
+            for address in addresses:
+                if address not in self._loaders:
+                    self._loaders[address] = self._loader.clone(
+                        address=address
+                    )
+
+            return [(a, self._loaders[a]) for a in addresses]
+
+    def reset(self):
+        with self._lock:
+            for loader in self._loaders.values():
+                loader.reset()
+
+    def clone(self):
+        """Create backend loaders of the same URL that share
+        the resolver.
+
+        :rtype: BackendLoaders
+        """
+        return self.__class__(self._loader, resolver=self._resolver)
+
+    def close(self):
+        """Close all kept-alive connections."""
+        with self._lock:
+            for loader in self._loaders.values():
+                loader.close()
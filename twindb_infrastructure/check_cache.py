@@ -0,0 +1,144 @@
+"""Module with CheckCache() class"""
+import time
+from threading import Lock, Thread
+
+from twindb_infrastructure import log
+from twindb_infrastructure.check_http import CheckHttpResponse, \
+    NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_UNKNOWN
+
+STALE_RESPONSE_LAST = 'last'
+STALE_RESPONSE_CRITICAL = 'critical'
+STALE_RESPONSE_UNKNOWN = 'unknown'
+
+STALE_RESPONSES = [
+    STALE_RESPONSE_LAST,
+    STALE_RESPONSE_CRITICAL,
+    STALE_RESPONSE_UNKNOWN
+]
+
+
+class CheckCache(object):
+    """
+    Check result that is refreshed in the background.
+
+    A refresher thread runs the check every ``refresh_interval``
+    seconds. Probes get the last result without touching the
+    upstream page.
+
+    :param checker: Checker to run.
+    :type checker: HttpChecker
+    :param loader: Loader for the checked URL.
+    :type loader: Loader
+    :param refresh_interval: Seconds between two checks.
+    :type refresh_interval: float
+    :param max_staleness: A result older than this many seconds is stale.
+        By default three refresh intervals.
+    :type max_staleness: float
+    :param stale_response: What to respond with when the result is stale.
+        ``last`` - the last result anyway, ``critical`` or ``unknown`` -
+        a result with the respective status.
+    :type stale_response: str
+    :param resp_class: Response type of the check result.
+    :type resp_class: class
+    """
+    def __init__(self, checker, loader,
+                 refresh_interval=10,
+                 max_staleness=None,
+                 stale_response=STALE_RESPONSE_CRITICAL,
+                 resp_class=CheckHttpResponse):
+        if stale_response not in STALE_RESPONSES:
+            raise ValueError(
+                'stale_response must be one of %s'
+                % ', '.join(STALE_RESPONSES)
+            )
+        self._checker = checker
+        self._loader = loader
+        self._refresh_interval = refresh_interval
+        self._max_staleness = max_staleness \
+            if max_staleness is not None else 3 * refresh_interval
+        self._stale_response = stale_response
+        self._resp_class = resp_class
+        self._response = None
+        self._updated = None
+        self._lock = Lock()
+
+    @property
+    def age(self):
+        """Seconds since the last refresh or None if there was none."""
+        with self._lock:
+            if self._updated is None:
+                return None
+            return time.time() - self._updated
+
+    def start(self):
+        """Start the refresher thread."""
+        refresher = Thread(target=self._refresh_forever)
+        refresher.daemon = True
+        refresher.start()
+
+    def refresh(self):
+        """Run the check and store its result."""
+        try:
+            response = self._checker.check(self._loader, self._resp_class)
+        finally:
+            self._loader.reset()
+
+        with self._lock:
+            self._response = response
+            self._updated = time.time()
+
+    def get(self):
+        """
+        Get the last check result.
+
+        :return: Response
+        :rtype: CheckResponse
+        """
+        with self._lock:
+            response = self._response
+            updated = self._updated
+
+        if response is None:
+            return self._make_response(
+                'UNKNOWN - %s: no check result yet' % self._loader.url,
+                NAGIOS_EXIT_UNKNOWN
+            )
+
+        age = time.time() - updated
+        if age <= self._max_staleness \
+                or self._stale_response == STALE_RESPONSE_LAST:
+            return response
+
+        if self._stale_response == STALE_RESPONSE_CRITICAL:
+            status, nagios_code = 'CRITICAL', NAGIOS_EXIT_CRITICAL
+        else:
+            status, nagios_code = 'UNKNOWN', NAGIOS_EXIT_UNKNOWN
+
+        return self._make_response(
+            '%s - %s: check result is %f seconds old'
+            % (status, self._loader.url, age),
+            nagios_code
+        )
+
+    def _make_response(self, message, nagios_code):
+        kwargs = {
+            'message': message,
+            'nagios_code': nagios_code
+        }
+        if self._resp_class == CheckHttpResponse:
+            kwargs['http_code'] = 503
+
+        return self._resp_class(**kwargs)
+
+    def _refresh_forever(self):
+        while True:
+            start = time.time()
+            try:
+                self.refresh()
+            # Keep refreshing whatever happens; a failing
+            # refresher shows up as a stale result.
+            except Exception as err:  # pylint: disable=broad-except
+                log.error('Failed to refresh check result: %s', err)
+
+            elapsed = time.time() - start
+            time.sleep(max(0, self._refresh_interval - elapsed))
@@ -0,0 +1,151 @@
+"""
+Thin client of the twindb-monitoring check daemon.
+
+The module imports nothing but the standard library, so it starts
+in milliseconds. It sends check parameters to the daemon over
+a Unix socket, prints the result and exits with its Nagios code.
+"""
+import argparse
+import json
+import socket
+import sys
+
+DEFAULT_SOCKET = '/var/run/twindb-monitoring.sock'
+
+NAGIOS_EXIT_UNKNOWN = 3
+
+# Options passed to the daemon as they are
+CHECK_OPTIONS = [
+    'warning',
+    'critical',
+    'timeout',
+    'title',
+    'title_regexp',
+    'body_regexp',
+    'status_code',
+    'header_regexp',
+    'min_content_length',
+    'max_content_length',
+    'host',
+    'protocol',
+]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Check URL with the twindb-monitoring daemon. '
+                    'The exit code matches Nagios convention.'
+    )
+    parser.add_argument('url')
+    parser.add_argument(
+        '-w', '--warning',
+        help='Response time to result in warning status (seconds) '
+             'or a percentile, e.g. p95>2.0'
+    )
+    parser.add_argument(
+        '-c', '--critical',
+        help='Response time to result in critical status (seconds) '
+             'or a percentile, e.g. p95>2.0'
+    )
+    parser.add_argument(
+        '-t', '--timeout',
+        help='Seconds before connection times out',
+        type=int
+    )
+    parser.add_argument('--title', help='Expect the string to be a title')
+    parser.add_argument(
+        '--title-regexp',
+        help='Expect the regexp to match the title'
+    )
+    parser.add_argument(
+        '--body-regexp',
+        help='Expect the regexp to match the body'
+    )
+    parser.add_argument(
+        '--status-code',
+        help='Expect this HTTP status code',
+        type=int
+    )
+    parser.add_argument(
+        '--header-regexp',
+        help="Expect a response header to match a regexp: 'Name: regexp'"
+    )
+    parser.add_argument(
+        '--min-content-length',
+        help='Expect the content to be at least this many bytes',
+        type=int
+    )
+    parser.add_argument(
+        '--max-content-length',
+        help='Expect the content to be at most this many bytes',
+        type=int
+    )
+    parser.add_argument('--host', help='Pass this value as Host: HTTP header')
+    parser.add_argument(
+        '--protocol',
+        help='This value is used for X-Forwarded-Proto header'
+    )
+    parser.add_argument(
+        '--http',
+        help='Print result as an HTTP response',
+        action='store_true'
+    )
+    parser.add_argument(
+        '--socket',
+        help='Unix socket of the daemon (default: %s)' % DEFAULT_SOCKET,
+        default=DEFAULT_SOCKET
+    )
+    return parser.parse_args(argv)
+
+
+def request_check(socket_path, params, timeout=None):
+    """
+    Ask the daemon to run a check.
+
+    :param socket_path: Unix socket of the daemon.
+    :type socket_path: str
+    :param params: Check parameters.
+    :type params: dict
+    :param timeout: Seconds to wait for the result.
+    :type timeout: float
+    :return: Check output and Nagios exit code.
+    :rtype: tuple(str, int)
+    :raise socket.error: if the daemon can't be reached.
+    :raise ValueError: if the daemon responds with garbage.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(params) + '\n')
+        chunks = []
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+
+    result = json.loads(''.join(chunks))
+    return result['output'], result['nagios_code']
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    params = {'url': args.url, 'http': args.http}
+    for option in CHECK_OPTIONS:
+        value = getattr(args, option)
+        if value is not None:
+            params[option] = value
+
+    # Leave the daemon time to hit its own connection timeout
+    timeout = (args.timeout or 10) + 5
+    try:
+        output, nagios_code = request_check(args.socket, params, timeout)
+    except (socket.error, ValueError, KeyError) as err:
+        output = 'UNKNOWN - check daemon at %s: %s' % (args.socket, err)
+        nagios_code = NAGIOS_EXIT_UNKNOWN
+
+    sys.stdout.write(output + '\n')
+    sys.exit(nagios_code)
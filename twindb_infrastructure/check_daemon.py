@@ -0,0 +1,128 @@
+"""Module with CheckDaemon() class"""
+import json
+import os
+import re
+from SocketServer import StreamRequestHandler, ThreadingUnixStreamServer
+from threading import Lock
+
+from twindb_infrastructure import log
+from twindb_infrastructure.check_client import DEFAULT_SOCKET, CHECK_OPTIONS
+from twindb_infrastructure.check_http import CheckHttpResponse, \
+    CheckResponse
+from twindb_infrastructure.latency_window import parse_threshold
+from twindb_infrastructure.nagios import NAGIOS_EXIT_UNKNOWN
+from twindb_infrastructure.targets import Target, TargetsException
+
+
+class CheckDaemon(object):
+    """
+    Long-running process that runs checks for thin clients.
+
+    A client sends check parameters as a JSON line over a Unix socket
+    and gets back a JSON line with the output and the Nagios code.
+    The daemon keeps a target per distinct set of parameters, so its
+    kept-alive connections and latency window survive between checks.
+
+    :param socket_path: Unix socket to listen on.
+    :type socket_path: str
+    """
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self._socket_path = socket_path
+        self._targets = {}
+        self._lock = Lock()
+        self._server = None
+
+    def serve_forever(self):
+        """Serve clients until interrupted."""
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+        self._server = ThreadingUnixStreamServer(
+            self._socket_path,
+            _CheckRequestHandler
+        )
+        self._server.daemon_threads = True
+        self._server.check_daemon = self
+        log.info('Listening on %s', self._socket_path)
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+            os.unlink(self._socket_path)
+
+    def stop(self):
+        """Stop serving clients. Must be called from another thread."""
+        if self._server:
+            self._server.shutdown()
+
+    def check(self, params):
+        """
+        Run a check.
+
+        :param params: Check parameters as sent by the client.
+        :type params: dict
+        :return: Response
+        :rtype: CheckResponse
+        :raise TargetsException: if the parameters are invalid.
+        """
+        resp_class = CheckHttpResponse if params.get('http') \
+            else CheckResponse
+        target, lock = self._get_target(params)
+        # A target's loader serves one check at a time
+        with lock:
+            return target.check(resp_class)
+
+    def _get_target(self, params):
+        key = json.dumps(
+            dict([(k, v) for k, v in params.items() if k != 'http']),
+            sort_keys=True
+        )
+        with self._lock:
+            if key not in self._targets:
+                self._targets[key] = (_make_target(params), Lock())
+            return self._targets[key]
+
+
+def _make_target(params):
+    if 'url' not in params:
+        raise TargetsException('url is required')
+
+    unknown = set(params) - set(CHECK_OPTIONS) - set(['url', 'http'])
+    if unknown:
+        raise TargetsException(
+            'Unknown check options: %s' % ', '.join(sorted(unknown))
+        )
+
+    kwargs = dict(
+        [(k, v) for k, v in params.items() if k in CHECK_OPTIONS]
+    )
+    try:
+        for option in ['warning', 'critical']:
+            if option in kwargs:
+                kwargs[option] = parse_threshold(str(kwargs[option]))
+
+        return Target(params['url'], params['url'], **kwargs)
+    except (ValueError, re.error) as err:
+        raise TargetsException(err)
+
+
+class _CheckRequestHandler(StreamRequestHandler):
+    def handle(self):
+        try:
+            params = json.loads(self.rfile.readline())
+            if not isinstance(params, dict):
+                raise ValueError('Check parameters must be an object')
+            response = self.server.check_daemon.check(params)
+            result = {
+                'output': str(response),
+                'nagios_code': response.nagios_code
+            }
+        except (ValueError, TargetsException) as err:
+            result = {
+                'output': 'UNKNOWN - %s' % err,
+                'nagios_code': NAGIOS_EXIT_UNKNOWN
+            }
+
+        self.wfile.write(json.dumps(result) + '\n')
@@ -0,0 +1,318 @@
+"""Module with GaleraChecker() class"""
+import time
+from multiprocessing.pool import ThreadPool
+
+from pymysql import MySQLError
+
+from twindb_infrastructure.check_http import CheckHttpResponse
+from twindb_infrastructure.health_server import HealthServer
+from twindb_infrastructure.metrics import STATUS_NAMES
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL, PerfData, worst_nagios_code
+
+GALERA_STATUS_QUERY = "SHOW GLOBAL STATUS LIKE 'wsrep\\_%'"
+
+# Values of wsrep_local_state
+WSREP_STATE_JOINING = 1
+WSREP_STATE_DONOR = 2
+WSREP_STATE_JOINED = 3
+WSREP_STATE_SYNCED = 4
+
+# States a node passes through while it joins or feeds a joiner
+TRANSIENT_STATES = [
+    WSREP_STATE_JOINING,
+    WSREP_STATE_DONOR,
+    WSREP_STATE_JOINED
+]
+
+
+class GaleraChecker(object):
+    """
+    Check health of a Galera cluster.
+
+    Every node is polled with ``SHOW GLOBAL STATUS LIKE 'wsrep_%'``
+    over its own persistent connection. All nodes are polled at once.
+
+    The flow control paused fraction is the share of time replication
+    was paused by flow control, i.e. writes were throttled.
+    It's measured between two polls of a node from
+    ``wsrep_flow_control_paused_ns``. On the first poll, or if the
+    server doesn't have the counter, ``wsrep_flow_control_paused`` is
+    used, which covers the time since the last ``FLUSH STATUS``.
+
+    :param cluster_size: Expected number of nodes. A smaller cluster
+        results in warning status.
+    :type cluster_size: int
+    :param critical_flow_control: Flow control paused fraction
+        from 0 to 1 to result in critical status.
+    :type critical_flow_control: float
+    :param warning_flow_control: Same for warning status.
+    :type warning_flow_control: float
+    :param critical_recv_queue: Average receive queue length
+        to result in critical status.
+    :type critical_recv_queue: float
+    :param warning_recv_queue: Same for warning status.
+    :type warning_recv_queue: float
+    :param critical_send_queue: Average send queue length
+        to result in critical status.
+    :type critical_send_queue: float
+    :param warning_send_queue: Same for warning status.
+    :type warning_send_queue: float
+    :param perfdata: Add cluster size, flow control and queue lengths
+        of every node to the response as performance data.
+    :type perfdata: bool
+    """
+    __attributes = [
+        'cluster_size',
+        'critical_flow_control',
+        'warning_flow_control',
+        'critical_recv_queue',
+        'warning_recv_queue',
+        'critical_send_queue',
+        'warning_send_queue',
+        'perfdata',
+    ]
+
+    def __init__(self, **kwargs):
+        for attr in self.__attributes:
+            setattr(
+                self,
+                '_%s' % attr,
+                kwargs.get(attr, None)
+            )
+
+        # Node name to time and wsrep_flow_control_paused_ns of its last poll
+        self._samples = {}
+
+    def check(self, nodes, resp_class):
+        """
+        Poll all nodes and evaluate the cluster health.
+
+        :param nodes: Probes of the nodes. Their query must be
+            :const:`GALERA_STATUS_QUERY`.
+        :type nodes: list(MysqlProbe)
+        :param resp_class: What response type the method should return
+        :type resp_class: class
+        :return: Response
+        :rtype: CheckResponse
+        """
+        pool = ThreadPool(len(nodes))
+        try:
+            results = pool.map(self._evaluate, nodes)
+        finally:
+            pool.close()
+            pool.join()
+
+        codes = [code for code, _, _ in results]
+        nagios_code = worst_nagios_code(codes)
+        lines = [
+            '%s - Galera cluster: %d of %d nodes are OK' % (
+                STATUS_NAMES[nagios_code].upper(),
+                codes.count(NAGIOS_EXIT_OK),
+                len(codes)
+            )
+        ]
+        perfdata = []
+        for node, (_, message, values) in zip(nodes, results):
+            lines.append('%s: %s' % (node.name, message))
+            if values:
+                perfdata.extend(self._get_perfdata(node, values))
+
+        return self._response(
+            resp_class,
+            '\n'.join(lines),
+            nagios_code,
+            perfdata if self._perfdata else []
+        )
+
+    def start_server(self, http_port, nodes, backlog=1,
+                     resp_class=CheckHttpResponse, pid_file=None):
+        """
+        Run an HTTP server that responds with a check result.
+
+        Probes are served one at a time, so every node keeps
+        a single connection.
+
+        :param http_port: TCP port to listen on.
+        :type http_port: int
+        :param nodes: Probes of the nodes.
+        :type nodes: list(MysqlProbe)
+        :param backlog: Backlog of the listening socket.
+        :type backlog: int
+        :param resp_class: Response type.
+        :type resp_class: class
+        :param pid_file: Take over the port from the server whose PID
+            is in this file. See :class:`HealthServer`.
+        :type pid_file: str
+        """
+        HealthServer(
+            http_port,
+            lambda: self.check(nodes, resp_class),
+            backlog=backlog,
+            pid_file=pid_file
+        ).serve_forever()
+
+    def _evaluate(self, node):
+        """
+        Poll a node.
+
+        :return: Nagios code, message and the polled values or None
+            if the node can't be polled.
+        :rtype: tuple
+        """
+        try:
+            node.run()
+        except MySQLError as err:
+            return NAGIOS_EXIT_CRITICAL, str(err), None
+
+        status = dict(
+            (row['Variable_name'], row['Value']) for row in node.rows
+        )
+        if 'wsrep_local_state' not in status:
+            return NAGIOS_EXIT_CRITICAL, 'not a Galera node', None
+
+        try:
+            values = {
+                'local_state': int(status['wsrep_local_state']),
+                'cluster_size': int(status.get('wsrep_cluster_size', 0)),
+                'flow_control_paused': self._flow_control_paused(
+                    node,
+                    status
+                ),
+                'recv_queue_avg': float(
+                    status.get('wsrep_local_recv_queue_avg', 0)
+                ),
+                'send_queue_avg': float(
+                    status.get('wsrep_local_send_queue_avg', 0)
+                ),
+            }
+        except ValueError as err:
+            return NAGIOS_EXIT_CRITICAL, 'invalid wsrep status: %s' % err, \
+                None
+
+        problems = []
+        if status.get('wsrep_ready') != 'ON':
+            problems.append((NAGIOS_EXIT_CRITICAL, 'not ready'))
+        if status.get('wsrep_cluster_status') != 'Primary':
+            problems.append(
+                (
+                    NAGIOS_EXIT_CRITICAL,
+                    'cluster status %s' % status.get('wsrep_cluster_status')
+                )
+            )
+        if values['local_state'] != WSREP_STATE_SYNCED:
+            problems.append(
+                (
+                    NAGIOS_EXIT_WARNING
+                    if values['local_state'] in TRANSIENT_STATES
+                    else NAGIOS_EXIT_CRITICAL,
+                    'state %s' % status.get(
+                        'wsrep_local_state_comment',
+                        values['local_state']
+                    )
+                )
+            )
+        if self._cluster_size \
+                and values['cluster_size'] < self._cluster_size:
+            problems.append(
+                (
+                    NAGIOS_EXIT_WARNING,
+                    'cluster size %d less than %d' % (
+                        values['cluster_size'],
+                        self._cluster_size
+                    )
+                )
+            )
+        for name, label in [
+                ('flow_control', 'flow_control_paused'),
+                ('recv_queue', 'recv_queue_avg'),
+                ('send_queue', 'send_queue_avg')]:
+            problem = self._evaluate_threshold(name, label, values[label])
+            if problem:
+                problems.append(problem)
+
+        if not problems:
+            return NAGIOS_EXIT_OK, '%s, cluster size %d' % (
+                status.get('wsrep_local_state_comment', 'Synced'),
+                values['cluster_size']
+            ), values
+
+        return worst_nagios_code([code for code, _ in problems]), \
+            ', '.join([message for _, message in problems]), values
+
+    def _evaluate_threshold(self, name, label, value):
+        # Critical thresholds are evaluated first
+        for nagios_code in [NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_WARNING]:
+            threshold = getattr(
+                self,
+                '_%s_%s' % (STATUS_NAMES[nagios_code], name)
+            )
+            if threshold is not None and value > threshold:
+                return nagios_code, '%s %f more than %f' % (
+                    label.replace('_', ' '),
+                    value,
+                    threshold
+                )
+        return None
+
+    def _flow_control_paused(self, node, status):
+        now = time.time()
+        paused = float(status.get('wsrep_flow_control_paused', 0))
+        if 'wsrep_flow_control_paused_ns' not in status:
+            return paused
+
+        paused_ns = int(status['wsrep_flow_control_paused_ns'])
+        previous = self._samples.get(node.name)
+        self._samples[node.name] = (now, paused_ns)
+        # The counter is reset when the node restarts
+        if previous is None or paused_ns < previous[1] or now <= previous[0]:
+            return paused
+
+        return min(
+            1.0,
+            (paused_ns - previous[1]) / 1e9 / (now - previous[0])
+        )
+
+    def _get_perfdata(self, node, values):
+        return [
+            PerfData(
+                '%s_cluster_size' % node.name,
+                values['cluster_size'],
+                minimum=0
+            ),
+            PerfData(
+                '%s_flow_control_paused' % node.name,
+                values['flow_control_paused'],
+                warning=self._warning_flow_control,
+                critical=self._critical_flow_control,
+                minimum=0,
+                maximum=1
+            ),
+            PerfData(
+                '%s_recv_queue_avg' % node.name,
+                values['recv_queue_avg'],
+                warning=self._warning_recv_queue,
+                critical=self._critical_recv_queue,
+                minimum=0
+            ),
+            PerfData(
+                '%s_send_queue_avg' % node.name,
+                values['send_queue_avg'],
+                warning=self._warning_send_queue,
+                critical=self._critical_send_queue,
+                minimum=0
+            ),
+        ]
+
+    @staticmethod
+    def _response(resp_class, message, nagios_code, perfdata=None):
+        kwargs = {
+            'message': message,
+            'nagios_code': nagios_code,
+            'perfdata': perfdata or []
+        }
+        if resp_class == CheckHttpResponse:
+            kwargs['http_code'] = 503 \
+                if nagios_code == NAGIOS_EXIT_CRITICAL else 200
+
+        return resp_class(**kwargs)
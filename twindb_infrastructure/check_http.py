@@ -1,27 +1,46 @@
-import re
-import socket
-from time import sleep
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
 
 from requests import RequestException
 
-NAGIOS_EXIT_OK = 0
-NAGIOS_EXIT_WARNING = 1
-NAGIOS_EXIT_CRITICAL = 2
-NAGIOS_EXIT_UNKNOWN = 3
+from twindb_infrastructure.backends import BackendLoaders
+from twindb_infrastructure.check_rules import LoadTimeRule, TitleRule, \
+    TitleRegexpRule, BodyRegexpRule, StatusCodeRule, ContentLengthRule, \
+    PhaseTimeRule, PercentileLoadTimeRule, StreamBodyRegexpRule, \
+    BodySizeRule, ThroughputRule, parse_header_rule
+from twindb_infrastructure.health_server import HealthServer
+from twindb_infrastructure.latency_window import LatencyWindow, \
+    PercentileThreshold, threshold_seconds, percentile_seconds
+from twindb_infrastructure.loader import PHASES
+from twindb_infrastructure.metrics import MetricsHttpResponse, STATUS_NAMES
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_UNKNOWN, \
+    NAGIOS_SEVERITY, PerfData
 
 
 class CheckResponse(object):
     def __init__(self, **kwargs):
         self._message = kwargs.get('message', 'Service unavailable')
         self._nagios_code = kwargs.get('nagios_code', NAGIOS_EXIT_UNKNOWN)
+        self._perfdata = kwargs.get('perfdata', [])
 
     @property
     def nagios_code(self):
         return self._nagios_code
 
-    def __str__(self):
+    @property
+    def output(self):
+        """Plugin output: the message followed by performance data."""
+        if self._perfdata:
+            return '%s | %s' % (
+                self._message,
+                ' '.join([str(p) for p in self._perfdata])
+            )
         return self._message
 
+    def __str__(self):
+        return self.output
+
 
 class CheckHttpResponse(CheckResponse):
     def __init__(self, **kwargs):
@@ -42,26 +61,141 @@ class CheckHttpResponse(CheckResponse):
             code=self._http_code,
             short_message="OK" if self._http_code == 200
             else "Service unavailable",
-            len=len(self._message) + 2,
-            msg=self._message
+            len=len(self.output) + 2,
+            msg=self.output
         )
 
 
+class AgentCheckResponse(CheckResponse):
+    """
+    Check result in HAProxy agent-check protocol.
+
+    HAProxy reads one line: ``up`` with a weight percentage if the check
+    is OK or WARNING, ``drain`` if the weight drops to zero or the status
+    is UNKNOWN, ``down`` if it's CRITICAL. The check message follows
+    as a description after ``#``.
+    """
+    def __init__(self, **kwargs):
+        super(AgentCheckResponse, self).__init__(**kwargs)
+        self._weight = kwargs.get('weight')
+
+    @property
+    def weight(self):
+        """Weight percentage of the backend or None if not measured."""
+        return self._weight
+
+    @property
+    def state(self):
+        """Agent state: up with a weight, drain or down."""
+        if self._nagios_code == NAGIOS_EXIT_CRITICAL:
+            return 'down'
+        if self._nagios_code == NAGIOS_EXIT_UNKNOWN or self._weight == 0:
+            return 'drain'
+        if self._weight is None:
+            return 'up'
+        return 'up %d%%' % self._weight
+
+    def __str__(self):
+        # HAProxy reads a single line
+        description = ' '.join(self._message.split())
+        return '%s #%s\n' % (self.state, description)
+
+
 class HttpChecker(object):
+    """
+    Check a loaded page against a set of rules.
+
+    The rules are built from keyword arguments once, when the checker
+    is created. All of them are optional:
+
+    :param critical_load_time: Load time to result in critical status.
+        Either seconds or a :class:`PercentileThreshold` over the load
+        times of recent checks.
+    :param warning_load_time: Load time to result in warning status.
+    :param window_size: How many recent load times percentile
+        thresholds take into account.
+    :param title: Expected title.
+    :param title_regexp: Regexp the title must match.
+    :param body_regexp: Regexp the body must match.
+    :param stream_body_regexp: Search ``body_regexp`` in the raw
+        response while it's streamed instead of matching the parsed
+        body text. The loader must be created with
+        :attr:`stream_patterns`.
+    :param status_code: Expected HTTP status code.
+    :param header_regexps: List of ``Name: regexp`` strings.
+        The response header Name must match the regexp.
+    :param min_content_length: Minimal content length in bytes.
+    :param max_content_length: Maximal content length in bytes.
+    :param critical_body_size: Size of the response body in bytes
+        to result in critical status. Unlike content length it's
+        the number of bytes actually read.
+    :param warning_body_size: Same for warning status.
+    :param critical_throughput: Transfer rate of the response body
+        in bytes per second below which the status is critical.
+    :param warning_throughput: Same for warning status.
+    :param phase_critical: Dictionary of request phase (see
+        :const:`~twindb_infrastructure.loader.PHASES`) to its time
+        that results in critical status.
+    :param phase_warning: Same for warning status.
+    :param perfdata: Add load time and phase timings
+        to the response as performance data.
+    :param metrics: Record load times, results and errors here.
+        The HTTP server then serves them on /metrics.
+    :type metrics: CheckMetrics
+    :param history: Record load times and results here.
+    :type history: HistoryFile
+    :param quorum: How many backends must pass a check of
+        :class:`BackendLoaders`. The result is the status that at
+        least this many backends have or better. By default all
+        backends, i.e. the worst status.
+    :type quorum: int
+    """
     __attributes = [
         'critical_load_time',
         'warning_load_time',
         'title',
         'title_regexp',
-        'body_regexp'
+        'body_regexp',
+        'stream_body_regexp',
+        'status_code',
+        'header_regexps',
+        'min_content_length',
+        'max_content_length',
+        'critical_body_size',
+        'warning_body_size',
+        'critical_throughput',
+        'warning_throughput',
+        'phase_critical',
+        'phase_warning',
+        'perfdata',
+        'metrics',
+        'window_size',
+        'history',
+        'quorum',
     ]
 
     def __init__(self, **kwargs):
         self._body_regexp = None
+        self._stream_body_regexp = None
         self._title_regexp = None
         self._title = None
         self._critical_load_time = None
         self._warning_load_time = None
+        self._status_code = None
+        self._header_regexps = None
+        self._min_content_length = None
+        self._max_content_length = None
+        self._critical_body_size = None
+        self._warning_body_size = None
+        self._critical_throughput = None
+        self._warning_throughput = None
+        self._phase_critical = None
+        self._phase_warning = None
+        self._perfdata = None
+        self._metrics = None
+        self._window_size = None
+        self._history = None
+        self._quorum = None
 
         for attr in self.__attributes:
             setattr(
@@ -70,155 +204,500 @@ class HttpChecker(object):
                 kwargs.get(attr, None)
             )
 
+        self._window = None
+        if isinstance(self._critical_load_time, PercentileThreshold) \
+                or isinstance(self._warning_load_time, PercentileThreshold):
+            self._window = LatencyWindow(self._window_size or 100)
+
+        self._rules = self._compile_rules()
+
+    @property
+    def required_tags(self):
+        """
+        Tags of the page that the configured checks need.
+
+        :rtype: list(str)
+        """
+        tags = []
+        for rule in self._rules:
+            for tag in rule.tags:
+                if tag not in tags:
+                    tags.append(tag)
+        return tags
+
+    @property
+    def stream_patterns(self):
+        """
+        Compiled regexps the loader must search in the streamed response.
+
+        :rtype: list
+        """
+        patterns = []
+        for rule in self._rules:
+            patterns += rule.patterns
+        return patterns
+
+    @property
+    def full_body(self):
+        """
+        True if the configured checks need the whole response read.
+
+        :rtype: bool
+        """
+        return any([rule.full_body for rule in self._rules])
+
+    @property
+    def checks_status(self):
+        """
+        True if the configured checks expect a specific HTTP status,
+        so the loader must not fail on 4xx and 5xx responses.
+
+        :rtype: bool
+        """
+        return any([rule.checks_status for rule in self._rules])
+
     def check(self, loader, resp_class):
         """
+        Load the page and evaluate the rules against it.
+
+        The first failing rule determines the result.
+        Rules that result in critical status are evaluated first.
 
-        :param loader:
+        :param loader: Loader of the page. With :class:`BackendLoaders`
+            every backend is checked concurrently and the result
+            depends on the ``quorum``.
         :type loader: Loader
         :param resp_class: What response type the method should return
         :type resp_class: class
         :return: Response
         :rtype: CheckResponse
         """
+        if isinstance(loader, BackendLoaders):
+            return self._check_backends(loader, resp_class)
+
+        return self._response(resp_class, *self._evaluate(loader))
+
+    def _evaluate(self, loader):
+        """
+        Evaluate the rules against a loader.
+
+        :return: Message, Nagios code, performance data and load time
+            (None if the page failed to load).
+        :rtype: tuple
+        """
         try:
-            # if load time more than critical threshold
-            if self._critical_load_time \
-                    and loader.load_time > self._critical_load_time:
-
-                kwargs = {
-                    'message': 'CRITICAL - %s: load time %f '
-                               'seconds more than %f'
-                               % (
-                                   loader.url,
-                                   loader.load_time,
-                                   self._critical_load_time
-                               ),
-                    'nagios_code': NAGIOS_EXIT_CRITICAL
-                }
-                if resp_class == CheckHttpResponse:
-                    kwargs['http_code'] = 503
-
-                return resp_class(**kwargs)
-
-            # if load time more than warning threshold
-            if self._warning_load_time \
-                    and loader.load_time > self._warning_load_time:
-
-                kwargs = {
-                    'message': 'WARNING - %s: load time %f '
-                               'seconds more than %f'
-                               % (
-                                   loader.url,
-                                   loader.load_time,
-                                   self._warning_load_time
-                               ),
-                    'nagios_code': NAGIOS_EXIT_WARNING
-                }
-                if resp_class == CheckHttpResponse:
-                    kwargs['http_code'] = 200
-
-                return resp_class(**kwargs)
-
-            # If title is different than expected
-            if self._title and self._title != loader.title:
-                kwargs = {
-                    'message': "CRITICAL - %s: "
-                               "Expected title %s. Actual title '%s'"
-                               % (loader.url, self._title, loader.title),
-                    'nagios_code': NAGIOS_EXIT_CRITICAL
-                }
-                if resp_class == CheckHttpResponse:
-                    kwargs['http_code'] = 503
-
-                return resp_class(**kwargs)
-
-            # If title doesn't match expected regexp
-            if self._title_regexp \
-                    and re.match(self._title_regexp, loader.title) is None:
-
-                kwargs = {
-                    'message': "CRITICAL - %s: Title '%s' "
-                               "is expected to match regexp '%s'"
-                               % (loader.url, loader.title, self._title_regexp),
-                    'nagios_code': NAGIOS_EXIT_CRITICAL
-                }
-                if resp_class == CheckHttpResponse:
-                    kwargs['http_code'] = 503
-
-                return resp_class(**kwargs)
-
-            # If body doesn't match expected regexp
-            if self._body_regexp \
-                    and re.match(self._body_regexp, loader.body) is None:
-
-                kwargs = {
-                    'message': "CRITICAL - %s: Body '%s...' "
-                               "is expected to match regexp '%s'"
-                               % (
-                                   loader.url,
-                                   loader.body[0:16],
-                                   self._body_regexp
-                               ),
-                    'nagios_code': NAGIOS_EXIT_CRITICAL
-                }
-                if resp_class == CheckHttpResponse:
-                    kwargs['http_code'] = 503
-
-                return resp_class(**kwargs)
+            loader.load()
+            if self._window is not None:
+                self._window.add(loader.load_time)
+            if self._metrics:
+                self._metrics.observe_load_time(loader.load_time)
+            perfdata = self._get_perfdata(loader) if self._perfdata else []
+            for rule in self._rules:
+                message = rule.evaluate(loader)
+                if message is not None:
+                    return (
+                        message,
+                        rule.nagios_code,
+                        perfdata,
+                        loader.load_time
+                    )
 
             # If no checks fails respond with success
-            loader.load()
-            kwargs = {
-                'message': "OK - %s is healthy"
-                           % (
-                               loader.url,
-                           ),
-                'nagios_code': NAGIOS_EXIT_OK
-            }
-            if resp_class == CheckHttpResponse:
-                kwargs['http_code'] = 200
+            return (
+                "OK - %s is healthy" % loader.url,
+                NAGIOS_EXIT_OK,
+                perfdata,
+                loader.load_time
+            )
 
         except RequestException as err:
-            kwargs = {
-                'message': "CRITICAL - {url}: {err_msg}".format(
+            if self._metrics:
+                self._metrics.observe_error(err)
+            return (
+                "CRITICAL - {url}: {err_msg}".format(
                     url=loader.url,
                     err_msg=err
                 ),
-                'nagios_code': NAGIOS_EXIT_CRITICAL
-            }
+                NAGIOS_EXIT_CRITICAL,
+                [],
+                None
+            )
+
+    def _check_backends(self, backends, resp_class):
+        try:
+            loaders = backends.loaders()
+        except RequestException as err:
+            if self._metrics:
+                self._metrics.observe_error(err)
+            return self._response(
+                resp_class,
+                'CRITICAL - %s: %s' % (backends.url, err),
+                NAGIOS_EXIT_CRITICAL
+            )
+
+        pool = ThreadPool(len(loaders))
+        try:
+            results = pool.map(self._evaluate, [l for _, l in loaders])
+        finally:
+            pool.close()
+            pool.join()
+
+        codes = [code for _, code, _, _ in results]
+        quorum = min(self._quorum or len(codes), len(codes))
+        # The status at least quorum backends have or better
+        nagios_code = sorted(codes, key=NAGIOS_SEVERITY.index)[quorum - 1]
+
+        lines = [
+            '%s - %s: %d of %d backends are OK, %d required' % (
+                STATUS_NAMES[nagios_code].upper(),
+                backends.url,
+                codes.count(NAGIOS_EXIT_OK),
+                len(codes),
+                quorum
+            )
+        ]
+        perfdata = []
+        load_times = []
+        for (address, _), result in zip(loaders, results):
+            message, _, _, load_time = result
+            lines.append('%s: %s' % (address, message))
+            if load_time is not None:
+                load_times.append(load_time)
+                perfdata.append(
+                    PerfData(
+                        'time_%s' % address,
+                        load_time,
+                        uom='s',
+                        warning=threshold_seconds(
+                            self._warning_load_time
+                        ),
+                        critical=threshold_seconds(
+                            self._critical_load_time
+                        ),
+                        minimum=0
+                    )
+                )
+
+        return self._response(
+            resp_class,
+            '\n'.join(lines),
+            nagios_code,
+            perfdata if self._perfdata else [],
+            max(load_times) if load_times else None
+        )
+
+    def _compile_rules(self):
+        rules = []
+        if self._critical_load_time:
+            rules.append(self._load_time_rule(self._critical_load_time))
+        for phase in PHASES:
+            if phase in (self._phase_critical or {}):
+                rules.append(
+                    PhaseTimeRule(phase, self._phase_critical[phase])
+                )
+        if self._title:
+            rules.append(TitleRule(self._title))
+        if self._title_regexp:
+            rules.append(TitleRegexpRule(self._title_regexp))
+        if self._body_regexp and self._stream_body_regexp:
+            rules.append(StreamBodyRegexpRule(self._body_regexp))
+        elif self._body_regexp:
+            rules.append(BodyRegexpRule(self._body_regexp))
+        if self._status_code:
+            rules.append(StatusCodeRule(self._status_code))
+        for spec in self._header_regexps or []:
+            rules.append(parse_header_rule(spec))
+        if self._min_content_length is not None \
+                or self._max_content_length is not None:
+            rules.append(
+                ContentLengthRule(
+                    min_length=self._min_content_length,
+                    max_length=self._max_content_length
+                )
+            )
+        if self._critical_body_size is not None:
+            rules.append(BodySizeRule(self._critical_body_size))
+        if self._critical_throughput is not None:
+            rules.append(ThroughputRule(self._critical_throughput))
+        if self._warning_load_time:
+            rules.append(
+                self._load_time_rule(
+                    self._warning_load_time,
+                    nagios_code=NAGIOS_EXIT_WARNING
+                )
+            )
+        for phase in PHASES:
+            if phase in (self._phase_warning or {}):
+                rules.append(
+                    PhaseTimeRule(
+                        phase,
+                        self._phase_warning[phase],
+                        nagios_code=NAGIOS_EXIT_WARNING
+                    )
+                )
+        if self._warning_body_size is not None:
+            rules.append(
+                BodySizeRule(
+                    self._warning_body_size,
+                    nagios_code=NAGIOS_EXIT_WARNING
+                )
+            )
+        if self._warning_throughput is not None:
+            rules.append(
+                ThroughputRule(
+                    self._warning_throughput,
+                    nagios_code=NAGIOS_EXIT_WARNING
+                )
+            )
+        return rules
+
+    def _load_time_rule(self, threshold, nagios_code=NAGIOS_EXIT_CRITICAL):
+        if isinstance(threshold, PercentileThreshold):
+            return PercentileLoadTimeRule(
+                self._window,
+                threshold,
+                nagios_code=nagios_code
+            )
+        return LoadTimeRule(threshold, nagios_code=nagios_code)
+
+    def _get_perfdata(self, loader):
+        perfdata = [
+            PerfData(
+                'time',
+                loader.load_time,
+                uom='s',
+                warning=threshold_seconds(self._warning_load_time),
+                critical=threshold_seconds(self._critical_load_time),
+                minimum=0
+            )
+        ]
+        percentiles = []
+        for threshold in [self._critical_load_time, self._warning_load_time]:
+            if isinstance(threshold, PercentileThreshold) \
+                    and threshold.percent not in percentiles:
+                percentiles.append(threshold.percent)
+        for percent in percentiles:
+            perfdata.append(
+                PerfData(
+                    'p%g' % percent,
+                    self._window.percentile(percent),
+                    uom='s',
+                    warning=percentile_seconds(
+                        self._warning_load_time,
+                        percent
+                    ),
+                    critical=percentile_seconds(
+                        self._critical_load_time,
+                        percent
+                    ),
+                    minimum=0
+                )
+            )
+        timings = loader.phase_timings
+        for phase in PHASES:
+            perfdata.append(
+                PerfData(
+                    phase,
+                    timings[phase],
+                    uom='s',
+                    warning=(self._phase_warning or {}).get(phase),
+                    critical=(self._phase_critical or {}).get(phase),
+                    minimum=0
+                )
+            )
 
-            if resp_class == CheckHttpResponse:
-                kwargs['http_code'] = 503
+        perfdata.append(
+            PerfData(
+                'size',
+                loader.body_size,
+                uom='B',
+                warning=self._warning_body_size,
+                critical=self._critical_body_size,
+                minimum=0
+            )
+        )
+        throughput = loader.throughput
+        if throughput is not None:
+            # Nagios has no unit for a rate, the label tells it
+            perfdata.append(
+                PerfData(
+                    'throughput_bps',
+                    throughput,
+                    warning=_low_threshold(self._warning_throughput),
+                    critical=_low_threshold(self._critical_throughput),
+                    minimum=0
+                )
+            )
+
+        asset_timings = loader.asset_timings
+        if asset_timings is not None:
+            perfdata += [
+                PerfData(
+                    'document_time',
+                    loader.document_load_time,
+                    uom='s',
+                    minimum=0
+                ),
+                PerfData(
+                    'page_weight',
+                    loader.page_weight,
+                    uom='B',
+                    minimum=0
+                ),
+                PerfData('assets', len(asset_timings), minimum=0),
+                PerfData(
+                    'assets_failed',
+                    len([a for a in asset_timings if a.failed]),
+                    minimum=0
+                ),
+            ]
+            for asset in asset_timings:
+                perfdata.append(
+                    PerfData(asset.url, asset.load_time, uom='s', minimum=0)
+                )
+        return perfdata
+
+    def _response(self, resp_class, message, nagios_code, perfdata=None,
+                  load_time=None):
+        if self._metrics:
+            self._metrics.observe_result(nagios_code)
+        if self._history:
+            self._history.record(load_time, nagios_code)
+
+        kwargs = {
+            'message': message,
+            'nagios_code': nagios_code,
+            'perfdata': perfdata or []
+        }
+        if resp_class == CheckHttpResponse:
+            kwargs['http_code'] = 503 \
+                if nagios_code == NAGIOS_EXIT_CRITICAL else 200
+        elif resp_class == AgentCheckResponse:
+            kwargs['weight'] = agent_weight(
+                load_time,
+                self._warning_load_time,
+                self._critical_load_time
+            )
 
         return resp_class(**kwargs)
 
-    def start_server(self, http_port, loader):
-        try:
-            s = socket.socket()
+    def start_server(self, http_port, loader, workers=1, backlog=1,
+                     cache=None, resp_class=CheckHttpResponse,
+                     pid_file=None):
+        """
+        Run an HTTP server that responds with a check result.
+
+        Every worker gets its own copy of the loader, so probes that
+        arrive at the same time are checked in parallel.
 
-            while True:
+        :param http_port: TCP port to listen on.
+        :type http_port: int
+        :param loader: Loader for the checked URL.
+        :type loader: Loader
+        :param workers: Number of probes served at the same time.
+        :type workers: int
+        :param backlog: Backlog of the listening socket.
+        :type backlog: int
+        :param cache: If given, probes are answered with the last result
+            of this background-refreshed check instead of checking
+            on every probe.
+        :type cache: CheckCache
+        :param resp_class: Response type. With :class:`AgentCheckResponse`
+            the server speaks HAProxy agent-check protocol: it doesn't wait
+            for a request and answers every connection with a check result.
+        :type resp_class: class
+        :param pid_file: Take over the port from the server whose PID
+            is in this file. See :class:`HealthServer`.
+        :type pid_file: str
+        """
+        if cache:
+            cache.start()
+            respond = cache.get
+
+        else:
+            loaders = Queue()
+            loaders.put(loader)
+            for _ in range(workers - 1):
+                loaders.put(loader.clone())
+
+            def respond():
+                probe_loader = loaders.get()
                 try:
-                    s.bind(('', http_port))
-                    break
-                except socket.error as error:
-                    # if socket in TIME_WAIT, sleep a bit and retry
-                    if error.errno in [48, 98]:
-                        sleep(5)
-                    else:
-                        raise
-            s.listen(1)
-
-            while True:
-                c, addr = s.accept()
-                response = self.check(
-                    loader,
-                    CheckHttpResponse
-                )
-                c.recv(4096)
-                c.sendall(str(response))
-                c.shutdown(socket.SHUT_RDWR)
-                c.close()
-                loader.reset()
-
-        except KeyboardInterrupt:
-            return
+                    return self.check(probe_loader, resp_class)
+                finally:
+                    probe_loader.reset()
+                    loaders.put(probe_loader)
+
+        agent = resp_class == AgentCheckResponse
+        routes = {}
+        if self._metrics and not agent:
+            routes['/metrics'] = lambda: MetricsHttpResponse(self._metrics)
+
+        HealthServer(
+            http_port,
+            respond,
+            workers=workers,
+            backlog=backlog,
+            routes=routes,
+            read_request=not agent,
+            pid_file=pid_file,
+            respond_error=agent_error_response if agent else None
+        ).serve_forever()
+
+
+def agent_weight(load_time, warning, critical):
+    """
+    Weight percentage of a backend by its load time. It's 100 up to
+    the warning threshold and falls linearly to zero at the critical
+    one. A missing threshold is taken as half or twice the other.
+    Percentile thresholds count with their seconds.
+
+    :param load_time: Load time in seconds or None if not measured.
+    :type load_time: float
+    :param warning: Warning threshold.
+    :param critical: Critical threshold.
+    :return: Weight from 0 to 100 or None if the load time is None.
+    :rtype: int
+    """
+    if load_time is None:
+        return None
+
+    low, high = [
+        t.seconds if isinstance(t, PercentileThreshold) else t
+        for t in [warning, critical]
+    ]
+    if low is None and high is None:
+        return 100
+    if low is None:
+        low = high / 2.0
+    if high is None:
+        high = low * 2.0
+
+    if load_time <= low:
+        return 100
+    if load_time >= high:
+        return 0
+    # A slow backend still gets some traffic until it's critical
+    return max(1, int(round(100 * (high - load_time) / (high - low))))
+
+
+def agent_error_response(err):
+    """
+    Agent-check response to a check that failed with an exception.
+    The backend is drained.
+
+    :param err: Exception the check raised.
+    :type err: Exception
+    :rtype: AgentCheckResponse
+    """
+    return AgentCheckResponse(
+        message='UNKNOWN - Check failed: %s' % err,
+        nagios_code=NAGIOS_EXIT_UNKNOWN
+    )
+
+
+def _low_threshold(value):
+    """Nagios range that alerts when a value drops below the threshold."""
+    if value is None:
+        return None
+    return '%f:' % value
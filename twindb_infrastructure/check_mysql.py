@@ -0,0 +1,381 @@
+"""Module with MysqlChecker() class"""
+import time
+from Queue import Queue
+
+import pymysql
+from pymysql import MySQLError
+from pymysql.cursors import DictCursor
+
+from twindb_infrastructure.check_http import CheckHttpResponse, \
+    AgentCheckResponse, agent_weight, agent_error_response
+from twindb_infrastructure.health_server import HealthServer
+from twindb_infrastructure.latency_window import LatencyWindow, \
+    PercentileThreshold, threshold_seconds, percentile_seconds
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL, PerfData
+
+DEFAULT_QUERY = 'SELECT 1'
+
+# Percentiles of the query time reported as performance data
+REPORTED_PERCENTILES = [50, 95, 99]
+
+
+class MysqlProbe(object):
+    """
+    Run a query over a persistent MySQL connection and time it.
+
+    The connection is opened on the first run and kept open. If a query
+    fails, the connection is dropped and the next run reconnects,
+    so ``connect_time`` is measured only by runs that open
+    a connection.
+
+    :param host: MySQL or ProxySQL host.
+    :type host: str
+    :param port: TCP port.
+    :type port: int
+    :param user: MySQL user.
+    :type user: str
+    :param password: MySQL password.
+    :type password: str
+    :param query: Query to run.
+    :type query: str
+    :param timeout: Seconds before connect, read and write time out.
+    :type timeout: int
+    """
+    def __init__(self, host, port=3306, user='root', password='',
+                 query=DEFAULT_QUERY, timeout=10):
+        self._host = host
+        self._port = port
+        self._user = user
+        self._password = password
+        self._query = query
+        self._timeout = timeout
+        self._conn = None
+        self._connect_time = None
+        self._query_time = None
+        self._rows = None
+
+    @property
+    def name(self):
+        """Name of the server in check results."""
+        return '%s:%d' % (self._host, self._port)
+
+    @property
+    def connect_time(self):
+        """Connect time of the last run in seconds or None if it
+        reused the connection."""
+        return self._connect_time
+
+    @property
+    def query_time(self):
+        """Time of the last query in seconds or None if it didn't run."""
+        return self._query_time
+
+    @property
+    def rows(self):
+        """Rows of the last query result as dictionaries or None
+        if it didn't run."""
+        return self._rows
+
+    def run(self):
+        """
+        Run the query, connecting first if there is no connection.
+
+        :raise MySQLError: if the connect or the query fails.
+        """
+        self._connect_time = None
+        self._query_time = None
+        self._rows = None
+        if self._conn is None:
+            start = time.time()
+            self._conn = pymysql.connect(
+                host=self._host,
+                port=self._port,
+                user=self._user,
+                passwd=self._password,
+                connect_timeout=self._timeout,
+                read_timeout=self._timeout,
+                write_timeout=self._timeout,
+                cursorclass=DictCursor
+            )
+            self._connect_time = time.time() - start
+
+        start = time.time()
+        try:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(self._query)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except MySQLError:
+            self.close()
+            raise
+        self._query_time = time.time() - start
+        self._rows = rows
+
+    def clone(self):
+        """Create a probe of the same server with its own connection.
+
+        :rtype: MysqlProbe
+        """
+        return self.__class__(
+            self._host,
+            port=self._port,
+            user=self._user,
+            password=self._password,
+            query=self._query,
+            timeout=self._timeout
+        )
+
+    def close(self):
+        """Close the connection."""
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except MySQLError:
+                pass
+            self._conn = None
+
+
+class MysqlChecker(object):
+    """
+    Check MySQL query latency.
+
+    :param critical_query_time: Query time to result in critical status.
+        Either seconds or a :class:`PercentileThreshold` over the query
+        times of recent checks.
+    :param warning_query_time: Query time to result in warning status.
+    :param critical_connect_time: Connect time in seconds to result
+        in critical status.
+    :param warning_connect_time: Same for warning status.
+    :param window_size: How many recent query times percentiles
+        take into account.
+    :param perfdata: Add connect time, query time and its percentiles
+        to the response as performance data.
+    :param history: Record query times and results here.
+    :type history: HistoryFile
+    """
+    __attributes = [
+        'critical_query_time',
+        'warning_query_time',
+        'critical_connect_time',
+        'warning_connect_time',
+        'window_size',
+        'perfdata',
+        'history',
+    ]
+
+    def __init__(self, **kwargs):
+        self._critical_query_time = None
+        self._warning_query_time = None
+        self._critical_connect_time = None
+        self._warning_connect_time = None
+        self._window_size = None
+        self._perfdata = None
+        self._history = None
+
+        for attr in self.__attributes:
+            setattr(
+                self,
+                '_%s' % attr,
+                kwargs.get(attr, None)
+            )
+
+        self._window = LatencyWindow(self._window_size or 100)
+
+    def check(self, probe, resp_class):
+        """
+        Run the probe query and evaluate its latency.
+
+        :param probe: Probe of the server.
+        :type probe: MysqlProbe
+        :param resp_class: What response type the method should return
+        :type resp_class: class
+        :return: Response
+        :rtype: CheckResponse
+        """
+        try:
+            probe.run()
+        except MySQLError as err:
+            return self._response(
+                resp_class,
+                'CRITICAL - %s: %s' % (probe.name, err),
+                NAGIOS_EXIT_CRITICAL
+            )
+
+        self._window.add(probe.query_time)
+        perfdata = self._get_perfdata(probe) if self._perfdata else []
+        # Critical thresholds are evaluated first
+        for query_time, connect_time, nagios_code in [
+                (self._critical_query_time, self._critical_connect_time,
+                 NAGIOS_EXIT_CRITICAL),
+                (self._warning_query_time, self._warning_connect_time,
+                 NAGIOS_EXIT_WARNING)]:
+            message = self._evaluate_query_time(probe, query_time)
+            if message is None and connect_time is not None \
+                    and probe.connect_time is not None \
+                    and probe.connect_time > connect_time:
+                message = '%s: connect time %f seconds more than %f' % (
+                    probe.name,
+                    probe.connect_time,
+                    connect_time
+                )
+            if message is not None:
+                return self._response(
+                    resp_class,
+                    '%s - %s' % (_status(nagios_code), message),
+                    nagios_code,
+                    perfdata,
+                    probe.query_time
+                )
+
+        return self._response(
+            resp_class,
+            'OK - %s is healthy' % probe.name,
+            NAGIOS_EXIT_OK,
+            perfdata,
+            probe.query_time
+        )
+
+    def start_server(self, http_port, probe, workers=1, backlog=1,
+                     resp_class=CheckHttpResponse, pid_file=None):
+        """
+        Run an HTTP server that responds with a check result.
+
+        Every worker gets its own probe, so probes that arrive at
+        the same time are checked in parallel, each over its own
+        persistent connection.
+
+        :param http_port: TCP port to listen on.
+        :type http_port: int
+        :param probe: Probe of the server.
+        :type probe: MysqlProbe
+        :param workers: Number of probes served at the same time.
+        :type workers: int
+        :param backlog: Backlog of the listening socket.
+        :type backlog: int
+        :param resp_class: Response type. See
+            :meth:`HttpChecker.start_server`.
+        :type resp_class: class
+        :param pid_file: Take over the port from the server whose PID
+            is in this file. See :class:`HealthServer`.
+        :type pid_file: str
+        """
+        probes = Queue()
+        probes.put(probe)
+        for _ in range(workers - 1):
+            probes.put(probe.clone())
+
+        def respond():
+            worker_probe = probes.get()
+            try:
+                return self.check(worker_probe, resp_class)
+            finally:
+                probes.put(worker_probe)
+
+        HealthServer(
+            http_port,
+            respond,
+            workers=workers,
+            backlog=backlog,
+            read_request=resp_class != AgentCheckResponse,
+            pid_file=pid_file,
+            respond_error=agent_error_response
+            if resp_class == AgentCheckResponse else None
+        ).serve_forever()
+
+    def _evaluate_query_time(self, probe, threshold):
+        if isinstance(threshold, PercentileThreshold):
+            value = self._window.percentile(threshold.percent)
+            if value > threshold.seconds:
+                return '%s: %s query time %f seconds more than %f' % (
+                    probe.name,
+                    threshold.label,
+                    value,
+                    threshold.seconds
+                )
+        elif threshold is not None and probe.query_time > threshold:
+            return '%s: query time %f seconds more than %f' % (
+                probe.name,
+                probe.query_time,
+                threshold
+            )
+        return None
+
+    def _get_perfdata(self, probe):
+        perfdata = []
+        # Runs over a kept connection don't connect
+        if probe.connect_time is not None:
+            perfdata.append(
+                PerfData(
+                    'connect_time',
+                    probe.connect_time,
+                    uom='s',
+                    warning=self._warning_connect_time,
+                    critical=self._critical_connect_time,
+                    minimum=0
+                )
+            )
+        perfdata.append(
+            PerfData(
+                'query_time',
+                probe.query_time,
+                uom='s',
+                warning=threshold_seconds(self._warning_query_time),
+                critical=threshold_seconds(self._critical_query_time),
+                minimum=0
+            )
+        )
+        percentiles = list(REPORTED_PERCENTILES)
+        for threshold in [self._critical_query_time,
+                          self._warning_query_time]:
+            if isinstance(threshold, PercentileThreshold) \
+                    and threshold.percent not in percentiles:
+                percentiles.append(threshold.percent)
+        for percent in percentiles:
+            perfdata.append(
+                PerfData(
+                    'p%g' % percent,
+                    self._window.percentile(percent),
+                    uom='s',
+                    warning=percentile_seconds(
+                        self._warning_query_time,
+                        percent
+                    ),
+                    critical=percentile_seconds(
+                        self._critical_query_time,
+                        percent
+                    ),
+                    minimum=0
+                )
+            )
+        return perfdata
+
+    def _response(self, resp_class, message, nagios_code, perfdata=None,
+                  query_time=None):
+        if self._history:
+            self._history.record(query_time, nagios_code)
+
+        kwargs = {
+            'message': message,
+            'nagios_code': nagios_code,
+            'perfdata': perfdata or []
+        }
+        if resp_class == CheckHttpResponse:
+            kwargs['http_code'] = 503 \
+                if nagios_code == NAGIOS_EXIT_CRITICAL else 200
+        elif resp_class == AgentCheckResponse:
+            kwargs['weight'] = agent_weight(
+                query_time,
+                self._warning_query_time,
+                self._critical_query_time
+            )
+
+        return resp_class(**kwargs)
+
+
+def _status(nagios_code):
+    if nagios_code == NAGIOS_EXIT_WARNING:
+        return 'WARNING'
+    return 'CRITICAL'
@@ -0,0 +1,339 @@
+"""Rules that HttpChecker evaluates against a loaded page.
+
+Every rule is built once with its parameters (regexps are compiled at
+that time) and then evaluated against a loader on each probe.
+"""
+import re
+
+from twindb_infrastructure.loader import PHASES
+from twindb_infrastructure.nagios import NAGIOS_EXIT_CRITICAL, \
+    NAGIOS_EXIT_WARNING
+
+
+class Rule(object):
+    """
+    Base class for a check rule.
+
+    :param nagios_code: Status of the check if the rule fails.
+    :type nagios_code: int
+    """
+    #: Tags of the page the rule needs
+    tags = []
+    #: Compiled regexps the loader must search in the streamed response
+    patterns = []
+    #: The rule needs the whole response read, not just the tags
+    full_body = False
+    #: The rule checks the HTTP status, so error statuses aren't
+    #: a load failure
+    checks_status = False
+
+    def __init__(self, nagios_code=NAGIOS_EXIT_CRITICAL):
+        self.nagios_code = nagios_code
+
+    def evaluate(self, loader):
+        """
+        Evaluate the rule.
+
+        :param loader: Loader with the page.
+        :type loader: Loader
+        :return: None if the page passes the rule, otherwise
+            a message that explains why it fails.
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    @property
+    def _status(self):
+        if self.nagios_code == NAGIOS_EXIT_WARNING:
+            return 'WARNING'
+        return 'CRITICAL'
+
+
+class LoadTimeRule(Rule):
+    """Load time must not exceed a threshold."""
+    def __init__(self, threshold, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(LoadTimeRule, self).__init__(nagios_code)
+        self._threshold = threshold
+
+    def evaluate(self, loader):
+        if loader.load_time > self._threshold:
+            return '%s - %s: load time %f seconds more than %f' % (
+                self._status,
+                loader.url,
+                loader.load_time,
+                self._threshold
+            )
+        return None
+
+
+class PercentileLoadTimeRule(Rule):
+    """Percentile of recent load times must not exceed a threshold."""
+    def __init__(self, window, threshold, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(PercentileLoadTimeRule, self).__init__(nagios_code)
+        self._window = window
+        self._threshold = threshold
+
+    def evaluate(self, loader):
+        value = self._window.percentile(self._threshold.percent)
+        if value is not None and value > self._threshold.seconds:
+            return '%s - %s: %s load time %f seconds more than %f' % (
+                self._status,
+                loader.url,
+                self._threshold.label,
+                value,
+                self._threshold.seconds
+            )
+        return None
+
+
+class PhaseTimeRule(Rule):
+    """Time of a request phase must not exceed a threshold."""
+    def __init__(self, phase, threshold, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(PhaseTimeRule, self).__init__(nagios_code)
+        if phase not in PHASES:
+            raise ValueError(
+                'Unknown phase %s. Phases are %s'
+                % (phase, ', '.join(PHASES))
+            )
+        self._phase = phase
+        self._threshold = threshold
+
+    def evaluate(self, loader):
+        seconds = loader.phase_timings[self._phase]
+        if seconds > self._threshold:
+            return '%s - %s: %s time %f seconds more than %f' % (
+                self._status,
+                loader.url,
+                self._phase,
+                seconds,
+                self._threshold
+            )
+        return None
+
+
+class TitleRule(Rule):
+    """Title must be equal to the expected string."""
+    tags = ['title']
+
+    def __init__(self, title, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(TitleRule, self).__init__(nagios_code)
+        self._title = title
+
+    def evaluate(self, loader):
+        if self._title != loader.title:
+            return "%s - %s: Expected title %s. Actual title '%s'" % (
+                self._status,
+                loader.url,
+                self._title,
+                loader.title
+            )
+        return None
+
+
+class TitleRegexpRule(Rule):
+    """Title must match a regexp."""
+    tags = ['title']
+
+    def __init__(self, regexp, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(TitleRegexpRule, self).__init__(nagios_code)
+        self._regexp = regexp
+        self._pattern = re.compile(regexp)
+
+    def evaluate(self, loader):
+        if self._pattern.match(loader.title) is None:
+            return "%s - %s: Title '%s' is expected to match regexp '%s'" % (
+                self._status,
+                loader.url,
+                loader.title,
+                self._regexp
+            )
+        return None
+
+
+class BodyRegexpRule(Rule):
+    """Body must match a regexp."""
+    tags = ['body']
+
+    def __init__(self, regexp, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(BodyRegexpRule, self).__init__(nagios_code)
+        self._regexp = regexp
+        self._pattern = re.compile(regexp)
+
+    def evaluate(self, loader):
+        if self._pattern.match(loader.body) is None:
+            return "%s - %s: Body '%s...' is expected to match regexp '%s'" % (
+                self._status,
+                loader.url,
+                loader.body[0:16],
+                self._regexp
+            )
+        return None
+
+
+class StreamBodyRegexpRule(Rule):
+    """
+    Raw response body must contain a match of a regexp.
+
+    The loader searches the body chunk by chunk while it streams
+    the response, so the body is never buffered as a whole.
+    """
+    def __init__(self, regexp, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(StreamBodyRegexpRule, self).__init__(nagios_code)
+        self._regexp = regexp
+        self._pattern = re.compile(regexp)
+        self.patterns = [self._pattern]
+
+    def evaluate(self, loader):
+        if self._pattern not in loader.matched_patterns:
+            return "%s - %s: Body is expected to match regexp '%s'" % (
+                self._status,
+                loader.url,
+                self._regexp
+            )
+        return None
+
+
+class StatusCodeRule(Rule):
+    """HTTP status code must be the expected one."""
+    checks_status = True
+
+    def __init__(self, status_code, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(StatusCodeRule, self).__init__(nagios_code)
+        self._status_code = status_code
+
+    def evaluate(self, loader):
+        if loader.status_code != self._status_code:
+            return '%s - %s: Expected HTTP status %d. Actual status %d' % (
+                self._status,
+                loader.url,
+                self._status_code,
+                loader.status_code
+            )
+        return None
+
+
+class HeaderRule(Rule):
+    """HTTP response header must be present and match a regexp."""
+    def __init__(self, name, regexp, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(HeaderRule, self).__init__(nagios_code)
+        self._name = name
+        self._regexp = regexp
+        self._pattern = re.compile(regexp)
+
+    def evaluate(self, loader):
+        value = loader.headers.get(self._name)
+        if value is None or self._pattern.match(value) is None:
+            return "%s - %s: Header %s '%s' " \
+                   "is expected to match regexp '%s'" % (
+                       self._status,
+                       loader.url,
+                       self._name,
+                       value,
+                       self._regexp
+                   )
+        return None
+
+
+class ContentLengthRule(Rule):
+    """Content length must be within bounds."""
+    def __init__(self, min_length=None, max_length=None,
+                 nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(ContentLengthRule, self).__init__(nagios_code)
+        self._min_length = min_length
+        self._max_length = max_length
+
+    def evaluate(self, loader):
+        length = loader.content_length
+        if self._min_length is not None and length < self._min_length:
+            return '%s - %s: content length %d bytes less than %d' % (
+                self._status,
+                loader.url,
+                length,
+                self._min_length
+            )
+        if self._max_length is not None and length > self._max_length:
+            return '%s - %s: content length %d bytes more than %d' % (
+                self._status,
+                loader.url,
+                length,
+                self._max_length
+            )
+        return None
+
+
+class BodySizeRule(Rule):
+    """Size of the response body must not exceed a threshold."""
+    full_body = True
+
+    def __init__(self, threshold, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(BodySizeRule, self).__init__(nagios_code)
+        self._threshold = threshold
+
+    def evaluate(self, loader):
+        if loader.body_size > self._threshold:
+            return '%s - %s: response size %d bytes more than %d' % (
+                self._status,
+                loader.url,
+                loader.body_size,
+                self._threshold
+            )
+        return None
+
+
+class ThroughputRule(Rule):
+    """Transfer rate of the response body must not drop below
+    a threshold."""
+    full_body = True
+
+    def __init__(self, threshold, nagios_code=NAGIOS_EXIT_CRITICAL):
+        super(ThroughputRule, self).__init__(nagios_code)
+        self._threshold = threshold
+
+    def evaluate(self, loader):
+        throughput = loader.throughput
+        if throughput is not None and throughput < self._threshold:
+            return '%s - %s: throughput %f bytes/s less than %f' % (
+                self._status,
+                loader.url,
+                throughput,
+                self._threshold
+            )
+        return None
+
+
+def parse_header_rule(spec):
+    """
+    Create a header rule from a ``Name: regexp`` string.
+
+    :param spec: Header name and regexp separated by a colon.
+    :type spec: str
+    :return: Header rule.
+    :rtype: HeaderRule
+    :raise ValueError: if spec has no colon.
+    """
+    name, sep, regexp = spec.partition(':')
+    if not sep or not name.strip():
+        raise ValueError("Header rule must look like 'Name: regexp'")
+
+    return HeaderRule(name.strip(), regexp.strip())
+
+
+def parse_phase_threshold(spec):
+    """
+    Parse a ``phase=seconds`` threshold.
+
+    :param spec: Phase name and threshold separated by an equal sign.
+    :type spec: str
+    :return: Phase name and threshold in seconds.
+    :rtype: tuple(str, float)
+    :raise ValueError: if spec is malformed or the phase is unknown.
+    """
+    phase, sep, threshold = spec.partition('=')
+    phase = phase.strip()
+    if not sep or phase not in PHASES:
+        raise ValueError(
+            "Phase threshold must look like 'phase=seconds' "
+            "where phase is one of %s" % ', '.join(PHASES)
+        )
+
+    return phase, float(threshold)
@@ -0,0 +1,271 @@
+"""Module with HealthServer() class"""
+import errno
+import os
+import signal
+import socket
+import time
+from Queue import Queue
+from threading import Condition, Thread, current_thread
+
+from twindb_infrastructure import log
+
+# Seconds a stopped server waits for probes in progress
+DRAIN_TIMEOUT = 10
+
+# Seconds a worker waits for a probe to send its request
+REQUEST_TIMEOUT = 5
+
+
+class HealthServer(object):
+    """
+    TCP server that answers health probes.
+
+    The main thread only accepts connections and queues them.
+    A pool of worker threads reads the probe, asks ``respond``
+    for a result and writes it back, so probes that arrive at
+    the same time are served in parallel.
+
+    The listening socket is bound with ``SO_REUSEADDR``, so a restarted
+    server binds right away even if the port is in TIME_WAIT. With
+    ``pid_file`` it's also bound with ``SO_REUSEPORT``, where the
+    platform has it, so a new instance can listen alongside the old
+    one. Once it listens it takes over: it sends SIGTERM to the
+    instance recorded in the file. Without ``pid_file`` binding a port
+    another server listens on fails, so unrelated servers never share
+    a port. A server that gets SIGTERM stops
+    accepting, finishes the probes in progress and returns from
+    :meth:`serve_forever`, so no probe fails during a restart.
+
+    :param port: TCP port to bind to. 0 picks a free port.
+    :type port: int
+    :param respond: Callable without arguments that returns
+        the response to send back. It's called from worker threads.
+    :param workers: Number of threads that serve connections.
+    :type workers: int
+    :param backlog: Backlog of the listening socket.
+    :type backlog: int
+    :param routes: Dictionary of an HTTP request path to a callable
+        that responds to it instead of ``respond``.
+    :type routes: dict
+    :param read_request: Read a request before responding. Protocols
+        like HAProxy agent-check expect a response right after connect.
+    :type read_request: bool
+    :param pid_file: Take over from the instance whose PID is in this
+        file and record the PID of this one.
+    :type pid_file: str
+    :param drain_timeout: Seconds a stopped server waits for probes
+        in progress.
+    :type drain_timeout: float
+    :param respond_error: Callable that gets the exception ``respond``
+        raised and returns the response to send back instead.
+        By default it's an HTTP 503 with UNKNOWN status.
+    :param request_timeout: Seconds to wait for a probe to send
+        its request, so idle connections don't hold workers.
+    :type request_timeout: float
+    """
+    def __init__(self, port, respond, workers=1, backlog=1, routes=None,
+                 read_request=True, pid_file=None,
+                 drain_timeout=DRAIN_TIMEOUT, respond_error=None,
+                 request_timeout=REQUEST_TIMEOUT):
+        self._port = port
+        self._respond = respond
+        self._routes = routes or {}
+        self._read_request = read_request
+        self._workers = workers
+        self._backlog = backlog
+        self._pid_file = pid_file
+        self._drain_timeout = drain_timeout
+        self._respond_error = respond_error or _error_response
+        self._request_timeout = request_timeout
+        self._socket = None
+        self._connections = Queue()
+        # Number of accepted connections that aren't served yet
+        self._pending = 0
+        self._served = Condition()
+        self._stopped = False
+
+    @property
+    def port(self):
+        """TCP port the server is bound to."""
+        if self._socket is None:
+            return self._port
+
+        return self._socket.getsockname()[1]
+
+    def bind(self):
+        """Bind the server socket and start listening."""
+        self._socket = socket.socket()
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Sharing the port is only for a handover. Otherwise the kernel
+        # would split probes between unrelated servers.
+        if self._pid_file and hasattr(socket, 'SO_REUSEPORT'):
+            self._socket.setsockopt(
+                socket.SOL_SOCKET,
+                socket.SO_REUSEPORT,
+                1
+            )
+        self._socket.bind(('', self._port))
+        self._socket.listen(self._backlog)
+
+    def serve_forever(self):
+        """
+        Accept connections until interrupted or stopped, then wait
+        for the probes in progress.
+        """
+        if self._socket is None:
+            self.bind()
+
+        for _ in range(self._workers):
+            worker = Thread(target=self._serve_connections)
+            worker.daemon = True
+            worker.start()
+
+        # Signal handlers can be set only in the main thread.
+        # The handler only sets the flag: the interrupted accept()
+        # returns and the connections the kernel already queued
+        # are served before the socket is closed.
+        if current_thread().name == 'MainThread':
+            signal.signal(signal.SIGTERM, self._terminate)
+        if self._pid_file:
+            _take_over(self._pid_file)
+
+        try:
+            while not self._stopped:
+                try:
+                    conn, _ = self._socket.accept()
+                except socket.error as err:
+                    if self._stopped:
+                        break
+                    if err.errno == errno.EINTR:
+                        continue
+                    raise
+                self._queue(conn)
+
+        except KeyboardInterrupt:
+            return
+
+        self._accept_queued()
+        self._drain()
+        if self._pid_file:
+            _release(self._pid_file)
+
+    def stop(self):
+        """Stop accepting connections and close the server socket."""
+        self._stopped = True
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            self._socket.close()
+
+    def _terminate(self, *_):
+        self._stopped = True
+
+    def _queue(self, conn):
+        with self._served:
+            self._pending += 1
+        self._connections.put(conn)
+
+    def _accept_queued(self):
+        """Serve connections queued before the server stopped."""
+        try:
+            self._socket.setblocking(False)
+            while True:
+                conn, _ = self._socket.accept()
+                conn.setblocking(True)
+                self._queue(conn)
+        except socket.error:
+            pass
+        self._socket.close()
+
+    def _drain(self):
+        deadline = time.time() + self._drain_timeout
+        with self._served:
+            while self._pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    log.warning(
+                        'Stopped with %d probes in progress',
+                        self._pending
+                    )
+                    return
+                self._served.wait(remaining)
+
+    def _serve_connections(self):
+        while True:
+            conn = self._connections.get()
+            try:
+                self._serve(conn)
+            except socket.error as err:
+                log.warning('Failed to serve a probe: %s', err)
+            except Exception as err:  # pylint: disable=broad-except
+                log.exception('Failed to serve a probe: %s', err)
+            finally:
+                conn.close()
+                with self._served:
+                    self._pending -= 1
+                    self._served.notify_all()
+
+    def _serve(self, conn):
+        conn.settimeout(self._request_timeout)
+        respond = self._respond
+        if self._read_request:
+            request = conn.recv(4096)
+            respond = self._routes.get(_request_path(request), respond)
+        try:
+            response = respond()
+        except Exception as err:  # pylint: disable=broad-except
+            log.exception('Check failed: %s', err)
+            response = self._respond_error(err)
+        conn.sendall(str(response))
+        conn.shutdown(socket.SHUT_RDWR)
+
+
+def _take_over(pid_file):
+    """Record this process in the PID file and stop the previous one."""
+    try:
+        with open(pid_file) as pid:
+            previous = int(pid.read().strip())
+    except (IOError, ValueError):
+        previous = None
+
+    with open(pid_file, 'w') as pid:
+        pid.write('%d\n' % os.getpid())
+
+    if previous and previous != os.getpid():
+        try:
+            os.kill(previous, signal.SIGTERM)
+            log.info('Took over from process %d', previous)
+        except OSError as err:
+            if err.errno != errno.ESRCH:
+                raise
+
+
+def _release(pid_file):
+    """Remove the PID file unless another process took over."""
+    try:
+        with open(pid_file) as pid:
+            if int(pid.read().strip()) == os.getpid():
+                os.remove(pid_file)
+    except (IOError, OSError, ValueError):
+        pass
+
+
+def _error_response(err):
+    """HTTP 503 response with UNKNOWN status of a failed check."""
+    message = 'UNKNOWN - Check failed: %s\r\n' % err
+    return 'HTTP/1.1 503 Service unavailable\r\n' \
+        'Content-Type: text/plain; charset=UTF-8\r\n' \
+        'Connection: close\r\n' \
+        'Content-Length: %d\r\n\r\n%s' % (len(message), message)
+
+
+def _request_path(request):
+    """Get the path without a query string from an HTTP request."""
+    try:
+        path = request.split('\r\n', 1)[0].split(' ')[1]
+    except IndexError:
+        return None
+
+    return path.split('?', 1)[0]
@@ -0,0 +1,408 @@
+"""Module with HistoryFile() class"""
+import math
+import mmap
+import os
+import struct
+import time
+import urllib
+from threading import Lock
+
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, worst_nagios_code
+
+RESOLUTION_RAW = 'raw'
+RESOLUTION_MINUTE = '1m'
+RESOLUTION_HOUR = '1h'
+
+# In the order of rings in a history file
+RESOLUTIONS = [RESOLUTION_RAW, RESOLUTION_MINUTE, RESOLUTION_HOUR]
+
+# Seconds in a bucket of a rollup ring
+ROLLUP_PERIODS = {
+    RESOLUTION_MINUTE: 60,
+    RESOLUTION_HOUR: 3600,
+}
+
+# Number of records in every ring. About 1.2MB per target:
+# a week of raw results at one check a minute,
+# two weeks of 1m rollups and a year of 1h rollups.
+DEFAULT_CAPACITIES = {
+    RESOLUTION_RAW: 10080,
+    RESOLUTION_MINUTE: 20160,
+    RESOLUTION_HOUR: 8760,
+}
+
+HISTORY_SUFFIX = '.history'
+
+HISTORY_MAGIC = 'TWHS'
+HISTORY_VERSION = 1
+
+# magic, version, capacities of rings
+_HEADER = struct.Struct('<4sIIII')
+# The writer sequence (it's odd while a write is in progress)
+# and the number of records ever written to every ring follow
+# the header.
+_COUNTER = struct.Struct('<Q')
+
+_SEQUENCE_OFFSET = _HEADER.size
+_COUNTS_OFFSET = _SEQUENCE_OFFSET + _COUNTER.size
+_DATA_OFFSET = _COUNTS_OFFSET + len(RESOLUTIONS) * _COUNTER.size
+
+# timestamp, load time, Nagios code
+_SAMPLE = struct.Struct('<dfB')
+# bucket start, samples, failures, timed samples, load time sum,
+# load time max, worst Nagios code
+_ROLLUP = struct.Struct('<dIIIddB')
+
+_RECORDS = {
+    RESOLUTION_RAW: _SAMPLE,
+    RESOLUTION_MINUTE: _ROLLUP,
+    RESOLUTION_HOUR: _ROLLUP,
+}
+
+# How long a reader waits for a consistent snapshot
+READ_TIMEOUT = 1
+
+
+class HistoryException(Exception):
+    pass
+
+
+class Sample(object):
+    """
+    Result of one check.
+
+    :param timestamp: Unix time of the check.
+    :type timestamp: float
+    :param load_time: Load time in seconds or None if the page
+        failed to load.
+    :type load_time: float
+    :param nagios_code: Nagios code of the result.
+    :type nagios_code: int
+    """
+    def __init__(self, timestamp, load_time, nagios_code):
+        self.timestamp = timestamp
+        self.load_time = load_time
+        self.nagios_code = nagios_code
+
+
+class Rollup(object):
+    """
+    Aggregate of check results in a time bucket.
+
+    :param timestamp: Unix time of the bucket start.
+    :type timestamp: float
+    :param samples: Number of check results.
+    :type samples: int
+    :param failures: Number of results that aren't OK.
+    :type failures: int
+    :param timed: Number of results with a load time.
+    :type timed: int
+    :param load_time_sum: Sum of load times.
+    :type load_time_sum: float
+    :param load_time_max: Maximum load time.
+    :type load_time_max: float
+    :param nagios_code: The most severe Nagios code in the bucket.
+    :type nagios_code: int
+    """
+    def __init__(self, timestamp, samples, failures, timed,
+                 load_time_sum, load_time_max, nagios_code):
+        self.timestamp = timestamp
+        self.samples = samples
+        self.failures = failures
+        self.timed = timed
+        self.load_time_sum = load_time_sum
+        self.load_time_max = load_time_max
+        self.nagios_code = nagios_code
+
+    @property
+    def load_time_avg(self):
+        """Average load time or None if no page was loaded."""
+        if not self.timed:
+            return None
+        return self.load_time_sum / self.timed
+
+
+class HistoryFile(object):
+    """
+    History of check results of one target in a memory-mapped file.
+
+    The file has a fixed size. It keeps raw results and their 1m and
+    1h rollups in ring buffers, so the oldest records are overwritten
+    and weeks of history take bounded space and memory.
+
+    There must be one writer per file. Readers never lock the writer:
+    it makes a sequence number odd while it writes, and a reader
+    retries until it copies a ring with the same even sequence number
+    before and after the copy.
+
+    :param path: Path to the history file.
+    :type path: str
+    :param writable: Open for writing. The file is created if it
+        doesn't exist.
+    :type writable: bool
+    :param capacities: Dictionary of a resolution to the number
+        of records in its ring. Used only when creating a file.
+    :type capacities: dict
+    :raise HistoryException: if the file isn't a history file.
+    """
+    def __init__(self, path, writable=False, capacities=None):
+        self._path = path
+        self._lock = Lock()
+        if writable and not os.path.exists(path):
+            _create(path, capacities or DEFAULT_CAPACITIES)
+
+        with open(path, 'r+b' if writable else 'rb') as history:
+            size = os.fstat(history.fileno()).st_size
+            if size < _DATA_OFFSET:
+                raise HistoryException('%s is not a history file' % path)
+            self._map = mmap.mmap(
+                history.fileno(),
+                size,
+                access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            )
+
+        header = _HEADER.unpack_from(self._map)
+        if header[:2] != (HISTORY_MAGIC, HISTORY_VERSION):
+            raise HistoryException('%s is not a history file' % path)
+
+        self._capacities = dict(zip(RESOLUTIONS, header[2:]))
+        self._offsets = {}
+        offset = _DATA_OFFSET
+        for resolution in RESOLUTIONS:
+            self._offsets[resolution] = offset
+            offset += self._capacities[resolution] \
+                * _RECORDS[resolution].size
+        if size != offset:
+            raise HistoryException('%s is truncated' % path)
+
+        # A writer that died in the middle of a write left it odd
+        if writable and self._sequence() % 2:
+            self._set_sequence(0)
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        """Unmap the file."""
+        self._map.close()
+
+    def record(self, load_time, nagios_code, timestamp=None):
+        """
+        Add a check result.
+
+        :param load_time: Load time in seconds or None if the page
+            failed to load.
+        :type load_time: float
+        :param nagios_code: Nagios code of the result.
+        :type nagios_code: int
+        :param timestamp: Unix time of the check. By default now.
+        :type timestamp: float
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            sequence = self._sequence()
+            self._set_sequence(sequence + 1)
+            try:
+                self._append(
+                    RESOLUTION_RAW,
+                    (
+                        timestamp,
+                        float('nan') if load_time is None else load_time,
+                        nagios_code
+                    )
+                )
+                for resolution in [RESOLUTION_MINUTE, RESOLUTION_HOUR]:
+                    self._roll_up(
+                        resolution,
+                        timestamp,
+                        load_time,
+                        nagios_code
+                    )
+            finally:
+                self._set_sequence(sequence + 2)
+
+    def read(self, resolution=RESOLUTION_RAW, since=None):
+        """
+        Read records of a ring.
+
+        :param resolution: One of :const:`RESOLUTIONS`.
+        :type resolution: str
+        :param since: Skip records older than this Unix time.
+        :type since: float
+        :return: Samples for the raw resolution, rollups otherwise,
+            oldest first.
+        :rtype: list(Sample) or list(Rollup)
+        :raise HistoryException: if the writer doesn't let
+            a consistent copy be taken.
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(
+                'Resolution must be one of %s' % ', '.join(RESOLUTIONS)
+            )
+
+        record = _RECORDS[resolution]
+        capacity = self._capacities[resolution]
+        offset = self._offsets[resolution]
+        deadline = time.time() + READ_TIMEOUT
+        while True:
+            sequence = self._sequence()
+            if sequence % 2 == 0:
+                count = self._count(resolution)
+                data = self._map[offset:offset + capacity * record.size]
+                if self._sequence() == sequence:
+                    break
+            if time.time() > deadline:
+                raise HistoryException(
+                    'Timed out reading %s: it is being written' % self._path
+                )
+            time.sleep(0.001)
+
+        if count > capacity:
+            first = count % capacity
+            indexes = range(first, capacity) + range(first)
+        else:
+            indexes = range(count)
+
+        records = []
+        for i in indexes:
+            values = record.unpack_from(data, i * record.size)
+            if since is not None and values[0] < since:
+                continue
+            records.append(_make_record(resolution, values))
+
+        return records
+
+    def _sequence(self):
+        return _COUNTER.unpack_from(self._map, _SEQUENCE_OFFSET)[0]
+
+    def _set_sequence(self, sequence):
+        _COUNTER.pack_into(self._map, _SEQUENCE_OFFSET, sequence)
+
+    def _count(self, resolution):
+        return _COUNTER.unpack_from(
+            self._map,
+            _count_offset(resolution)
+        )[0]
+
+    def _set_count(self, resolution, count):
+        _COUNTER.pack_into(self._map, _count_offset(resolution), count)
+
+    def _position(self, resolution, index):
+        record = _RECORDS[resolution]
+        return self._offsets[resolution] \
+            + index % self._capacities[resolution] * record.size
+
+    def _append(self, resolution, values):
+        count = self._count(resolution)
+        _RECORDS[resolution].pack_into(
+            self._map,
+            self._position(resolution, count),
+            *values
+        )
+        self._set_count(resolution, count + 1)
+
+    def _roll_up(self, resolution, timestamp, load_time, nagios_code):
+        start = timestamp - timestamp % ROLLUP_PERIODS[resolution]
+        failed = int(nagios_code != NAGIOS_EXIT_OK)
+        timed = int(load_time is not None)
+        count = self._count(resolution)
+        if count:
+            position = self._position(resolution, count - 1)
+            last = _ROLLUP.unpack_from(self._map, position)
+            if last[0] == start:
+                _ROLLUP.pack_into(
+                    self._map,
+                    position,
+                    start,
+                    last[1] + 1,
+                    last[2] + failed,
+                    last[3] + timed,
+                    last[4] + (load_time or 0.0),
+                    max(last[5], load_time or 0.0),
+                    worst_nagios_code([last[6], nagios_code])
+                )
+                return
+
+        self._append(
+            resolution,
+            (
+                start,
+                1,
+                failed,
+                timed,
+                load_time or 0.0,
+                load_time or 0.0,
+                nagios_code
+            )
+        )
+
+
+def _create(path, capacities):
+    size = _DATA_OFFSET + sum(
+        [capacities[r] * _RECORDS[r].size for r in RESOLUTIONS]
+    )
+    # Readers never see a half-created file
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as history:
+        history.write(
+            _HEADER.pack(
+                HISTORY_MAGIC,
+                HISTORY_VERSION,
+                *[capacities[r] for r in RESOLUTIONS]
+            )
+        )
+        history.truncate(size)
+    os.rename(tmp_path, path)
+
+
+def _count_offset(resolution):
+    return _COUNTS_OFFSET + RESOLUTIONS.index(resolution) * _COUNTER.size
+
+
+def _make_record(resolution, values):
+    if resolution == RESOLUTION_RAW:
+        timestamp, load_time, nagios_code = values
+        return Sample(
+            timestamp,
+            None if math.isnan(load_time) else load_time,
+            nagios_code
+        )
+
+    return Rollup(*values)
+
+
+def history_path(directory, name):
+    """
+    Get the path to the history file of a target.
+
+    :param directory: Directory with history files.
+    :type directory: str
+    :param name: Target name.
+    :type name: str
+    :rtype: str
+    """
+    return os.path.join(
+        directory,
+        urllib.quote(name, safe='') + HISTORY_SUFFIX
+    )
+
+
+def history_names(directory):
+    """
+    Get names of targets that have history files in a directory.
+
+    :param directory: Directory with history files.
+    :type directory: str
+    :return: Sorted target names.
+    :rtype: list(str)
+    """
+    return sorted(
+        [
+            urllib.unquote(f[:-len(HISTORY_SUFFIX)])
+            for f in os.listdir(directory)
+            if f.endswith(HISTORY_SUFFIX)
+        ]
+    )
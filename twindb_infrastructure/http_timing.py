@@ -0,0 +1,140 @@
+"""HTTP adapter that times DNS, TCP connect and TLS handshake phases.
+
+Connections record their timings in a per-thread recorder. A caller
+starts recording before sending a request and collects the timings
+after it. Phases that didn't happen, e.g. because a kept-alive
+connection was reused, are not recorded.
+"""
+import socket
+import time
+from functools import partial
+from threading import local
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, VerifiedHTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+_RECORDER = local()
+
+
+def start_recording():
+    """Start recording phase timings in the current thread."""
+    _RECORDER.timings = {}
+
+
+def stop_recording():
+    """
+    Stop recording phase timings in the current thread.
+
+    :return: Recorded timings. Keys are phase names, values are seconds.
+    :rtype: dict
+    """
+    timings = getattr(_RECORDER, 'timings', None) or {}
+    _RECORDER.timings = None
+    return timings
+
+
+def _record(phase, seconds):
+    timings = getattr(_RECORDER, 'timings', None)
+    if timings is not None:
+        timings[phase] = seconds
+
+
+class _TimedConnectionMixin(object):
+    """Record DNS and TCP connect time of a new connection.
+
+    A connection created with the ``address`` keyword connects to that
+    IP address instead of resolving the host. Host header, TLS server
+    name and certificate checks still use the host."""
+
+    def __init__(self, *args, **kwargs):
+        self._address = kwargs.pop('address', None)
+        super(_TimedConnectionMixin, self).__init__(*args, **kwargs)
+
+    def _new_conn(self):
+        # urllib3 >= 1.24 resolves _dns_host, older versions - host
+        host_attr = '_dns_host' if hasattr(self, '_dns_host') else 'host'
+        dns_host = getattr(self, host_attr)
+
+        start = time.time()
+        try:
+            sockaddr = socket.getaddrinfo(
+                self._address or dns_host,
+                self.port,
+                0,
+                socket.SOCK_STREAM
+            )[0][4]
+        except socket.error as err:
+            raise NewConnectionError(
+                self,
+                "Failed to establish a new connection: %s" % err
+            )
+        resolved = time.time()
+        if not self._address:
+            _record('dns', resolved - start)
+
+        # Connect to the resolved address, so the DNS lookup
+        # isn't counted in the connect time.
+        setattr(self, host_attr, sockaddr[0])
+        try:
+            conn = super(_TimedConnectionMixin, self)._new_conn()
+        finally:
+            setattr(self, host_attr, dns_host)
+
+        _record('connect', time.time() - resolved)
+        return conn
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    """HTTP connection that records DNS and TCP connect time."""
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, VerifiedHTTPSConnection):
+    """HTTPS connection that records DNS, TCP connect
+    and TLS handshake time."""
+
+    def connect(self):
+        start = time.time()
+        super(TimedHTTPSConnection, self).connect()
+        timings = getattr(_RECORDER, 'timings', None) or {}
+        _record(
+            'tls',
+            time.time() - start
+            - timings.get('dns', 0) - timings.get('connect', 0)
+        )
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """Transport adapter whose connections record phase timings.
+
+    :param address: Connect to this IP address whatever host
+        a URL has.
+    :type address: str
+    """
+    def __init__(self, address=None, **kwargs):
+        self._address = address
+        super(TimedHTTPAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        pool_classes = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+        if self._address:
+            # Pools pass unknown keywords on to their connections
+            for scheme, pool_class in pool_classes.items():
+                pool_classes[scheme] = partial(
+                    pool_class,
+                    address=self._address
+                )
+        self.poolmanager.pool_classes_by_scheme = pool_classes
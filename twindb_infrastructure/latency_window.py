@@ -0,0 +1,145 @@
+"""Module with LatencyWindow() class and percentile thresholds"""
+import math
+import re
+from array import array
+from threading import Lock
+
+PERCENTILE_THRESHOLD_RE = re.compile(
+    r'^p(\d+(?:\.\d+)?)\s*>\s*(\d+(?:\.\d+)?)$'
+)
+
+
+class LatencyWindow(object):
+    """
+    Rolling window of the most recent load times.
+
+    Samples are kept in a ring buffer that is allocated once,
+    so adding a sample doesn't allocate memory.
+
+    :param size: Maximum number of samples in the window.
+    :type size: int
+    """
+    def __init__(self, size=100):
+        if size < 1:
+            raise ValueError('Window size must be positive')
+        self._samples = array('d', [0.0] * size)
+        self._next = 0
+        self._count = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return self._count
+
+    def add(self, value):
+        """Add a sample. The oldest one is dropped if the window is full."""
+        with self._lock:
+            self._samples[self._next] = value
+            self._next = (self._next + 1) % len(self._samples)
+            self._count = min(self._count + 1, len(self._samples))
+
+    def percentile(self, percent):
+        """
+        Get a percentile of samples in the window (nearest-rank method).
+
+        :param percent: Percentile, from 0 to 100.
+        :type percent: float
+        :return: The percentile or None if the window is empty.
+        :rtype: float
+        """
+        with self._lock:
+            samples = sorted(self._samples[:self._count])
+
+        return percentile(samples, percent)
+
+
+def percentile(samples, percent):
+    """
+    Get a percentile of sorted samples (nearest-rank method).
+
+    :param samples: Sorted samples.
+    :type samples: list(float)
+    :param percent: Percentile, from 0 to 100.
+    :type percent: float
+    :return: The percentile or None if there are no samples.
+    :rtype: float
+    """
+    if not samples:
+        return None
+
+    rank = int(math.ceil(percent / 100.0 * len(samples)))
+    return samples[max(rank, 1) - 1]
+
+
+class PercentileThreshold(object):
+    """
+    Load time threshold on a percentile of the latency window,
+    e.g. ``p95>2.0``.
+
+    :param percent: Percentile, from 0 to 100.
+    :type percent: float
+    :param seconds: Threshold in seconds.
+    :type seconds: float
+    """
+    def __init__(self, percent, seconds):
+        if not 0 < percent <= 100:
+            raise ValueError('Percentile must be between 0 and 100')
+        self.percent = percent
+        self.seconds = seconds
+
+    @property
+    def label(self):
+        """Short name of the percentile, e.g. p95."""
+        return 'p%g' % self.percent
+
+    def __str__(self):
+        return '%s>%g' % (self.label, self.seconds)
+
+
+def threshold_seconds(threshold):
+    """
+    Seconds of a plain load time threshold for performance data.
+
+    :param threshold: Seconds or percentile threshold.
+    :return: Seconds or None if it's a percentile threshold.
+    :rtype: float
+    """
+    if isinstance(threshold, PercentileThreshold):
+        return None
+    return threshold
+
+
+def percentile_seconds(threshold, percent):
+    """
+    Seconds of a threshold on the given percentile for performance data.
+
+    :param threshold: Seconds or percentile threshold.
+    :param percent: Percentile, from 0 to 100.
+    :type percent: float
+    :return: Seconds or None if it isn't a threshold on the percentile.
+    :rtype: float
+    """
+    if isinstance(threshold, PercentileThreshold) \
+            and threshold.percent == percent:
+        return threshold.seconds
+    return None
+
+
+def parse_threshold(value):
+    """
+    Parse a load time threshold.
+
+    :param value: Either seconds, e.g. ``2.0``, or a percentile
+        threshold, e.g. ``p95>2.0``.
+    :type value: str
+    :return: Seconds or percentile threshold.
+    :rtype: float or PercentileThreshold
+    :raise ValueError: if the value can't be parsed.
+    """
+    match = PERCENTILE_THRESHOLD_RE.match(value.strip())
+    if match:
+        return PercentileThreshold(
+            float(match.group(1)),
+            float(match.group(2))
+        )
+
+    return float(value)
@@ -0,0 +1,185 @@
+"""Module with LoadTest() class"""
+import time
+from threading import Lock, Thread
+
+from requests import RequestException
+
+from twindb_infrastructure.latency_window import percentile
+from twindb_infrastructure.metrics import LOAD_TIME_BUCKETS
+
+REPORT_PERCENTILES = [50, 90, 95, 99]
+
+
+class LoadTestResult(object):
+    """
+    Outcome of a load test.
+
+    :param latencies: Load times of successful requests in seconds.
+    :type latencies: list(float)
+    :param errors: Dictionary of exception type to the number of failed
+        requests.
+    :type errors: dict
+    :param duration: Wall clock time of the test in seconds.
+    :type duration: float
+    """
+    def __init__(self, latencies, errors, duration):
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.duration = duration
+
+    @property
+    def requests(self):
+        """Number of sent requests."""
+        return len(self.latencies) + sum(self.errors.values())
+
+    @property
+    def throughput(self):
+        """Requests per second."""
+        if not self.duration:
+            return 0.0
+        return self.requests / self.duration
+
+    def percentile(self, percent):
+        """Percentile of load times or None if no request succeeded."""
+        return percentile(self.latencies, percent)
+
+    def histogram(self, buckets=None):
+        """
+        Count load times in buckets.
+
+        :param buckets: Upper bounds of buckets in seconds.
+        :type buckets: list(float)
+        :return: List of (upper bound, count) tuples. The last bound
+            is None, it counts load times above all buckets.
+        :rtype: list(tuple)
+        """
+        bounds = sorted(buckets or LOAD_TIME_BUCKETS) + [None]
+        counts = [0] * len(bounds)
+        for latency in self.latencies:
+            for i, bound in enumerate(bounds):
+                if bound is None or latency <= bound:
+                    counts[i] += 1
+                    break
+        return zip(bounds, counts)
+
+    def __str__(self):
+        lines = [
+            'Requests:    %d' % self.requests,
+            'Errors:      %d' % sum(self.errors.values()),
+            'Duration:    %f seconds' % self.duration,
+            'Throughput:  %f requests/second' % self.throughput,
+        ]
+        if self.latencies:
+            lines.append('Load time (seconds):')
+            lines.append('  min   %f' % self.latencies[0])
+            for percent in REPORT_PERCENTILES:
+                lines.append(
+                    '  p%-4g %f' % (percent, self.percentile(percent))
+                )
+            lines.append('  max   %f' % self.latencies[-1])
+
+            lines.append('Histogram (seconds):')
+            histogram = self.histogram()
+            width = max([count for _, count in histogram])
+            previous = None
+            for bound, count in histogram:
+                label = '<= %g' % bound if bound is not None \
+                    else '> %g' % previous
+                previous = bound
+                lines.append(
+                    '  %-8s %8d %s' % (
+                        label,
+                        count,
+                        '#' * (40 * count // width)
+                    )
+                )
+                lines[-1] = lines[-1].rstrip()
+
+        if self.errors:
+            lines.append('Errors by type:')
+            for error_type in sorted(self.errors):
+                lines.append(
+                    '  %s %d' % (error_type, self.errors[error_type])
+                )
+
+        return '\n'.join(lines)
+
+
+class LoadTest(object):
+    """
+    Load a URL from concurrent workers and measure load times.
+
+    Every worker loads the URL with its own clone of the loader,
+    so Host and X-Forwarded-Proto handling is the same as in checks.
+
+    :param loader: Loader for the tested URL.
+    :type loader: Loader
+    :param concurrency: Number of workers.
+    :type concurrency: int
+    :param requests: Stop after this many requests.
+    :type requests: int
+    :param duration: Stop after this many seconds.
+    :type duration: float
+    """
+    def __init__(self, loader, concurrency=1, requests=None, duration=None):
+        if not requests and not duration:
+            raise ValueError('Either requests or duration must be given')
+
+        self._loader = loader
+        self._concurrency = concurrency
+        self._requests = requests
+        self._duration = duration
+        self._sent = 0
+        self._deadline = None
+        self._latencies = []
+        self._errors = {}
+        self._lock = Lock()
+
+    def run(self):
+        """
+        Run the load test.
+
+        :return: Load test result.
+        :rtype: LoadTestResult
+        """
+        start = time.time()
+        if self._duration:
+            self._deadline = start + self._duration
+
+        workers = [
+            Thread(target=self._work, args=(self._loader.clone(), ))
+            for _ in range(self._concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        return LoadTestResult(
+            self._latencies,
+            self._errors,
+            time.time() - start
+        )
+
+    def _next_request(self):
+        with self._lock:
+            if self._requests and self._sent >= self._requests:
+                return False
+            if self._deadline and time.time() >= self._deadline:
+                return False
+            self._sent += 1
+            return True
+
+    def _work(self, loader):
+        while self._next_request():
+            try:
+                load_time = loader.load_time
+                with self._lock:
+                    self._latencies.append(load_time)
+            except RequestException as err:
+                error_type = err.__class__.__name__
+                with self._lock:
+                    self._errors[error_type] = \
+                        self._errors.get(error_type, 0) + 1
+            finally:
+                loader.reset()
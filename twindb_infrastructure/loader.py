@@ -1,22 +1,225 @@
 """Module with Loader() class"""
 from HTMLParser import HTMLParser
+from multiprocessing.pool import ThreadPool
+from urlparse import urljoin, urlparse
 
 import requests
 import time
+from requests import RequestException
+
+from twindb_infrastructure.http_timing import TimedHTTPAdapter, \
+    start_recording, stop_recording
+
+STREAM_CHUNK_SIZE = 16384
+
+# Default memory limit of searching patterns in a streamed response
+STREAM_BUFFER = 2 * STREAM_CHUNK_SIZE
+
+ALL_TAGS = ['title', 'body']
+
+# Text inside these tags isn't a part of the body text
+SKIPPED_TAGS = ['script', 'style']
+
+# Tags that refer to assets
+ASSET_TAGS = ['link', 'script', 'img']
+
+# Link relations of <link> tags that browsers fetch with the page
+ASSET_RELS = set(['stylesheet', 'icon', 'preload', 'modulepreload'])
+
+# Number of assets fetched at the same time, like browsers do per host
+ASSET_CONCURRENCY = 6
+
+# Phases of a request in the order they happen
+PHASES = ['dns', 'connect', 'tls', 'ttfb', 'transfer']
+
+# Mode of probing a URL that loads and parses the whole page.
+# See :mod:`twindb_infrastructure.probe_loader` for lighter modes.
+LOADER_MODE_FULL = 'full'
+
+
+class ResponseTooLarge(RequestException):
+    pass
 
 
 class Loader(object, HTMLParser):
-    def __init__(self, url, timeout=10, host=None, protocol=None):
+    """
+    Load a URL and parse its title, body text, meta tags and links.
+
+    The document is parsed once, on the first access to any of them,
+    and the results are cached until :meth:`reset`.
+
+    The loader keeps a :class:`requests.Session`, so connections
+    to the server are kept alive and reused across :meth:`reset`.
+
+    :param url: URL to load.
+    :type url: str
+    :param timeout: Seconds before connection times out.
+    :type timeout: int
+    :param host: Value of Host: HTTP header.
+    :type host: str
+    :param protocol: Value of X-Forwarded-Proto HTTP header.
+    :type protocol: str
+    :param session: Session to send requests with. Loaders may share
+        a session to share its connection pool.
+    :type session: requests.Session
+    :param pool_connections: Number of per-host connection pools to cache.
+    :type pool_connections: int
+    :param pool_maxsize: Maximum number of connections kept open per host.
+    :type pool_maxsize: int
+    :param stream: Feed the response to the parser chunk by chunk and
+        stop reading once all ``required_tags`` are parsed.
+    :type stream: bool
+    :param max_body_size: Stop reading and fail if the decoded
+        response body is larger than this many bytes. It guards
+        the loader memory and time, unlike a size check on
+        :attr:`body_size`.
+    :type max_body_size: int
+    :param required_tags: Tags the caller needs. A streaming loader
+        closes the connection as soon as all of them are parsed.
+        By default title and body.
+    :type required_tags: list(str)
+    :param conditional: Send ETag and Last-Modified validators
+        of the last response. If the server answers 304 Not Modified,
+        reuse the cached response and its parsed title and body.
+    :type conditional: bool
+    :param fetch_assets: After the page fetch its stylesheets, scripts
+        and images concurrently. Load time then covers the page and
+        all the assets.
+    :type fetch_assets: bool
+    :param asset_concurrency: Number of assets fetched at the same time.
+    :type asset_concurrency: int
+    :param stream_patterns: Compiled regexps to search in the raw
+        response while streaming. The response isn't kept then,
+        the loader stops reading as soon as all patterns are found
+        and all ``required_tags`` are parsed.
+    :type stream_patterns: list
+    :param stream_buffer: Maximum number of response bytes held
+        in memory while searching ``stream_patterns``. Half of it
+        overlaps the previous chunk, so matches up to that long
+        are found even if they span chunks.
+    :type stream_buffer: int
+    :param full_body: Read a streamed response to the end even when
+        all ``required_tags`` are parsed and ``stream_patterns`` found,
+        so body size and throughput cover the whole response.
+    :type full_body: bool
+    :param address: Connect to this IP address instead of resolving
+        the URL host. The Host header and TLS certificate checks still
+        use the URL host.
+    :type address: str
+    :param check_status: Raise :class:`HTTPError` if the response
+        status is 4xx or 5xx. Turn it off when the caller checks
+        the status itself.
+    :type check_status: bool
+    """
+    def __init__(self, url, timeout=10, host=None, protocol=None,
+                 session=None, pool_connections=1, pool_maxsize=1,
+                 stream=False, max_body_size=None, required_tags=None,
+                 conditional=False, fetch_assets=False,
+                 asset_concurrency=ASSET_CONCURRENCY, stream_patterns=None,
+                 stream_buffer=STREAM_BUFFER, full_body=False, address=None,
+                 check_status=True):
+        if stream_patterns and not stream:
+            raise ValueError('Patterns can be searched only when streaming')
+        if stream_buffer < 2:
+            raise ValueError('Stream buffer must be at least 2 bytes')
+
         HTMLParser.__init__(self)
         self._url = url
         self._timeout = timeout
         self.__response = None
-        self._body = None
-        self._title = None
-        self.__current_tag = None
         self._host = host
         self._protocol = protocol
         self._load_time = None
+        self._connection_reused = None
+        self._phase_timings = None
+        self.__status_code = None
+        self.__headers = None
+        self._cold_load_time = None
+        self._warm_load_time = None
+        self._fetch_assets = fetch_assets
+        self._asset_concurrency = asset_concurrency
+        self._address = address
+        self._session = session or self._new_session(
+            pool_connections,
+            # Assets are fetched in parallel over the same pool
+            max(pool_maxsize, asset_concurrency) if fetch_assets
+            else pool_maxsize,
+            address=address
+        )
+        self._stream = stream
+        self._max_body_size = max_body_size
+        self._required_tags = ALL_TAGS if required_tags is None \
+            else required_tags
+        self._conditional = conditional
+        self.__cache = None
+        self._stream_patterns = stream_patterns or []
+        self._stream_buffer = stream_buffer
+        self._full_body = full_body
+        self._check_status = check_status
+
+    @property
+    def assets(self):
+        """
+        URLs of stylesheets, scripts and images as they are
+        in the document.
+
+        :rtype: list(str)
+        """
+        self._parse()
+        return self.__assets
+
+    @property
+    def asset_timings(self):
+        """
+        Fetch results of the page assets or None if they aren't fetched.
+
+        :rtype: list(AssetTiming)
+        """
+        self.load()
+        return self._asset_timings
+
+    @property
+    def matched_patterns(self):
+        """
+        Stream patterns found in the response.
+
+        :rtype: set
+        """
+        self.load()
+        return self._matched_patterns
+
+    @property
+    def document_load_time(self):
+        """Load time of the page without assets."""
+        self.load()
+        return self._document_load_time
+
+    @property
+    def page_weight(self):
+        """Size of the page and its fetched assets in bytes."""
+        self.load()
+        return self._get_body_size() + sum(
+            [a.size for a in self._asset_timings or []]
+        )
+
+    @property
+    def body_size(self):
+        """Number of response body bytes read off the wire, i.e.
+        before Content-Encoding is decoded. A streaming loader
+        may stop reading before the end of the response."""
+        self.load()
+        return self._get_body_size()
+
+    @property
+    def throughput(self):
+        """Bytes of the response body read off the wire per second
+        of transfer or None if no body was transferred, e.g. it wasn't
+        modified."""
+        self.load()
+        transfer_time = self._phase_timings['transfer']
+        if self._not_modified or not transfer_time:
+            return None
+        return self._get_body_size() / transfer_time
 
     @property
     def body(self):
@@ -24,13 +227,66 @@ class Loader(object, HTMLParser):
 
     @property
     def load_time(self):
-        if self._load_time is None:
-            start = time.time()
-            self.load()
-            self._load_time = time.time() - start
-
+        self.load()
         return self._load_time
 
+    @property
+    def phase_timings(self):
+        """
+        Time of each request phase in seconds. Keys are :const:`PHASES`.
+        Phases that were skipped (e.g. DNS lookup and connect
+        on a kept-alive connection) take zero seconds.
+
+        :rtype: dict
+        """
+        self.load()
+        return self._phase_timings
+
+    @property
+    def cold_load_time(self):
+        """Last load time over a new connection or None if never measured."""
+        return self._cold_load_time
+
+    @property
+    def warm_load_time(self):
+        """Last load time over a reused connection or None
+        if never measured."""
+        return self._warm_load_time
+
+    @property
+    def not_modified(self):
+        """True if the server answered the last load with 304 Not Modified
+        and the cached response was reused. None if nothing is loaded yet."""
+        return self._not_modified
+
+    @property
+    def connection_reused(self):
+        """True if the last load reused a kept-alive connection.
+        None if nothing is loaded yet."""
+        return self._connection_reused
+
+    @property
+    def status_code(self):
+        """HTTP status code of the response."""
+        self.load()
+        return self.__status_code
+
+    @property
+    def headers(self):
+        """Case-insensitive dictionary of the response headers."""
+        self.load()
+        return self.__headers
+
+    @property
+    def content_length(self):
+        """Content length as reported by the server
+        or the number of bytes read if it didn't report it."""
+        self.load()
+        try:
+            return int(self.__headers['Content-Length'])
+        except (KeyError, ValueError):
+            return self._get_body_size()
+
     @property
     def title(self):
         return self._get_tag('title')
@@ -39,14 +295,103 @@ class Loader(object, HTMLParser):
     def url(self):
         return self._url
 
+    @property
+    def meta(self):
+        """
+        Content of meta tags keyed by their name, property or
+        http-equiv attribute (lowercase).
+
+        :rtype: dict
+        """
+        self._parse()
+        return self.__meta
+
+    @property
+    def links(self):
+        """
+        URLs of <a href> links in the document order.
+
+        :rtype: list(str)
+        """
+        self._parse()
+        return self.__links
+
     def handle_starttag(self, tag, attrs):
-        self.__current_tag = tag
+        if tag in ASSET_TAGS:
+            asset = _asset_url(tag, attrs)
+            if asset:
+                self.__assets.append(asset)
+
+        if tag == 'title':
+            self.__in_title = True
+            if self.__chunks['title'] is None:
+                self.__chunks['title'] = []
+        elif tag == 'body':
+            self.__in_body = True
+            if self.__chunks['body'] is None:
+                self.__chunks['body'] = []
+        elif tag in SKIPPED_TAGS:
+            self.__skip_depth += 1
+        elif tag == 'a':
+            href = _get_attr(attrs, 'href')
+            if href is not None:
+                self.__links.append(href)
+        elif tag == 'meta':
+            content = _get_attr(attrs, 'content')
+            if content is not None:
+                for key in ['name', 'property', 'http-equiv']:
+                    name = _get_attr(attrs, key)
+                    if name is not None:
+                        self.__meta[name.lower()] = content
+                        break
 
     def handle_endtag(self, tag):
-        self.__current_tag = None
+        if tag == 'title':
+            self.__in_title = False
+        elif tag == 'body':
+            self.__in_body = False
+        elif tag in SKIPPED_TAGS and self.__skip_depth:
+            self.__skip_depth -= 1
+        self.__closed_tags.add(tag)
 
     def handle_data(self, data):
-        setattr(self, '_%s' % self.__current_tag, data)
+        if self.__in_title:
+            self.__chunks['title'].append(data)
+        elif self.__in_body and not self.__skip_depth:
+            self.__chunks['body'].append(data)
+
+    def clone(self, address=None):
+        """Create a new loader for the same URL with the same options.
+
+        :param address: Connect to this IP address instead.
+            The clone then gets its own session.
+        :type address: str
+        :return: Loader that shares only the session
+            (and its connection pool) with this one.
+        :rtype: Loader
+        """
+        return self.__class__(
+            self._url,
+            timeout=self._timeout,
+            host=self._host,
+            protocol=self._protocol,
+            session=None if address else self._session,
+            address=address or self._address,
+            stream=self._stream,
+            max_body_size=self._max_body_size,
+            required_tags=self._required_tags,
+            conditional=self._conditional,
+            fetch_assets=self._fetch_assets,
+            asset_concurrency=self._asset_concurrency,
+            stream_patterns=self._stream_patterns,
+            stream_buffer=self._stream_buffer,
+            full_body=self._full_body,
+            check_status=self._check_status
+        )
+
+    def close(self):
+        """Close all kept-alive connections."""
+        self._session.close()
 
     def load(self):
         return self._response
@@ -54,9 +399,28 @@ class Loader(object, HTMLParser):
     def reset(self):
         super(Loader, self).reset()
         self.__response = None
-        self._body = None
-        self._title = None
         self._load_time = None
+        self._connection_reused = None
+        self._not_modified = None
+        self._phase_timings = None
+        self.__status_code = None
+        self.__headers = None
+        self.__parsed = False
+        self.__closed_tags = set()
+        self.__in_title = False
+        self.__in_body = False
+        self.__skip_depth = 0
+        # Text chunks of a tag or None if the tag wasn't seen
+        self.__chunks = dict.fromkeys(ALL_TAGS)
+        # Joined text of a tag, filled on first access
+        self.__text = {}
+        self.__meta = {}
+        self.__links = []
+        self.__assets = []
+        self._asset_timings = None
+        self._document_load_time = None
+        self._matched_patterns = set()
+        self._body_size = None
 
     @property
     def _response(self):
@@ -65,22 +429,325 @@ class Loader(object, HTMLParser):
                 'timeout': self._timeout,
                 'allow_redirects': False,
             }
-            headers = {}
-            if self._host:
-                headers['Host'] = self._host
-            if self._protocol:
-                headers['X-Forwarded-Proto'] = self._protocol
+            headers = self._request_headers()
+            if self.__cache:
+                headers.update(self.__cache['validators'])
             if headers:
                 kwargs['headers'] = headers
 
-            resp = requests.get(self._url, **kwargs)
-            resp.raise_for_status()
-            self.__response = resp.content
+            # Headers and body are read separately
+            # to tell time to first byte from transfer time
+            kwargs['stream'] = True
+
+            start = time.time()
+            start_recording()
+            try:
+                opened = self._opened_connections()
+                resp = self._session.get(self._url, **kwargs)
+            finally:
+                connection_timings = stop_recording()
+            headers_received = time.time()
+
+            self._connection_reused = opened is not None \
+                and self._opened_connections() == opened
+            self._not_modified = resp.status_code == 304 \
+                and self.__cache is not None
+            if self._not_modified:
+                resp.close()
+                self._restore_cache(resp.headers)
+            else:
+                self.__status_code = resp.status_code
+                self.__headers = resp.headers
+                if self._check_status:
+                    try:
+                        resp.raise_for_status()
+                    except RequestException:
+                        resp.close()
+                        raise
+
+                if self._stream:
+                    self.__response = self._read_stream(resp)
+                else:
+                    self.__response = resp.content
+                    if self._max_body_size:
+                        self._check_body_size(len(self.__response))
+                    self._body_size = _wire_size(resp, len(self.__response))
+
+            finish = time.time()
+            self._load_time = finish - start
+            self._phase_timings = self._get_phase_timings(
+                connection_timings,
+                headers_received - start,
+                finish - headers_received
+            )
+            self._document_load_time = self._load_time
+            if self._connection_reused:
+                self._warm_load_time = self._load_time
+            else:
+                self._cold_load_time = self._load_time
+
+            if self._conditional and not self._not_modified:
+                self._save_cache()
+
+            if self._fetch_assets:
+                self._asset_timings = self._load_assets()
+                self._load_time = time.time() - start
 
         return self.__response
 
+    def _get_body_size(self):
+        # A streamed response may be read only partially or not kept
+        if self._body_size is None:
+            return len(self._response)
+        return self._body_size
+
+    def _request_headers(self):
+        headers = {}
+        if self._host:
+            headers['Host'] = self._host
+        if self._protocol:
+            headers['X-Forwarded-Proto'] = self._protocol
+        return headers
+
+    def _load_assets(self):
+        urls = []
+        for asset in self.assets:
+            url = urljoin(self._url, asset)
+            if urlparse(url).scheme in ['http', 'https'] and url not in urls:
+                urls.append(url)
+        if not urls:
+            return []
+
+        pool = ThreadPool(min(self._asset_concurrency, len(urls)))
+        try:
+            return pool.map(self._load_asset, urls)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _load_asset(self, url):
+        kwargs = {'timeout': self._timeout}
+        # Assets of the page host go to the same server as the page
+        if urlparse(url).netloc == urlparse(self._url).netloc:
+            headers = self._request_headers()
+            if headers:
+                kwargs['headers'] = headers
+
+        start = time.time()
+        try:
+            resp = self._session.get(url, **kwargs)
+            return AssetTiming(
+                url,
+                time.time() - start,
+                status_code=resp.status_code,
+                size=_wire_size(resp, len(resp.content))
+            )
+        except RequestException as err:
+            return AssetTiming(url, time.time() - start, error=err)
+
+    def _save_cache(self):
+        validators = _get_validators(self.__headers)
+        if self.__status_code != 200 or not validators:
+            self.__cache = None
+            return
+
+        # The cached response is parsed once for all 304 answers
+        self._parse()
+        self.__cache = {
+            'validators': validators,
+            'response': self.__response,
+            'status_code': self.__status_code,
+            'headers': self.__headers,
+            'chunks': self.__chunks,
+            'meta': self.__meta,
+            'links': self.__links,
+            'assets': self.__assets,
+            'body_size': self._body_size,
+            'matched_patterns': self._matched_patterns,
+        }
+
+    def _restore_cache(self, headers):
+        # 304 may carry new validators of the same content
+        self.__cache['validators'].update(_get_validators(headers))
+        self.__response = self.__cache['response']
+        self.__status_code = self.__cache['status_code']
+        self.__headers = self.__cache['headers']
+        self.__chunks = self.__cache['chunks']
+        self.__meta = self.__cache['meta']
+        self.__links = self.__cache['links']
+        self.__assets = self.__cache['assets']
+        self._body_size = self.__cache['body_size']
+        self._matched_patterns = self.__cache['matched_patterns']
+        self.__parsed = True
+
+    def _read_stream(self, resp):
+        chunks = []
+        size = 0
+        unmatched = list(self._stream_patterns)
+        chunk_size = STREAM_CHUNK_SIZE
+        if unmatched:
+            overlap = self._stream_buffer // 2
+            chunk_size = min(chunk_size, self._stream_buffer - overlap)
+        window = ''
+        try:
+            if unmatched or not self._tags_parsed() or self._full_body:
+                for chunk in resp.iter_content(chunk_size):
+                    size += len(chunk)
+                    self._check_body_size(size)
+                    if not self._tags_parsed():
+                        self.feed(chunk)
+                    if self._stream_patterns:
+                        window = window[-overlap:] + chunk
+                        unmatched = [
+                            p for p in unmatched if p.search(window) is None
+                        ]
+                    else:
+                        chunks.append(chunk)
+                    if not unmatched and self._tags_parsed() \
+                            and not self._full_body:
+                        break
+        finally:
+            # Closes the connection if the body isn't read till the end
+            resp.close()
+
+        self._matched_patterns = set(self._stream_patterns) - set(unmatched)
+        self._body_size = _wire_size(resp, size)
+        self.__parsed = True
+        return ''.join(chunks)
+
+    def _tags_parsed(self):
+        # Assets may be anywhere in the document
+        if self._fetch_assets:
+            return False
+        return all([tag in self.__closed_tags for tag in self._required_tags])
+
+    def _check_body_size(self, size):
+        if self._max_body_size and size > self._max_body_size:
+            raise ResponseTooLarge(
+                'Response body is larger than %d bytes' % self._max_body_size
+            )
+
+    @staticmethod
+    def _get_phase_timings(connection_timings, headers_time, transfer_time):
+        timings = dict.fromkeys(PHASES, 0)
+        timings.update(connection_timings)
+        timings['ttfb'] = max(
+            0,
+            headers_time - sum(connection_timings.values())
+        )
+        timings['transfer'] = transfer_time
+        return timings
+
+    def _opened_connections(self):
+        adapter = self._session.get_adapter(self._url)
+        try:
+            pool = adapter.poolmanager.connection_from_url(self._url)
+        except ValueError:
+            # Malformed URL, the request itself will fail
+            return None
+        return pool.num_connections
+
+    @staticmethod
+    def _new_session(pool_connections, pool_maxsize, address=None):
+        session = requests.Session()
+        for prefix in ['http://', 'https://']:
+            session.mount(
+                prefix,
+                TimedHTTPAdapter(
+                    address=address,
+                    pool_connections=pool_connections,
+                    pool_maxsize=pool_maxsize
+                )
+            )
+        return session
+
+    def _parse(self):
+        content = self._response
+        # A streaming loader feeds the parser while loading
+        if not self.__parsed:
+            self.feed(content)
+            self.__parsed = True
+
     def _get_tag(self, tag):
-        if getattr(self, '_%s' % tag) is None:
-            self.feed(self._response)
+        if tag not in self.__text:
+            self._parse()
+            chunks = self.__chunks[tag]
+            self.__text[tag] = None if chunks is None else ''.join(chunks)
+
+        return self.__text[tag]
+
+
+class AssetTiming(object):
+    """
+    Fetch result of a page asset.
+
+    :param url: Absolute URL of the asset.
+    :type url: str
+    :param load_time: Seconds it took to fetch the asset.
+    :type load_time: float
+    :param status_code: HTTP status code or None if the request failed.
+    :type status_code: int
+    :param size: Size of the asset in bytes.
+    :type size: int
+    :param error: Error if the request failed.
+    :type error: RequestException
+    """
+    def __init__(self, url, load_time, status_code=None, size=0,
+                 error=None):
+        self.url = url
+        self.load_time = load_time
+        self.status_code = status_code
+        self.size = size
+        self.error = error
+
+    @property
+    def failed(self):
+        """True if the request failed or the server responded
+        with an error status."""
+        return self.error is not None or self.status_code >= 400
+
+
+def _asset_url(tag, attrs):
+    """Get the asset URL of a tag or None if it isn't an asset."""
+    if tag == 'link':
+        rel = _get_attr(attrs, 'rel') or ''
+        if ASSET_RELS.intersection(rel.lower().split()):
+            return _get_attr(attrs, 'href')
+        return None
+
+    return _get_attr(attrs, 'src')
+
+
+def _get_validators(headers):
+    """Get conditional request headers from the response headers."""
+    validators = {}
+    if headers.get('ETag'):
+        validators['If-None-Match'] = headers['ETag']
+    if headers.get('Last-Modified'):
+        validators['If-Modified-Since'] = headers['Last-Modified']
+    return validators
+
+
+def _get_attr(attrs, name):
+    for key, value in attrs:
+        if key == name:
+            return value
+    return None
+
+
+def _wire_size(resp, default):
+    """
+    Number of response body bytes read off the connection, before
+    Content-Encoding is decoded.
 
-        return getattr(self, '_%s' % tag)
+    :param resp: Response.
+    :type resp: requests.Response
+    :param default: Size to return if the transport doesn't count bytes.
+    :type default: int
+    :rtype: int
+    """
+    try:
+        size = resp.raw.tell()
+    except AttributeError:
+        return default
+    return size if isinstance(size, (int, long)) else default
@@ -0,0 +1,144 @@
+"""Module with CheckMetrics() class"""
+import time
+from threading import Lock
+
+from twindb_infrastructure.nagios import NAGIOS_EXIT_OK, \
+    NAGIOS_EXIT_WARNING, NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_UNKNOWN
+
+# Upper bounds of load time histogram buckets in seconds
+LOAD_TIME_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+STATUS_NAMES = {
+    NAGIOS_EXIT_OK: 'ok',
+    NAGIOS_EXIT_WARNING: 'warning',
+    NAGIOS_EXIT_CRITICAL: 'critical',
+    NAGIOS_EXIT_UNKNOWN: 'unknown',
+}
+
+METRIC_PREFIX = 'twindb_check_http'
+
+
+class CheckMetrics(object):
+    """
+    Thread-safe collector of check results in Prometheus format.
+
+    :param buckets: Upper bounds of load time histogram buckets.
+    :type buckets: list(float)
+    """
+    def __init__(self, buckets=None):
+        self._buckets = sorted(buckets or LOAD_TIME_BUCKETS)
+        self._bucket_counts = [0] * len(self._buckets)
+        self._load_time_sum = 0.0
+        self._load_time_count = 0
+        self._results = dict.fromkeys(STATUS_NAMES.values(), 0)
+        self._errors = {}
+        self._last_success = None
+        self._lock = Lock()
+
+    def observe_load_time(self, load_time):
+        """Add a load time to the histogram."""
+        with self._lock:
+            for i, bound in enumerate(self._buckets):
+                if load_time <= bound:
+                    self._bucket_counts[i] += 1
+                    break
+            self._load_time_sum += load_time
+            self._load_time_count += 1
+
+    def observe_result(self, nagios_code):
+        """Count a check result."""
+        with self._lock:
+            self._results[STATUS_NAMES[nagios_code]] += 1
+            if nagios_code == NAGIOS_EXIT_OK:
+                self._last_success = time.time()
+
+    def observe_error(self, err):
+        """Count an upstream error by its exception type."""
+        error_type = err.__class__.__name__
+        with self._lock:
+            self._errors[error_type] = self._errors.get(error_type, 0) + 1
+
+    def render(self):
+        """
+        Render metrics in Prometheus text format.
+
+        :rtype: str
+        """
+        with self._lock:
+            lines = [
+                '# HELP %s_load_time_seconds Page load time.'
+                % METRIC_PREFIX,
+                '# TYPE %s_load_time_seconds histogram' % METRIC_PREFIX,
+            ]
+            cumulative = 0
+            for bound, count in zip(self._buckets, self._bucket_counts):
+                cumulative += count
+                lines.append(
+                    '%s_load_time_seconds_bucket{le="%s"} %d'
+                    % (METRIC_PREFIX, bound, cumulative)
+                )
+            lines += [
+                '%s_load_time_seconds_bucket{le="+Inf"} %d'
+                % (METRIC_PREFIX, self._load_time_count),
+                '%s_load_time_seconds_sum %f'
+                % (METRIC_PREFIX, self._load_time_sum),
+                '%s_load_time_seconds_count %d'
+                % (METRIC_PREFIX, self._load_time_count),
+                '# HELP %s_results_total Check results by status.'
+                % METRIC_PREFIX,
+                '# TYPE %s_results_total counter' % METRIC_PREFIX,
+            ]
+            for status in sorted(self._results):
+                lines.append(
+                    '%s_results_total{status="%s"} %d'
+                    % (METRIC_PREFIX, status, self._results[status])
+                )
+            lines += [
+                '# HELP %s_upstream_errors_total '
+                'Failed page loads by exception type.' % METRIC_PREFIX,
+                '# TYPE %s_upstream_errors_total counter' % METRIC_PREFIX,
+            ]
+            for error_type in sorted(self._errors):
+                lines.append(
+                    '%s_upstream_errors_total{type="%s"} %d'
+                    % (
+                        METRIC_PREFIX,
+                        _escape(error_type),
+                        self._errors[error_type]
+                    )
+                )
+            if self._last_success is not None:
+                lines += [
+                    '# HELP %s_last_success_timestamp_seconds '
+                    'Time of the last OK check.' % METRIC_PREFIX,
+                    '# TYPE %s_last_success_timestamp_seconds gauge'
+                    % METRIC_PREFIX,
+                    '%s_last_success_timestamp_seconds %f'
+                    % (METRIC_PREFIX, self._last_success),
+                ]
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsHttpResponse(object):
+    """HTTP response with metrics in Prometheus text format."""
+    def __init__(self, metrics):
+        self._metrics = metrics
+
+    def __str__(self):
+        body = self._metrics.render()
+        template = "HTTP/1.1 200 OK\r\n" \
+                   "Content-Type: text/plain; version=0.0.4; " \
+                   "charset=UTF-8\r\n" \
+                   "Connection: close\r\n" \
+                   "Content-Length: {len}\r\n\r\n" \
+                   "{body}"
+        return template.format(
+            len=len(body),
+            body=body
+        )
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
@@ -1,9 +1,51 @@
 """twindb-monitoring CLI module."""
+import re
+import time
+from datetime import datetime
+
 import click
 
+from twindb_infrastructure import log, setup_logging
+from twindb_infrastructure.backends import BackendLoaders, Resolver, DNS_TTL
+from twindb_infrastructure.check_cache import CheckCache, STALE_RESPONSES, \
+    STALE_RESPONSE_CRITICAL
+from twindb_infrastructure.check_client import DEFAULT_SOCKET
+from twindb_infrastructure.check_daemon import CheckDaemon
+from twindb_infrastructure.check_galera import GaleraChecker, \
+    GALERA_STATUS_QUERY
+from twindb_infrastructure.check_mysql import MysqlChecker, MysqlProbe, \
+    DEFAULT_QUERY
 from twindb_infrastructure.check_http import \
-    HttpChecker, CheckHttpResponse, CheckResponse
-from twindb_infrastructure.loader import Loader
+    HttpChecker, AgentCheckResponse, CheckHttpResponse, CheckResponse
+from twindb_infrastructure.check_rules import parse_phase_threshold
+from twindb_infrastructure.health_server import HealthServer
+from twindb_infrastructure.history import HistoryFile, HistoryException, \
+    history_path, history_names, RESOLUTIONS, RESOLUTION_RAW
+from twindb_infrastructure.latency_window import parse_threshold
+from twindb_infrastructure.load_test import LoadTest
+from twindb_infrastructure.loader import Loader, PHASES, ASSET_CONCURRENCY, \
+    STREAM_BUFFER, LOADER_MODE_FULL
+from twindb_infrastructure.metrics import CheckMetrics, \
+    MetricsHttpResponse, STATUS_NAMES
+from twindb_infrastructure.nagios import worst_nagios_code, \
+    NAGIOS_EXIT_OK, NAGIOS_EXIT_UNKNOWN
+from twindb_infrastructure.probe_loader import ProbeLoader, PROBE_MODES, \
+    PROBE_MODE_TCP
+from twindb_infrastructure.scheduler import CheckScheduler
+from twindb_infrastructure.sharded_monitor import ShardedMonitor
+from twindb_infrastructure.targets import parse_targets, check_targets, \
+    TargetsException
+
+
+class LoadTimeThreshold(click.ParamType):
+    """Load time threshold: seconds or a percentile, e.g. p95>2.0"""
+    name = 'threshold'
+
+    def convert(self, value, param, ctx):
+        try:
+            return parse_threshold(value)
+        except ValueError as err:
+            self.fail('%s: %s' % (value, err), param, ctx)
 
 
 @click.group()
@@ -16,13 +58,25 @@ def main():
 @click.argument('url')
 @click.option(
     '-w', '--warning',
-    help='Response time to result in warning status (seconds)',
-    type=click.FLOAT,
+    help='Response time to result in warning status (seconds). '
+         'A percentile of recent response times, e.g. p95>2.0, '
+         'is allowed too',
+    type=LoadTimeThreshold(),
 )
 @click.option(
     '-c', '--critical',
-    help='Response time to result in critical status (seconds)',
-    type=click.FLOAT,
+    help='Response time to result in critical status (seconds). '
+         'A percentile of recent response times, e.g. p95>2.0, '
+         'is allowed too',
+    type=LoadTimeThreshold(),
+)
+@click.option(
+    '--window-size',
+    help='How many recent response times percentile thresholds '
+         'take into account',
+    type=click.INT,
+    default=100,
+    show_default=True,
 )
 @click.option(
     '-t', '--timeout',
@@ -43,6 +97,73 @@ def main():
     '--body-regexp',
     help='Expect the regexp to match the body',
 )
+@click.option(
+    '--status-code',
+    help='Expect this HTTP status code',
+    type=click.INT,
+)
+@click.option(
+    '--header-regexp',
+    help="Expect a response header to match a regexp. "
+         "Format is 'Name: regexp'. Multiple options are allowed",
+    multiple=True,
+)
+@click.option(
+    '--min-content-length',
+    help='Expect the content to be at least this many bytes',
+    type=click.INT,
+)
+@click.option(
+    '--max-content-length',
+    help='Expect the content to be at most this many bytes',
+    type=click.INT,
+)
+@click.option(
+    '--warning-size',
+    help='Size of the response body as transferred, i.e. compressed '
+         'if the server compresses it, to result in warning status. '
+         'The whole body is read',
+    type=click.INT,
+)
+@click.option(
+    '--critical-size',
+    help='Size of the response body as transferred, i.e. compressed '
+         'if the server compresses it, to result in critical status. '
+         'The whole body is read',
+    type=click.INT,
+)
+@click.option(
+    '--warning-throughput',
+    help='Transfer rate of the response body (bytes/s) below which '
+         'the status is warning',
+    type=click.FLOAT,
+)
+@click.option(
+    '--critical-throughput',
+    help='Transfer rate of the response body (bytes/s) below which '
+         'the status is critical',
+    type=click.FLOAT,
+)
+@click.option(
+    '--phase-warning',
+    help='Time of a request phase to result in warning status. '
+         'Format is phase=seconds, phase is one of %s. '
+         'Multiple options are allowed' % ', '.join(PHASES),
+    multiple=True,
+)
+@click.option(
+    '--phase-critical',
+    help='Time of a request phase to result in critical status. '
+         'Format is the same as of --phase-warning',
+    multiple=True,
+)
+@click.option(
+    '--perfdata/--no-perfdata',
+    help='Report load time and request phase timings '
+         'as Nagios performance data',
+    default=True,
+    show_default=True,
+)
 @click.option(
     '--http',
     help='Print result as an HTTP response',
@@ -61,7 +182,16 @@ def main():
 )
 @click.option(
     '--http-server',
-    help='Run an HTTP server that reports the check result',
+    help='Run an HTTP server that reports the check result. '
+         'It serves Prometheus metrics on /metrics',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--agent-check',
+    help='Make the server speak HAProxy agent-check protocol: '
+         'answer every connection with up and a weight percentage '
+         'derived from the load time, drain or down',
     is_flag=True,
     default=False
 )
@@ -72,18 +202,187 @@ def main():
     default=8080,
     show_default=True,
 )
+@click.option(
+    '--http-workers',
+    help='Number of probes the HTTP server serves at the same time',
+    type=click.INT,
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--pid-file',
+    help='Record the server PID in this file. A new server started '
+         'with the same file binds alongside the old one and stops it '
+         'gracefully, so a restart fails no probes',
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    '--http-backlog',
+    help='Backlog of the HTTP server listening socket',
+    type=click.INT,
+    default=128,
+    show_default=True,
+)
+@click.option(
+    '--pool-maxsize',
+    help='Maximum number of kept-alive connections to the server '
+         '[default: --http-workers]',
+    type=click.INT,
+)
+@click.option(
+    '--mode',
+    help='How to probe the URL. full loads and parses the page, '
+         'tcp only connects, head and raw send HEAD or GET with a minimal '
+         'client and read only the status line and headers. '
+         'Title and body checks need the full mode',
+    type=click.Choice([LOADER_MODE_FULL] + PROBE_MODES),
+    default=LOADER_MODE_FULL,
+    show_default=True,
+)
+@click.option(
+    '--all-addresses',
+    help='Resolve all A and AAAA records of the URL host and check '
+         'every address concurrently with the original Host header',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--quorum',
+    help='With --all-addresses, how many addresses must pass '
+         'for the check to pass [default: all]',
+    type=click.IntRange(min=1),
+)
+@click.option(
+    '--dns-ttl',
+    help='With --all-addresses, seconds to cache the resolved addresses',
+    type=click.FLOAT,
+    default=DNS_TTL,
+    show_default=True,
+)
+@click.option(
+    '--stream',
+    help='Parse the response while downloading and stop '
+         'as soon as the title and body checks can be decided',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--stream-body-regexp',
+    help='Search --body-regexp in the raw response while streaming it '
+         'instead of matching the parsed body text. The response is '
+         'never held in memory as a whole',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--stream-buffer',
+    help='Maximum response bytes held in memory by --stream-body-regexp. '
+         'Matches up to half of it long are found',
+    type=click.INT,
+    default=STREAM_BUFFER,
+    show_default=True,
+)
+@click.option(
+    '--max-body-size',
+    help='Stop reading a response body larger than this many bytes '
+         'after decoding and report critical. Unlike --critical-size '
+         'it limits how much the check reads',
+    type=click.INT,
+)
+@click.option(
+    '--conditional',
+    help='Send ETag and Last-Modified validators of the last response '
+         'and reuse it if the server answers 304 Not Modified',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--fetch-assets',
+    help='Fetch stylesheets, scripts and images of the page concurrently. '
+         'Load time thresholds then apply to the whole page load',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--asset-concurrency',
+    help='Number of assets fetched at the same time',
+    type=click.INT,
+    default=ASSET_CONCURRENCY,
+    show_default=True,
+)
+@click.option(
+    '--refresh-interval',
+    help='Check in the background every so many seconds and answer '
+         'HTTP server probes with the last result',
+    type=click.FLOAT,
+)
+@click.option(
+    '--max-staleness',
+    help='Seconds after which the last result is stale '
+         '[default: 3 refresh intervals]',
+    type=click.FLOAT,
+)
+@click.option(
+    '--stale-response',
+    help='What to answer with when the last result is stale',
+    type=click.Choice(STALE_RESPONSES),
+    default=STALE_RESPONSE_CRITICAL,
+    show_default=True,
+)
+@click.option(
+    '--history-dir',
+    help='Record check results to a history file in this directory',
+    type=click.Path(file_okay=False),
+)
+@click.option(
+    '--history-name',
+    help='Name of the history file [default: URL]',
+)
 def check_http(url,
                warning,
                critical,
+               window_size,
                timeout,
                title,
                title_regexp,
                body_regexp,
+               status_code,
+               header_regexp,
+               min_content_length,
+               max_content_length,
+               warning_size,
+               critical_size,
+               warning_throughput,
+               critical_throughput,
+               phase_warning,
+               phase_critical,
+               perfdata,
                http,
                host,
                protocol,
                http_server,
-               http_port
+               agent_check,
+               http_port,
+               http_workers,
+               pid_file,
+               http_backlog,
+               pool_maxsize,
+               mode,
+               all_addresses,
+               quorum,
+               dns_ttl,
+               stream,
+               stream_body_regexp,
+               stream_buffer,
+               max_body_size,
+               conditional,
+               fetch_assets,
+               asset_concurrency,
+               refresh_interval,
+               max_staleness,
+               stale_response,
+               history_dir,
+               history_name
                ):
     """
     Make an HTTP(s) GET request and check response against given criteria.
@@ -96,22 +395,111 @@ def check_http(url,
         - 2 - Critical
         - 3 - Unknown
     """
-    loader = Loader(
-        url,
-        timeout=timeout,
-        host=host,
-        protocol=protocol
-    )
-    checker = HttpChecker(
-        critical_load_time=critical,
-        warning_load_time=warning,
-        title=title,
-        title_regexp=title_regexp,
-        body_regexp=body_regexp
-    )
+    history = None
+    if history_dir:
+        try:
+            history = HistoryFile(
+                history_path(history_dir, history_name or url),
+                writable=True
+            )
+        except (IOError, OSError, HistoryException) as err:
+            raise click.BadParameter(str(err))
+
+    try:
+        checker = HttpChecker(
+            critical_load_time=critical,
+            warning_load_time=warning,
+            title=title,
+            title_regexp=title_regexp,
+            body_regexp=body_regexp,
+            stream_body_regexp=stream_body_regexp,
+            status_code=status_code,
+            header_regexps=header_regexp,
+            min_content_length=min_content_length,
+            max_content_length=max_content_length,
+            warning_body_size=warning_size,
+            critical_body_size=critical_size,
+            warning_throughput=warning_throughput,
+            critical_throughput=critical_throughput,
+            phase_warning=dict(
+                [parse_phase_threshold(p) for p in phase_warning]
+            ),
+            phase_critical=dict(
+                [parse_phase_threshold(p) for p in phase_critical]
+            ),
+            perfdata=perfdata,
+            metrics=CheckMetrics() if http_server else None,
+            window_size=window_size,
+            history=history,
+            quorum=quorum
+        )
+        if mode == LOADER_MODE_FULL:
+            loader = Loader(
+                url,
+                timeout=timeout,
+                host=host,
+                protocol=protocol,
+                pool_maxsize=pool_maxsize or http_workers,
+                stream=stream or stream_body_regexp,
+                max_body_size=max_body_size,
+                required_tags=checker.required_tags,
+                conditional=conditional,
+                fetch_assets=fetch_assets,
+                asset_concurrency=asset_concurrency,
+                stream_patterns=checker.stream_patterns,
+                stream_buffer=stream_buffer,
+                full_body=checker.full_body,
+                check_status=not checker.checks_status
+            )
+        elif checker.required_tags or warning_size is not None \
+                or critical_size is not None:
+            raise ValueError(
+                'Title, body and size checks need --mode %s'
+                % LOADER_MODE_FULL
+            )
+        elif mode == PROBE_MODE_TCP and (
+                status_code or header_regexp
+                or min_content_length is not None
+                or max_content_length is not None):
+            raise ValueError(
+                'Status code, header and content length checks '
+                'need an HTTP request, not --mode %s' % PROBE_MODE_TCP
+            )
+        else:
+            loader = ProbeLoader(
+                url,
+                mode=mode,
+                timeout=timeout,
+                host=host,
+                protocol=protocol,
+                check_status=not checker.checks_status
+            )
+        if all_addresses:
+            loader = BackendLoaders(loader, resolver=Resolver(ttl=dns_ttl))
+    except (ValueError, re.error) as err:
+        raise click.BadParameter(str(err))
 
     if http_server:
-        checker.start_server(http_port, loader)
+        resp_class = AgentCheckResponse if agent_check else CheckHttpResponse
+        cache = None
+        if refresh_interval:
+            cache = CheckCache(
+                checker,
+                loader,
+                refresh_interval=refresh_interval,
+                max_staleness=max_staleness,
+                stale_response=stale_response,
+                resp_class=resp_class
+            )
+        checker.start_server(
+            http_port,
+            loader,
+            workers=http_workers,
+            backlog=http_backlog,
+            cache=cache,
+            resp_class=resp_class,
+            pid_file=pid_file
+        )
 
     else:
         response = checker.check(
@@ -120,3 +508,773 @@ def check_http(url,
         )
         print(response)
         exit(response.nagios_code)
+
+
+@main.command()
+@click.argument('host')
+@click.option(
+    '--port',
+    help='MySQL or ProxySQL port',
+    type=click.INT,
+    default=3306,
+    show_default=True,
+)
+@click.option(
+    '--user',
+    help='MySQL user',
+    default='root',
+    show_default=True,
+)
+@click.option(
+    '--password',
+    help='MySQL password',
+    envvar='MYSQL_PWD',
+    default='',
+)
+@click.option(
+    '--query',
+    help='Query to run',
+    default=DEFAULT_QUERY,
+    show_default=True,
+)
+@click.option(
+    '-t', '--timeout',
+    help='Seconds before connect or query times out',
+    type=click.INT,
+    default=10,
+    show_default=True,
+)
+@click.option(
+    '-w', '--warning',
+    help='Query time to result in warning status (seconds). '
+         'A percentile of recent query times, e.g. p95>0.01, '
+         'is allowed too',
+    type=LoadTimeThreshold(),
+)
+@click.option(
+    '-c', '--critical',
+    help='Query time to result in critical status (seconds). '
+         'A percentile of recent query times, e.g. p95>0.01, '
+         'is allowed too',
+    type=LoadTimeThreshold(),
+)
+@click.option(
+    '--connect-warning',
+    help='Connect time to result in warning status (seconds)',
+    type=click.FLOAT,
+)
+@click.option(
+    '--connect-critical',
+    help='Connect time to result in critical status (seconds)',
+    type=click.FLOAT,
+)
+@click.option(
+    '--window-size',
+    help='How many recent query times percentiles take into account',
+    type=click.INT,
+    default=100,
+    show_default=True,
+)
+@click.option(
+    '--count',
+    help='Run the query so many times over the same connection '
+         'and report the last result',
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    '--interval',
+    help='Seconds between queries of --count',
+    type=click.FLOAT,
+    default=0,
+    show_default=True,
+)
+@click.option(
+    '--perfdata',
+    help='Add connect time, query time and its percentiles '
+         'to the output as Nagios performance data',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--http',
+    help='Format output as HTTP response',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--http-server',
+    help='Run an HTTP server that reports the check result. '
+         'Every probe runs the query over a persistent connection',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--agent-check',
+    help='Make the server speak HAProxy agent-check protocol',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--http-port',
+    help='Bind the HTTP server to this TCP port',
+    type=click.INT,
+    default=8080,
+    show_default=True,
+)
+@click.option(
+    '--http-workers',
+    help='Number of probes the HTTP server serves at the same time',
+    type=click.INT,
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--pid-file',
+    help='Record the server PID in this file and take over '
+         'from the server recorded there',
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    '--http-backlog',
+    help='Backlog of the HTTP server listening socket',
+    type=click.INT,
+    default=128,
+    show_default=True,
+)
+@click.option(
+    '--history-dir',
+    help='Record query times and results to a history file '
+         'in this directory',
+    type=click.Path(exists=True, file_okay=False),
+)
+@click.option(
+    '--history-name',
+    help='Name of the history file [default: HOST:PORT]',
+)
+def check_mysql(host, port, user, password, query, timeout, warning,
+                critical, connect_warning, connect_critical, window_size,
+                count, interval, perfdata, http, http_server, agent_check,
+                http_port, http_workers, pid_file, http_backlog,
+                history_dir, history_name):
+    """
+    Run a query on a MySQL or ProxySQL server and check its latency.
+
+    The exit code matches Nagios convention.
+    """
+    probe = MysqlProbe(
+        host,
+        port=port,
+        user=user,
+        password=password,
+        query=query,
+        timeout=timeout
+    )
+    history = None
+    if history_dir:
+        try:
+            history = HistoryFile(
+                history_path(history_dir, history_name or probe.name),
+                writable=True
+            )
+        except (IOError, OSError, HistoryException) as err:
+            raise click.BadParameter(str(err))
+
+    try:
+        checker = MysqlChecker(
+            critical_query_time=critical,
+            warning_query_time=warning,
+            critical_connect_time=connect_critical,
+            warning_connect_time=connect_warning,
+            window_size=window_size,
+            perfdata=perfdata,
+            history=history
+        )
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    if http_server:
+        checker.start_server(
+            http_port,
+            probe,
+            workers=http_workers,
+            backlog=http_backlog,
+            resp_class=AgentCheckResponse if agent_check
+            else CheckHttpResponse,
+            pid_file=pid_file
+        )
+
+    else:
+        resp_class = CheckHttpResponse if http else CheckResponse
+        try:
+            for i in range(count):
+                if i:
+                    time.sleep(interval)
+                response = checker.check(probe, resp_class)
+        finally:
+            probe.close()
+        print(response)
+        exit(response.nagios_code)
+
+
+@main.command()
+@click.argument('nodes', nargs=-1, required=True)
+@click.option(
+    '--port',
+    help='MySQL port of nodes given without a port',
+    type=click.INT,
+    default=3306,
+    show_default=True,
+)
+@click.option(
+    '--user',
+    help='MySQL user',
+    default='root',
+    show_default=True,
+)
+@click.option(
+    '--password',
+    help='MySQL password',
+    envvar='MYSQL_PWD',
+    default='',
+)
+@click.option(
+    '-t', '--timeout',
+    help='Seconds before connect or query times out',
+    type=click.INT,
+    default=10,
+    show_default=True,
+)
+@click.option(
+    '--cluster-size',
+    help='Expected number of nodes. A smaller cluster results '
+         'in warning status [default: number of NODES]',
+    type=click.IntRange(min=1),
+)
+@click.option(
+    '--warning-flow-control',
+    help='Fraction of time from 0 to 1 writes are paused by flow control '
+         'to result in warning status',
+    type=click.FloatRange(min=0, max=1),
+    default=0.1,
+    show_default=True,
+)
+@click.option(
+    '--critical-flow-control',
+    help='Fraction of time from 0 to 1 writes are paused by flow control '
+         'to result in critical status',
+    type=click.FloatRange(min=0, max=1),
+    default=0.5,
+    show_default=True,
+)
+@click.option(
+    '--warning-recv-queue',
+    help='Average receive queue length to result in warning status',
+    type=click.FLOAT,
+)
+@click.option(
+    '--critical-recv-queue',
+    help='Average receive queue length to result in critical status',
+    type=click.FLOAT,
+)
+@click.option(
+    '--warning-send-queue',
+    help='Average send queue length to result in warning status',
+    type=click.FLOAT,
+)
+@click.option(
+    '--critical-send-queue',
+    help='Average send queue length to result in critical status',
+    type=click.FLOAT,
+)
+@click.option(
+    '--count',
+    help='Poll the nodes so many times over the same connections '
+         'and report the last result. Flow control is measured '
+         'between the polls',
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    '--interval',
+    help='Seconds between polls of --count',
+    type=click.FLOAT,
+    default=1,
+    show_default=True,
+)
+@click.option(
+    '--perfdata',
+    help='Add cluster size, flow control and queue lengths of every node '
+         'to the output as Nagios performance data',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--http',
+    help='Format output as HTTP response',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--http-server',
+    help='Run an HTTP server that reports the check result. '
+         'Every probe polls the nodes over persistent connections',
+    is_flag=True,
+    default=False
+)
+@click.option(
+    '--http-port',
+    help='Bind the HTTP server to this TCP port',
+    type=click.INT,
+    default=8080,
+    show_default=True,
+)
+@click.option(
+    '--pid-file',
+    help='Record the server PID in this file and take over '
+         'from the server recorded there',
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    '--http-backlog',
+    help='Backlog of the HTTP server listening socket',
+    type=click.INT,
+    default=128,
+    show_default=True,
+)
+def check_galera(nodes, port, user, password, timeout, cluster_size,
+                 warning_flow_control, critical_flow_control,
+                 warning_recv_queue, critical_recv_queue,
+                 warning_send_queue, critical_send_queue, count, interval,
+                 perfdata, http, http_server, http_port, pid_file,
+                 http_backlog):
+    """
+    Check health of a Galera cluster.
+
+    NODES are HOST or HOST:PORT of every cluster node. The nodes
+    are polled at once, each over a single connection. The check
+    covers wsrep_ready, cluster status and size, the local state,
+    flow control and the average receive and send queue lengths.
+
+    The exit code matches Nagios convention.
+    """
+    probes = []
+    for node in nodes:
+        host, _, node_port = node.partition(':')
+        try:
+            node_port = int(node_port) if node_port else port
+        except ValueError:
+            raise click.BadParameter('Invalid node %s' % node)
+        probes.append(
+            MysqlProbe(
+                host,
+                port=node_port,
+                user=user,
+                password=password,
+                query=GALERA_STATUS_QUERY,
+                timeout=timeout
+            )
+        )
+
+    checker = GaleraChecker(
+        cluster_size=cluster_size or len(probes),
+        critical_flow_control=critical_flow_control,
+        warning_flow_control=warning_flow_control,
+        critical_recv_queue=critical_recv_queue,
+        warning_recv_queue=warning_recv_queue,
+        critical_send_queue=critical_send_queue,
+        warning_send_queue=warning_send_queue,
+        perfdata=perfdata
+    )
+
+    try:
+        if http_server:
+            checker.start_server(
+                http_port,
+                probes,
+                backlog=http_backlog,
+                pid_file=pid_file
+            )
+            return
+
+        resp_class = CheckHttpResponse if http else CheckResponse
+        for i in range(count):
+            if i:
+                time.sleep(interval)
+            response = checker.check(probes, resp_class)
+    finally:
+        for probe in probes:
+            probe.close()
+    print(response)
+    exit(response.nagios_code)
+
+
+@main.command()
+@click.argument('targets_file', type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    '--concurrency',
+    help='How many targets to check at the same time',
+    type=click.INT,
+    default=20,
+    show_default=True,
+)
+@click.option(
+    '--aggregate-exit-code/--no-aggregate-exit-code',
+    help='Exit with the most severe status of all targets',
+    default=True,
+    show_default=True,
+)
+def check_http_many(targets_file, concurrency, aggregate_exit_code):
+    """
+    Check many URLs concurrently in one process.
+
+    TARGETS_FILE is an ini file with a section per target.
+    The section name is the target name. Options are:
+
+    \b
+        url                 - URL to check (required)
+        warning             - Warning response time (seconds)
+        critical            - Critical response time (seconds)
+        timeout             - Seconds before connection times out
+        title               - Expected title
+        title_regexp        - Regexp the title must match
+        body_regexp         - Regexp the body must match
+        status_code         - Expected HTTP status code
+        header_regexp       - 'Name: regexp', the header Name must match
+        min_content_length  - Minimal content length (bytes)
+        max_content_length  - Maximal content length (bytes)
+        warning_size        - Warning response size (bytes transferred)
+        critical_size       - Critical response size (bytes transferred)
+        warning_throughput  - Warning transfer rate (bytes/s, lower bound)
+        critical_throughput - Critical transfer rate (bytes/s, lower bound)
+        host                - Value of Host: HTTP header
+        protocol            - Value of X-Forwarded-Proto header
+
+    Options in the [DEFAULT] section apply to all targets.
+    One Nagios-style result line per target is printed.
+    """
+    try:
+        targets = parse_targets(targets_file)
+    except TargetsException as err:
+        print('UNKNOWN - %s' % err)
+        exit(NAGIOS_EXIT_UNKNOWN)
+
+    responses = check_targets(targets, concurrency=concurrency)
+    for target, response in zip(targets, responses):
+        print('%s: %s' % (target.name, response))
+
+    if aggregate_exit_code:
+        exit(worst_nagios_code([r.nagios_code for r in responses]))
+    exit(NAGIOS_EXIT_OK)
+
+
+@main.command()
+@click.argument('targets_file', type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    '--min-interval',
+    help='Seconds between checks of a failing or flapping target',
+    type=click.FLOAT,
+    default=10,
+    show_default=True,
+)
+@click.option(
+    '--max-interval',
+    help='Maximum seconds between checks of a healthy target',
+    type=click.FLOAT,
+    default=60,
+    show_default=True,
+)
+@click.option(
+    '--backoff',
+    help='Multiply the interval of a healthy target by this much '
+         'after every check',
+    type=click.FLOAT,
+    default=2.0,
+    show_default=True,
+)
+@click.option(
+    '--jitter',
+    help='Randomly deviate every interval by up to this fraction',
+    type=click.FLOAT,
+    default=0.1,
+    show_default=True,
+)
+@click.option(
+    '--concurrency',
+    help='How many targets to check at the same time in every process',
+    type=click.INT,
+    default=20,
+    show_default=True,
+)
+@click.option(
+    '--processes',
+    help='Shard targets across this many worker processes',
+    type=click.INT,
+    default=1,
+    show_default=True,
+)
+@click.option(
+    '--http-port',
+    help='Bind the HTTP server to this TCP port',
+    type=click.INT,
+    default=8080,
+    show_default=True,
+)
+@click.option(
+    '--http-workers',
+    help='Number of probes the HTTP server serves at the same time',
+    type=click.INT,
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--pid-file',
+    help='Record the server PID in this file. A new server started '
+         'with the same file binds alongside the old one and stops it '
+         'gracefully, so a restart fails no probes',
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    '--http-backlog',
+    help='Backlog of the HTTP server listening socket',
+    type=click.INT,
+    default=128,
+    show_default=True,
+)
+@click.option(
+    '--history-dir',
+    help='Record check results to history files in this directory',
+    type=click.Path(file_okay=False),
+)
+@click.option(
+    '--debug',
+    help='Print debug messages',
+    is_flag=True,
+    default=False
+)
+def monitor(targets_file, min_interval, max_interval, backoff, jitter,
+            concurrency, processes, http_port, http_workers, pid_file,
+            http_backlog, history_dir, debug):
+    """
+    Check many URLs continuously on adaptive schedules.
+
+    TARGETS_FILE has the same format as in check_http_many.
+    Checks are spread over time with jitter. Failing and flapping
+    targets are checked every --min-interval seconds, healthy ones
+    back off up to --max-interval seconds.
+
+    An HTTP server responds with the last results of all targets
+    and serves schedule lag and interval of every target
+    as Prometheus metrics on /metrics.
+
+    With --processes greater than one targets are sharded across
+    worker processes by consistent hashing of their names, so parsing
+    and regexp matching use all CPU cores. Dead workers are restarted.
+
+    With --history-dir every target records its check results
+    to a history file, see the history command.
+    """
+    setup_logging(log, debug=debug)
+    try:
+        targets = parse_targets(targets_file, history_dir=history_dir)
+    except TargetsException as err:
+        raise click.BadParameter(str(err))
+
+    scheduler_kwargs = {
+        'min_interval': min_interval,
+        'max_interval': max_interval,
+        'backoff': backoff,
+        'jitter': jitter,
+        'workers': concurrency,
+    }
+    try:
+        if processes > 1:
+            scheduler = ShardedMonitor(
+                targets,
+                processes=processes,
+                **scheduler_kwargs
+            )
+        else:
+            scheduler = CheckScheduler(targets, **scheduler_kwargs)
+    except ValueError as err:
+        raise click.BadParameter(str(err))
+
+    scheduler.start()
+    HealthServer(
+        http_port,
+        scheduler.get,
+        workers=http_workers,
+        backlog=http_backlog,
+        routes={'/metrics': lambda: MetricsHttpResponse(scheduler)},
+        pid_file=pid_file
+    ).serve_forever()
+
+
+@main.command()
+@click.argument('history_dir', type=click.Path(exists=True, file_okay=False))
+@click.argument('name', required=False)
+@click.option(
+    '--resolution',
+    help='Raw check results or their 1 minute or 1 hour rollups',
+    type=click.Choice(RESOLUTIONS),
+    default=RESOLUTION_RAW,
+    show_default=True,
+)
+@click.option(
+    '--since',
+    help='Show records of the last so many seconds',
+    type=click.FLOAT,
+)
+def history(history_dir, name, resolution, since):
+    """
+    Show check results recorded with --history-dir.
+
+    NAME is a target name of check_http_many and monitor or
+    the --history-name (URL by default) of check_http. Without NAME
+    the command lists the targets that have history.
+
+    Reading history doesn't block the process that records it.
+    """
+    if name is None:
+        for target in history_names(history_dir):
+            print(target)
+        return
+
+    path = history_path(history_dir, name)
+    try:
+        history_file = HistoryFile(path)
+    except (IOError, OSError) as err:
+        raise click.BadParameter('%s: %s' % (name, err))
+    except HistoryException as err:
+        raise click.BadParameter(str(err))
+
+    try:
+        records = history_file.read(
+            resolution,
+            since=time.time() - since if since else None
+        )
+    except HistoryException as err:
+        raise click.ClickException(str(err))
+    finally:
+        history_file.close()
+
+    for record in records:
+        timestamp = datetime.fromtimestamp(record.timestamp).isoformat()
+        status = STATUS_NAMES[record.nagios_code].upper()
+        if resolution == RESOLUTION_RAW:
+            print(
+                '%s %s %s' % (
+                    timestamp,
+                    status,
+                    _format_seconds(record.load_time)
+                )
+            )
+        else:
+            print(
+                '%s %s samples=%d failures=%d avg=%s max=%s' % (
+                    timestamp,
+                    status,
+                    record.samples,
+                    record.failures,
+                    _format_seconds(record.load_time_avg),
+                    _format_seconds(
+                        record.load_time_max if record.timed else None
+                    )
+                )
+            )
+
+
+def _format_seconds(seconds):
+    return '-' if seconds is None else '%f' % seconds
+
+
+@main.command()
+@click.argument('url')
+@click.option(
+    '-n', '--concurrency',
+    help='Number of concurrent workers',
+    type=click.INT,
+    default=10,
+    show_default=True,
+)
+@click.option(
+    '-r', '--requests',
+    help='Stop after this many requests',
+    type=click.INT,
+)
+@click.option(
+    '-d', '--duration',
+    help='Stop after this many seconds',
+    type=click.FLOAT,
+)
+@click.option(
+    '-t', '--timeout',
+    help='Seconds before connection times out',
+    default=10,
+    show_default=True,
+    type=click.INT,
+)
+@click.option(
+    '--host',
+    help='Pass this value as Host: HTTP header',
+)
+@click.option(
+    '--protocol',
+    help='This value is used for X-Forwarded-Proto header',
+    default='http',
+    show_default=True,
+)
+def load_test(url, concurrency, requests, duration, timeout, host, protocol):
+    """
+    Load URL from concurrent workers and report throughput,
+    errors and load time distribution.
+
+    Use it to pick --warning and --critical thresholds of check_http.
+    Either --requests or --duration is required.
+    """
+    if not requests and not duration:
+        raise click.UsageError('Either --requests or --duration is required')
+
+    loader = Loader(
+        url,
+        timeout=timeout,
+        host=host,
+        protocol=protocol,
+        pool_maxsize=concurrency
+    )
+    result = LoadTest(
+        loader,
+        concurrency=concurrency,
+        requests=requests,
+        duration=duration
+    ).run()
+    print(result)
+
+
+@main.command()
+@click.option(
+    '--socket',
+    help='Listen on this Unix socket',
+    default=DEFAULT_SOCKET,
+    show_default=True,
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    '--debug',
+    help='Print debug messages',
+    is_flag=True,
+    default=False
+)
+def daemon(socket, debug):
+    """
+    Run checks for the twindb-check thin client.
+
+    The daemon stays resident, so a check doesn't pay for interpreter
+    start-up and imports. twindb-check takes the same check options
+    as check_http, sends them to the daemon and exits with the result's
+    Nagios code.
+    """
+    setup_logging(log, debug=debug)
+    CheckDaemon(socket).serve_forever()
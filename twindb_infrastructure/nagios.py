@@ -0,0 +1,76 @@
+"""Nagios plugin conventions"""
+NAGIOS_EXIT_OK = 0
+NAGIOS_EXIT_WARNING = 1
+NAGIOS_EXIT_CRITICAL = 2
+NAGIOS_EXIT_UNKNOWN = 3
+
+# Nagios exit codes from the least to the most severe
+NAGIOS_SEVERITY = [
+    NAGIOS_EXIT_OK,
+    NAGIOS_EXIT_UNKNOWN,
+    NAGIOS_EXIT_WARNING,
+    NAGIOS_EXIT_CRITICAL
+]
+
+# Characters that make a performance data label quoted
+_QUOTED_LABEL_CHARS = set(" ='")
+
+
+def worst_nagios_code(codes):
+    """
+    Pick the most severe of Nagios exit codes.
+
+    :param codes: Nagios exit codes.
+    :type codes: list(int)
+    :return: The most severe code or OK if there are no codes.
+    :rtype: int
+    """
+    return max(
+        [NAGIOS_EXIT_OK] + list(codes),
+        key=NAGIOS_SEVERITY.index
+    )
+
+
+class PerfData(object):
+    """
+    Nagios performance data of one metric.
+
+    :param label: Metric name. It's quoted if it has spaces,
+        equal signs or quotes.
+    :type label: str
+    :param value: Metric value.
+    :type value: float
+    :param uom: Unit of measurement, e.g. ``s`` or ``B``.
+    :type uom: str
+    :param warning: Warning threshold.
+    :param critical: Critical threshold.
+    :param minimum: Minimal possible value.
+    :param maximum: Maximal possible value.
+    """
+    def __init__(self, label, value, uom='',
+                 warning=None, critical=None, minimum=None, maximum=None):
+        self.label = label
+        self.value = value
+        self.uom = uom
+        self.warning = warning
+        self.critical = critical
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __str__(self):
+        label = self.label
+        if _QUOTED_LABEL_CHARS.intersection(label):
+            label = "'%s'" % label.replace("'", "''")
+        fields = [
+            '%s=%s%s' % (label, _format_number(self.value), self.uom)
+        ]
+        for limit in [self.warning, self.critical, self.minimum, self.maximum]:
+            fields.append('' if limit is None else _format_number(limit))
+
+        return ';'.join(fields).rstrip(';')
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return '%f' % value
+    return str(value)
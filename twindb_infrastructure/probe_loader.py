@@ -0,0 +1,337 @@
+"""Module with ProbeLoader() class"""
+import socket
+import ssl
+import time
+from threading import Lock
+from urlparse import urlparse
+
+from requests import RequestException, ConnectionError, HTTPError, Timeout
+from requests.structures import CaseInsensitiveDict
+
+from twindb_infrastructure.loader import PHASES
+
+PROBE_MODE_TCP = 'tcp'
+PROBE_MODE_HEAD = 'head'
+PROBE_MODE_RAW = 'raw'
+
+PROBE_MODES = [PROBE_MODE_TCP, PROBE_MODE_HEAD, PROBE_MODE_RAW]
+
+# Status line and headers larger than that aren't a health endpoint
+MAX_HEADERS_SIZE = 65536
+
+_RECV_SIZE = 4096
+
+_DEFAULT_PORTS = {
+    'http': 80,
+    'https': 443,
+}
+
+# Loading the CA bundle takes more CPU than a probe,
+# so all probes share one context
+_SSL_CONTEXT = None
+_SSL_CONTEXT_LOCK = Lock()
+
+
+class ProbeError(RequestException):
+    pass
+
+
+class ProbeLoader(object):
+    """
+    Probe a URL with a minimal socket-level HTTP/1.1 client.
+
+    Unlike :class:`Loader` it doesn't follow redirects, read the body
+    or parse HTML, so a probe costs little CPU. It has the same
+    properties that load time, phase, status code, header and
+    content length checks read, so :class:`HttpChecker` checks it
+    like a loader. Every probe opens a new connection.
+
+    Modes are:
+
+        - ``tcp`` - only resolve the host and connect.
+        - ``head`` - send HEAD and read the status line and headers.
+        - ``raw`` - send GET and read the status line and headers.
+          The body isn't read.
+
+    :param url: URL to probe.
+    :type url: str
+    :param mode: One of :const:`PROBE_MODES`.
+    :type mode: str
+    :param timeout: Seconds before connection times out.
+    :type timeout: int
+    :param host: Value of Host: HTTP header.
+    :type host: str
+    :param protocol: Value of X-Forwarded-Proto HTTP header.
+    :type protocol: str
+    :param address: Connect to this IP address instead of resolving
+        the URL host.
+    :type address: str
+    :param check_status: Raise :class:`HTTPError` if the response
+        status is 4xx or 5xx.
+    :type check_status: bool
+    """
+    def __init__(self, url, mode=PROBE_MODE_HEAD, timeout=10, host=None,
+                 protocol=None, address=None, check_status=True):
+        if mode not in PROBE_MODES:
+            raise ValueError(
+                'Probe mode must be one of %s' % ', '.join(PROBE_MODES)
+            )
+
+        self._url = url
+        self._mode = mode
+        self._timeout = timeout
+        self._host = host
+        self._protocol = protocol
+        self._address = address
+        self._check_status = check_status
+        self._cold_load_time = None
+        self.reset()
+
+    @property
+    def url(self):
+        return self._url
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def load_time(self):
+        self.load()
+        return self._load_time
+
+    @property
+    def phase_timings(self):
+        """
+        Time of each request phase in seconds. Keys are :const:`PHASES`.
+        ``transfer`` is the time to read the headers after the first
+        byte. Phases that were skipped take zero seconds.
+
+        :rtype: dict
+        """
+        self.load()
+        return self._phase_timings
+
+    @property
+    def status_code(self):
+        """HTTP status code or None in the tcp mode."""
+        self.load()
+        return self._status_code
+
+    @property
+    def headers(self):
+        """Case-insensitive dictionary of the response headers."""
+        self.load()
+        return self._headers
+
+    @property
+    def content_length(self):
+        """Content length as reported by the server, zero otherwise:
+        the body is never read."""
+        self.load()
+        try:
+            return int(self._headers['Content-Length'])
+        except (KeyError, ValueError):
+            return 0
+
+    @property
+    def body_size(self):
+        """Always zero: the body is never read."""
+        return 0
+
+    @property
+    def throughput(self):
+        """Always None: the body is never read."""
+        return None
+
+    @property
+    def cold_load_time(self):
+        """Last load time or None if never measured."""
+        return self._cold_load_time
+
+    @property
+    def warm_load_time(self):
+        """Always None: connections aren't kept alive."""
+        return None
+
+    @property
+    def connection_reused(self):
+        """False once loaded: every probe opens a new connection."""
+        return None if self._load_time is None else False
+
+    @property
+    def not_modified(self):
+        return None
+
+    @property
+    def asset_timings(self):
+        return None
+
+    @property
+    def matched_patterns(self):
+        return set()
+
+    def load(self):
+        if self._load_time is None:
+            self._probe()
+
+    def reset(self):
+        self._load_time = None
+        self._phase_timings = None
+        self._status_code = None
+        self._headers = CaseInsensitiveDict()
+
+    def clone(self, address=None):
+        """Create a new probe loader for the same URL with the same options.
+
+        :param address: Connect to this IP address instead.
+        :type address: str
+        :rtype: ProbeLoader
+        """
+        return self.__class__(
+            self._url,
+            mode=self._mode,
+            timeout=self._timeout,
+            host=self._host,
+            protocol=self._protocol,
+            address=address or self._address,
+            check_status=self._check_status
+        )
+
+    def close(self):
+        """Nothing to close: connections aren't kept alive."""
+
+    def _probe(self):
+        parsed = urlparse(self._url)
+        if parsed.scheme not in _DEFAULT_PORTS or not parsed.hostname:
+            raise ProbeError('Invalid URL %s' % self._url)
+
+        timings = dict.fromkeys(PHASES, 0)
+        start = time.time()
+        try:
+            conn = self._connect(parsed, timings)
+            try:
+                if self._mode != PROBE_MODE_TCP:
+                    self._request(conn, parsed, timings)
+            finally:
+                conn.close()
+        except socket.timeout as err:
+            raise Timeout(str(err))
+        except (socket.error, ssl.SSLError) as err:
+            raise ConnectionError(str(err))
+
+        self._load_time = time.time() - start
+        self._phase_timings = timings
+        self._cold_load_time = self._load_time
+
+        if self._check_status and self._status_code is not None \
+                and self._status_code >= 400:
+            raise HTTPError(
+                '%d Error for url: %s' % (self._status_code, self._url)
+            )
+
+    def _connect(self, parsed, timings):
+        start = time.time()
+        address = socket.getaddrinfo(
+            self._address or parsed.hostname,
+            parsed.port or _DEFAULT_PORTS[parsed.scheme],
+            0,
+            socket.SOCK_STREAM
+        )[0]
+        resolved = time.time()
+        if not self._address:
+            timings['dns'] = resolved - start
+
+        conn = socket.socket(address[0], address[1], address[2])
+        conn.settimeout(self._timeout)
+        try:
+            conn.connect(address[4])
+            connected = time.time()
+            timings['connect'] = connected - resolved
+
+            if parsed.scheme == 'https' and self._mode != PROBE_MODE_TCP:
+                conn = _ssl_context().wrap_socket(
+                    conn,
+                    server_hostname=parsed.hostname
+                )
+                timings['tls'] = time.time() - connected
+        except Exception:
+            conn.close()
+            raise
+
+        return conn
+
+    def _request(self, conn, parsed, timings):
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        lines = [
+            '%s %s HTTP/1.1' % (
+                'HEAD' if self._mode == PROBE_MODE_HEAD else 'GET',
+                path
+            ),
+            'Host: %s' % (self._host or parsed.netloc),
+            'Connection: close',
+        ]
+        if self._protocol:
+            lines.append('X-Forwarded-Proto: %s' % self._protocol)
+        conn.sendall('\r\n'.join(lines) + '\r\n\r\n')
+        sent = time.time()
+
+        data = ''
+        while '\r\n\r\n' not in data:
+            chunk = conn.recv(_RECV_SIZE)
+            if not chunk:
+                raise ProbeError(
+                    'Connection closed before the response headers'
+                )
+            if not data:
+                first_byte = time.time()
+                timings['ttfb'] = first_byte - sent
+            data += chunk
+            if len(data) > MAX_HEADERS_SIZE:
+                raise ProbeError(
+                    'Response headers are larger than %d bytes'
+                    % MAX_HEADERS_SIZE
+                )
+        timings['transfer'] = time.time() - first_byte
+
+        self._status_code, self._headers = _parse_head(
+            data.split('\r\n\r\n', 1)[0]
+        )
+
+
+def _ssl_context():
+    """Default SSL context created on the first https probe."""
+    global _SSL_CONTEXT
+    with _SSL_CONTEXT_LOCK:
+        if _SSL_CONTEXT is None:
+            _SSL_CONTEXT = ssl.create_default_context()
+        return _SSL_CONTEXT
+
+
+def _parse_head(head):
+    """Parse the status line and headers of an HTTP response."""
+    lines = head.split('\r\n')
+    try:
+        version, status = lines[0].split(' ', 2)[:2]
+        if not version.startswith('HTTP/'):
+            raise ValueError(version)
+        status_code = int(status)
+    except ValueError:
+        raise ProbeError('Invalid status line %r' % lines[0])
+
+    headers = CaseInsensitiveDict()
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if not sep:
+            continue
+        name = name.strip()
+        value = value.strip()
+        if name in headers:
+            headers[name] = '%s, %s' % (headers[name], value)
+        else:
+            headers[name] = value
+
+    return status_code, headers
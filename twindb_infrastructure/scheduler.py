@@ -0,0 +1,275 @@
+"""Module with CheckScheduler() class"""
+import heapq
+import random
+import time
+from Queue import Queue
+from threading import Condition, Thread
+
+from twindb_infrastructure.check_http import CheckHttpResponse
+from twindb_infrastructure.metrics import METRIC_PREFIX, _escape
+from twindb_infrastructure.nagios import worst_nagios_code, \
+    NAGIOS_EXIT_OK, NAGIOS_EXIT_CRITICAL, NAGIOS_EXIT_UNKNOWN
+from twindb_infrastructure.targets import check_target
+
+
+class CheckScheduler(object):
+    """
+    Check targets continuously, each on its own adaptive schedule.
+
+    Next-due checks are kept in a priority queue. The first round is
+    spread randomly over ``min_interval``, so targets aren't probed
+    in one burst. A failing target, or one that changed its status
+    since the previous check, is probed again after ``min_interval``.
+    A healthy target backs off: its interval grows ``backoff`` times
+    after every check up to ``max_interval``. Every interval is
+    randomly stretched or shrunk by ``jitter`` to keep the probes
+    spread over time.
+
+    :param targets: Targets to check.
+    :type targets: list(Target)
+    :param min_interval: Seconds between checks of a failing target.
+    :type min_interval: float
+    :param max_interval: Maximum seconds between checks of a healthy
+        target.
+    :type max_interval: float
+    :param backoff: Interval multiplier after an OK check.
+    :type backoff: float
+    :param jitter: Maximum relative deviation of an interval, from 0 to 1.
+    :type jitter: float
+    :param workers: Number of targets checked at the same time.
+    :type workers: int
+    """
+    def __init__(self, targets, min_interval=10, max_interval=60,
+                 backoff=2.0, jitter=0.1, workers=10):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError(
+                'Intervals must be positive and min_interval '
+                'must not exceed max_interval'
+            )
+        if backoff < 1:
+            raise ValueError('Backoff must be at least 1')
+        if not 0 <= jitter < 1:
+            raise ValueError('Jitter must be between 0 and 1')
+
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._jitter = jitter
+        self._workers = workers
+        self._schedules = [
+            _Schedule(i, t, min_interval) for i, t in enumerate(targets)
+        ]
+        self._queue = []
+        self._due_checks = Queue()
+        self._condition = Condition()
+        self._stopped = False
+
+    def start(self):
+        """Start the dispatcher and worker threads."""
+        now = time.time()
+        with self._condition:
+            for schedule in self._schedules:
+                schedule.due = now + random.uniform(0, self._min_interval)
+                heapq.heappush(self._queue, (schedule.due, schedule.index))
+
+        threads = [Thread(target=self._dispatch)] + [
+            Thread(target=self._work) for _ in range(self._workers)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        """Stop dispatching checks. Checks in progress aren't interrupted."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def statuses(self):
+        """
+        Get the schedule state and the last result of every target.
+
+        :return: Statuses in the order of targets.
+        :rtype: list(TargetStatus)
+        """
+        with self._condition:
+            return [
+                TargetStatus(
+                    s.target.name,
+                    str(s.response) if s.response else None,
+                    s.response.nagios_code if s.response else None,
+                    s.lag,
+                    s.interval
+                )
+                for s in self._schedules
+            ]
+
+    def get(self, resp_class=CheckHttpResponse):
+        """
+        Get the last results of all targets as one response.
+
+        :param resp_class: Response type.
+        :type resp_class: class
+        :return: Response with the most severe status of all targets
+            and one line per target.
+        :rtype: CheckResponse
+        """
+        return make_response(self.statuses(), resp_class)
+
+    def render(self):
+        """
+        Render per-target schedule metrics in Prometheus text format.
+
+        :rtype: str
+        """
+        return render_metrics(self.statuses())
+
+    def _dispatch(self):
+        with self._condition:
+            while not self._stopped:
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+
+                due, i = self._queue[0]
+                delay = due - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+                heapq.heappop(self._queue)
+                self._due_checks.put(self._schedules[i])
+
+    def _work(self):
+        while True:
+            schedule = self._due_checks.get()
+            start = time.time()
+            response = check_target(schedule.target)
+            self._reschedule(schedule, response, start - schedule.due)
+
+    def _reschedule(self, schedule, response, lag=None):
+        """Update the target interval and queue its next check."""
+        with self._condition:
+            previous = schedule.response
+            schedule.response = response
+            schedule.lag = lag
+            flapped = previous is not None \
+                and previous.nagios_code != response.nagios_code
+            if response.nagios_code != NAGIOS_EXIT_OK or flapped:
+                schedule.interval = self._min_interval
+            else:
+                schedule.interval = min(
+                    schedule.interval * self._backoff,
+                    self._max_interval
+                )
+
+            schedule.due = time.time() + schedule.interval * (
+                1 + random.uniform(-self._jitter, self._jitter)
+            )
+            heapq.heappush(self._queue, (schedule.due, schedule.index))
+            self._condition.notify()
+
+
+class _Schedule(object):
+    """Schedule state of one target."""
+    def __init__(self, index, target, interval):
+        self.index = index
+        self.target = target
+        self.interval = interval
+        self.due = None
+        self.lag = None
+        self.response = None
+
+
+class TargetStatus(object):
+    """
+    Schedule state and the last result of a target. It's made of plain
+    values, so it can be sent to another process.
+
+    :param name: Target name.
+    :type name: str
+    :param output: Output of the last check or None if there was none.
+    :type output: str
+    :param nagios_code: Nagios code of the last check.
+    :type nagios_code: int
+    :param lag: Delay of the last check start after its due time.
+    :type lag: float
+    :param interval: Current interval between checks.
+    :type interval: float
+    """
+    def __init__(self, name, output, nagios_code, lag, interval):
+        self.name = name
+        self.output = output
+        self.nagios_code = nagios_code
+        self.lag = lag
+        self.interval = interval
+
+
+def make_response(statuses, resp_class=CheckHttpResponse):
+    """
+    Make one response of the last results of targets.
+
+    :param statuses: Target statuses.
+    :type statuses: list(TargetStatus)
+    :param resp_class: Response type.
+    :type resp_class: class
+    :return: Response with the most severe status of all targets
+        and one line per target.
+    :rtype: CheckResponse
+    """
+    lines = []
+    codes = []
+    for status in statuses:
+        if status.output is None:
+            lines.append('%s: UNKNOWN - no check result yet' % status.name)
+            codes.append(NAGIOS_EXIT_UNKNOWN)
+        else:
+            lines.append('%s: %s' % (status.name, status.output))
+            codes.append(status.nagios_code)
+
+    nagios_code = worst_nagios_code(codes)
+    kwargs = {
+        'message': '\n'.join(lines),
+        'nagios_code': nagios_code
+    }
+    if resp_class == CheckHttpResponse:
+        kwargs['http_code'] = 503 \
+            if nagios_code == NAGIOS_EXIT_CRITICAL else 200
+
+    return resp_class(**kwargs)
+
+
+def render_metrics(statuses):
+    """
+    Render schedule metrics of targets in Prometheus text format.
+
+    :param statuses: Target statuses.
+    :type statuses: list(TargetStatus)
+    :rtype: str
+    """
+    metrics = [
+        ('schedule_lag_seconds',
+         'Delay of the last check start after its due time.',
+         'lag'),
+        ('check_interval_seconds',
+         'Current interval between checks of the target.',
+         'interval'),
+        ('target_status',
+         'Nagios code of the last check result.',
+         'nagios_code'),
+    ]
+    lines = []
+    for name, description, attr in metrics:
+        lines += [
+            '# HELP %s_%s %s' % (METRIC_PREFIX, name, description),
+            '# TYPE %s_%s gauge' % (METRIC_PREFIX, name),
+        ]
+        for status in statuses:
+            value = getattr(status, attr)
+            if value is not None:
+                lines.append(
+                    '%s_%s{target="%s"} %f'
+                    % (METRIC_PREFIX, name, _escape(status.name), value)
+                )
+
+    return '\n'.join(lines) + '\n'
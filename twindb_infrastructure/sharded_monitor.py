@@ -0,0 +1,181 @@
+"""Module with ShardedMonitor() class"""
+import bisect
+import hashlib
+import os
+import time
+from multiprocessing import Process, Queue
+from threading import Lock, Thread
+
+from twindb_infrastructure import log
+from twindb_infrastructure.check_http import CheckHttpResponse
+from twindb_infrastructure.scheduler import CheckScheduler, TargetStatus, \
+    make_response, render_metrics
+
+
+class HashRing(object):
+    """
+    Consistent hash ring.
+
+    Every node is placed on the ring ``replicas`` times. A key belongs
+    to the first node clockwise from the key's hash, so adding or
+    removing a node moves only the keys of that node.
+
+    :param nodes: Nodes on the ring.
+    :type nodes: list
+    :param replicas: Number of points per node.
+    :type replicas: int
+    """
+    def __init__(self, nodes, replicas=100):
+        if not nodes:
+            raise ValueError('Hash ring needs at least one node')
+
+        points = sorted(
+            (_hash('%s-%d' % (node, i)), node)
+            for node in nodes
+            for i in range(replicas)
+        )
+        self._hashes = [h for h, _ in points]
+        self._nodes = [n for _, n in points]
+
+    def get_node(self, key):
+        """Get the node a key belongs to."""
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[i]
+
+
+def _hash(key):
+    return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+
+class ShardedMonitor(object):
+    """
+    Check targets in several worker processes.
+
+    Targets are sharded across the workers by their name with
+    consistent hashing. Every worker runs a :class:`CheckScheduler`
+    for its shard and reports the target statuses to the parent
+    every ``report_interval`` seconds. The parent restarts dead
+    workers and answers for all targets.
+
+    :param targets: Targets to check.
+    :type targets: list(Target)
+    :param processes: Number of worker processes.
+    :type processes: int
+    :param report_interval: Seconds between two reports of a worker.
+    :type report_interval: float
+    :param scheduler_kwargs: Keyword arguments of :class:`CheckScheduler`
+        of every worker.
+    """
+    def __init__(self, targets, processes=2, report_interval=1,
+                 **scheduler_kwargs):
+        if processes < 1:
+            raise ValueError('Number of processes must be positive')
+
+        # Fail in the parent if scheduler options are invalid
+        CheckScheduler([], **scheduler_kwargs)
+
+        ring = HashRing(range(processes))
+        self._shards = [[] for _ in range(processes)]
+        for target in targets:
+            self._shards[ring.get_node(target.name)].append(target)
+
+        self._names = [t.name for t in targets]
+        self._report_interval = report_interval
+        self._scheduler_kwargs = scheduler_kwargs
+        self._workers = [None] * processes
+        self._reports = Queue()
+        self._statuses = {}
+        self._lock = Lock()
+
+    @property
+    def shards(self):
+        """Lists of targets of every worker."""
+        return self._shards
+
+    def start(self):
+        """Start the workers and the threads that supervise them."""
+        for shard in range(len(self._shards)):
+            self._start_worker(shard)
+
+        for target in [self._collect, self._supervise]:
+            thread = Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def statuses(self):
+        """
+        Get the last reported status of every target.
+
+        :return: Statuses in the order of targets.
+        :rtype: list(TargetStatus)
+        """
+        with self._lock:
+            return [
+                self._statuses.get(name)
+                or TargetStatus(name, None, None, None, None)
+                for name in self._names
+            ]
+
+    def get(self, resp_class=CheckHttpResponse):
+        """
+        Get the last results of all targets as one response.
+
+        :param resp_class: Response type.
+        :type resp_class: class
+        :return: Response with the most severe status of all targets
+            and one line per target.
+        :rtype: CheckResponse
+        """
+        return make_response(self.statuses(), resp_class)
+
+    def render(self):
+        """
+        Render per-target schedule metrics in Prometheus text format.
+
+        :rtype: str
+        """
+        return render_metrics(self.statuses())
+
+    def _start_worker(self, shard):
+        worker = Process(
+            target=_run_worker,
+            args=(
+                self._shards[shard],
+                self._reports,
+                self._report_interval,
+                self._scheduler_kwargs,
+                os.getpid()
+            )
+        )
+        worker.daemon = True
+        worker.start()
+        self._workers[shard] = worker
+
+    def _collect(self):
+        while True:
+            statuses = self._reports.get()
+            with self._lock:
+                for status in statuses:
+                    self._statuses[status.name] = status
+
+    def _supervise(self):
+        while True:
+            time.sleep(self._report_interval)
+            for shard, worker in enumerate(self._workers):
+                if not worker.is_alive():
+                    log.error(
+                        'Worker of shard %d exited with code %s, restarting',
+                        shard,
+                        worker.exitcode
+                    )
+                    self._start_worker(shard)
+
+
+def _run_worker(targets, reports, report_interval, scheduler_kwargs,
+                parent_pid):
+    scheduler = CheckScheduler(targets, **scheduler_kwargs)
+    scheduler.start()
+    # A worker of a killed parent has no one to report to
+    while os.getppid() == parent_pid:
+        time.sleep(report_interval)
+        reports.put(scheduler.statuses())
@@ -0,0 +1,245 @@
+"""Module with Target() class and helpers to check many targets at once"""
+import re
+from ConfigParser import ConfigParser
+from multiprocessing.pool import ThreadPool
+
+from twindb_infrastructure import log
+from twindb_infrastructure.check_http import HttpChecker, CheckResponse
+from twindb_infrastructure.history import HistoryFile, HistoryException, \
+    history_path
+from twindb_infrastructure.loader import Loader
+from twindb_infrastructure.nagios import NAGIOS_EXIT_UNKNOWN
+
+
+class TargetsException(Exception):
+    pass
+
+
+class Target(object):
+    """
+    URL with its check criteria.
+
+    :param name: Name of the target. It prefixes the result line.
+    :type name: str
+    :param url: URL to check.
+    :type url: str
+    :param history: Record check results here.
+    :type history: HistoryFile
+    """
+    __float_options = [
+        'warning',
+        'critical',
+        'warning_throughput',
+        'critical_throughput',
+    ]
+    __int_options = [
+        'timeout',
+        'status_code',
+        'min_content_length',
+        'max_content_length',
+        'warning_size',
+        'critical_size',
+    ]
+    __str_options = [
+        'title',
+        'title_regexp',
+        'body_regexp',
+        'header_regexp',
+        'host',
+        'protocol',
+    ]
+
+    def __init__(self, name, url, **kwargs):
+        self._name = name
+        self._url = url
+        self._warning = kwargs.get('warning')
+        self._critical = kwargs.get('critical')
+        self._timeout = kwargs.get('timeout', 10)
+        self._title = kwargs.get('title')
+        self._title_regexp = kwargs.get('title_regexp')
+        self._body_regexp = kwargs.get('body_regexp')
+        self._status_code = kwargs.get('status_code')
+        self._header_regexp = kwargs.get('header_regexp')
+        self._min_content_length = kwargs.get('min_content_length')
+        self._max_content_length = kwargs.get('max_content_length')
+        self._warning_size = kwargs.get('warning_size')
+        self._critical_size = kwargs.get('critical_size')
+        self._warning_throughput = kwargs.get('warning_throughput')
+        self._critical_throughput = kwargs.get('critical_throughput')
+        self._host = kwargs.get('host')
+        self._protocol = kwargs.get('protocol', 'http')
+        self._history = kwargs.get('history')
+
+        self._checker = HttpChecker(
+            critical_load_time=self._critical,
+            warning_load_time=self._warning,
+            title=self._title,
+            title_regexp=self._title_regexp,
+            body_regexp=self._body_regexp,
+            status_code=self._status_code,
+            header_regexps=[self._header_regexp]
+            if self._header_regexp else None,
+            min_content_length=self._min_content_length,
+            max_content_length=self._max_content_length,
+            warning_body_size=self._warning_size,
+            critical_body_size=self._critical_size,
+            warning_throughput=self._warning_throughput,
+            critical_throughput=self._critical_throughput,
+            history=self._history
+        )
+        self._loader = Loader(
+            self._url,
+            timeout=self._timeout,
+            host=self._host,
+            protocol=self._protocol,
+            required_tags=self._checker.required_tags,
+            check_status=not self._checker.checks_status
+        )
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def url(self):
+        return self._url
+
+    @classmethod
+    def from_config(cls, config, section, history_dir=None):
+        """
+        Create a target from a section of a targets file.
+
+        :param config: Parsed targets file.
+        :type config: ConfigParser
+        :param section: Section that describes the target.
+        :type section: str
+        :param history_dir: Record check results to a history file
+            of the target in this directory.
+        :type history_dir: str
+        :return: Target
+        :rtype: Target
+        :raise TargetsException: if the section is invalid.
+        """
+        if not config.has_option(section, 'url'):
+            raise TargetsException('Target %s has no url' % section)
+
+        kwargs = {}
+        try:
+            for option in cls.__float_options:
+                if config.has_option(section, option):
+                    kwargs[option] = config.getfloat(section, option)
+            for option in cls.__int_options:
+                if config.has_option(section, option):
+                    kwargs[option] = config.getint(section, option)
+        except ValueError as err:
+            raise TargetsException('Target %s: %s' % (section, err))
+
+        for option in cls.__str_options:
+            if config.has_option(section, option):
+                kwargs[option] = config.get(section, option, raw=True)
+
+        if history_dir:
+            try:
+                kwargs['history'] = HistoryFile(
+                    history_path(history_dir, section),
+                    writable=True
+                )
+            except (IOError, OSError, HistoryException) as err:
+                raise TargetsException('Target %s: %s' % (section, err))
+
+        try:
+            return cls(
+                section,
+                config.get(section, 'url', raw=True),
+                **kwargs
+            )
+        except (ValueError, re.error) as err:
+            raise TargetsException('Target %s: %s' % (section, err))
+
+    def check(self, resp_class=CheckResponse):
+        """
+        Check the target.
+
+        :param resp_class: What response type the method should return
+        :type resp_class: class
+        :return: Response
+        :rtype: CheckResponse
+        """
+        try:
+            return self._checker.check(self._loader, resp_class)
+        finally:
+            self._loader.reset()
+
+
+def parse_targets(path, history_dir=None):
+    """
+    Read targets from an ini file.
+
+    Every section describes one target. The section name is
+    the target name. Options are ``url`` (required), ``warning``,
+    ``critical``, ``timeout``, ``title``, ``title_regexp``,
+    ``body_regexp``, ``status_code``, ``header_regexp``,
+    ``min_content_length``, ``max_content_length``, ``warning_size``,
+    ``critical_size``, ``warning_throughput``, ``critical_throughput``,
+    ``host`` and ``protocol``. Options in the ``[DEFAULT]`` section apply
+    to all targets.
+
+    :param path: Path to the targets file.
+    :type path: str
+    :param history_dir: Record check results to history files
+        in this directory.
+    :type history_dir: str
+    :return: List of targets in the file order.
+    :rtype: list(Target)
+    :raise TargetsException: if the file can't be read or is invalid.
+    """
+    config = ConfigParser()
+    if not config.read(path):
+        raise TargetsException('Can not read targets file %s' % path)
+
+    return [
+        Target.from_config(config, s, history_dir=history_dir)
+        for s in config.sections()
+    ]
+
+
+def check_targets(targets, concurrency=10):
+    """
+    Check targets concurrently in a bounded thread pool.
+
+    :param targets: Targets to check.
+    :type targets: list(Target)
+    :param concurrency: Maximum number of targets checked at the same time.
+    :type concurrency: int
+    :return: Responses in the order of targets.
+    :rtype: list(CheckResponse)
+    """
+    if not targets:
+        return []
+
+    pool = ThreadPool(min(concurrency, len(targets)))
+    try:
+        return pool.map(check_target, targets)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def check_target(target):
+    """
+    Check a target. Unlike :meth:`Target.check` it never raises.
+
+    :param target: Target to check.
+    :type target: Target
+    :return: Response. UNKNOWN if the check failed with an exception.
+    :rtype: CheckResponse
+    """
+    # One broken target must not hide the results of the others
+    try:
+        return target.check()
+    except Exception as err:  # pylint: disable=broad-except
+        log.error('Failed to check %s: %s', target.name, err)
+        return CheckResponse(
+            message='UNKNOWN - %s: %s' % (target.url, err),
+            nagios_code=NAGIOS_EXIT_UNKNOWN
+        )